@@ -0,0 +1,318 @@
+"""Batch generation of recommendations and itineraries for offline jobs.
+
+Builds the same prompts as `find_destinations` and `create_itinerary` for
+many preference profiles, sends each distinct prompt to the model once
+through a bounded pool of workers, and appends every result to a JSON-lines
+file as soon as it arrives. Re-running with the same output file skips
+prompts that already have a result, so an interrupted run can be resumed.
+
+    python -m agent.batch profiles.jsonl itineraries.jsonl
+    python -m agent.batch --catalog itineraries.jsonl   # every destination x 2-7 days x season
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+
+from agent.cache import cache_key
+from agent.itinerary_store import source_fingerprint
+from agent.llm import agenerate_text
+from agent.models import model_for
+from agent.nodes.destination_finder import build_recommendation_prompt, rank_destinations
+from agent.nodes.itinerary_creator import PLAN_ROUTE, build_itinerary_prompt, top_destination, trip_route
+from agent.scheduler import session_context
+from agent.state import AgentState
+from agent.tools.destination_db import get_catalog
+from agent.tools.weather_api import get_weather_forecast, get_weather_service
+
+PROMPT_BUILDERS = {
+    "recommendations": build_recommendation_prompt,
+    "itinerary": build_itinerary_prompt,
+}
+KINDS = tuple(PROMPT_BUILDERS)
+# Stands in for the forecast when keying itinerary jobs (see `job_key`)
+KEY_WEATHER = {}
+
+logger = logging.getLogger(__name__)
+
+
+def profile_state(profile):
+    """Build the state a node would see for one preference profile.
+
+    A profile may pin a catalog destination with a "destination" key (by
+    name); otherwise destinations are ranked as in `find_destinations`.
+    """
+    preferences = dict(profile)
+    pinned = preferences.pop("destination", None)
+    state = AgentState(preferences=preferences)
+    if pinned is None:
+        rank_destinations(state)
+    else:
+        matches = [d for d in get_catalog().destinations if d["name"] == pinned]
+        if not matches:
+            raise ValueError(f"Unknown destination: {pinned}")
+        state.destinations = [dict(matches[0])]
+    return state
+
+
+def catalog_profiles(durations=range(2, 8), seasons=None):
+    """Yield a profile for every catalog destination x duration x season."""
+    catalog = get_catalog()
+    if seasons is None:
+        seasons = sorted({season for d in catalog.destinations for season in d.get("best_seasons", [])})
+    for destination in catalog.destinations:
+        for duration in durations:
+            for season in seasons:
+                yield {"destination": destination["name"], "duration": duration, "season": season}
+
+
+@dataclass
+class BatchJob:
+    """One distinct prompt and every profile that produced it."""
+    key: str
+    kind: str
+    prompt: str
+    destination: str
+    duration: int
+    sources: str = None     # itinerary jobs: fingerprint of the data they were planned from
+    profiles: list = field(default_factory=list)
+
+
+def job_key(kind, state, route=PLAN_ROUTE):
+    """Key for a job's result, from everything in its prompt except the weather.
+
+    Live forecasts change between runs, and a resumed run must find the
+    keys it already wrote; the results record the forecast they were made
+    with in "sources" instead.
+    """
+    if kind == "itinerary":
+        return cache_key(build_itinerary_prompt(state, KEY_WEATHER, route=route), namespace=kind)
+    return cache_key(PROMPT_BUILDERS[kind](state), namespace=kind)
+
+
+def plan_jobs(profiles, kinds=KINDS, forecasts=None):
+    """Turn profiles into distinct prompts, in first-seen order.
+
+    Profiles that format to the same prompt share one job, so each prompt is
+    sent to the model at most once. Itinerary prompts use the forecasts in
+    `forecasts` (destination name -> forecast); any other forecast is looked
+    up synchronously, so async callers fetch them first (see `BatchRunner.run`).
+    """
+    return _plan_jobs([(profile, profile_state(profile)) for profile in profiles], kinds, forecasts or {})
+
+
+def _plan_jobs(planned, kinds, forecasts):
+    jobs = {}
+    for profile, state in planned:
+        destination = top_destination(state)["name"]
+        route = trip_route(state) if "itinerary" in kinds else None
+        for kind in kinds:
+            key = job_key(kind, state, route)
+            job = jobs.get(key)
+            if job is None:
+                sources = None
+                if kind == "itinerary":
+                    weather = forecasts.get(destination) or get_weather_forecast(destination)
+                    prompt = build_itinerary_prompt(state, weather, route=route)
+                    # Lets ItineraryStore drop results made from outdated data
+                    sources = source_fingerprint(destination, weather)
+                else:
+                    prompt = PROMPT_BUILDERS[kind](state)
+                job = jobs[key] = BatchJob(
+                    key=key,
+                    kind=kind,
+                    prompt=prompt,
+                    destination=destination,
+                    duration=state.preferences.get("duration", 7),
+                    sources=sources,
+                )
+            job.profiles.append(profile)
+    return list(jobs.values())
+
+
+def completed_keys(path):
+    """Keys already written to a results file (empty if it doesn't exist)."""
+    keys = set()
+    if not os.path.exists(path):
+        return keys
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                keys.add(json.loads(line)["key"])
+            except (ValueError, KeyError):
+                # A run killed mid-write can leave a truncated last line
+                continue
+    return keys
+
+
+def is_rate_limited(exc):
+    """Whether an exception from the model client means "slow down".
+
+    Covers Google's ResourceExhausted/TooManyRequests, OpenAI's RateLimitError
+    and anything carrying an HTTP 429 status.
+    """
+    name = type(exc).__name__
+    if name in ("ResourceExhausted", "TooManyRequests", "RateLimitError"):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    return status == 429 or "429" in str(exc)
+
+
+def retry_after(exc):
+    """Server-suggested delay in seconds, if the exception carries one."""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class BatchStats:
+    """Counters for one `BatchRunner.run`."""
+    profiles: int = 0
+    prompts: int = 0
+    skipped: int = 0
+    completed: int = 0
+    failed: int = 0
+    rate_limited: int = 0
+    elapsed: float = 0.0
+
+    def as_dict(self):
+        return {
+            "profiles": self.profiles,
+            "prompts": self.prompts,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+class BatchRunner:
+    """Fan prompts out to the model with bounded concurrency and backoff.
+
+    When any call is rate limited, every worker pauses until the backoff
+    delay has passed, so the pool as a whole slows down instead of each
+    worker hammering the API independently. Failed prompts are not written,
+    so they are retried on the next run.
+    """
+
+    def __init__(self, llm, max_concurrency=8, max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._resume_at = 0.0
+
+    async def _generate(self, prompt_string, kind, stats):
+        attempt = 0
+        while True:
+            pause = self._resume_at - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                return await agenerate_text(model_for(self.llm, kind), prompt_string)
+            except Exception as exc:
+                if not is_rate_limited(exc) or attempt >= self.max_retries:
+                    raise
+                stats.rate_limited += 1
+                # Exponential backoff with full jitter, unless the server says otherwise
+                delay = retry_after(exc)
+                if delay is None:
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                attempt += 1
+
+    async def run(self, profiles, output_path, kinds=KINDS):
+        """Generate every missing result for `profiles` into `output_path`."""
+        start = time.perf_counter()
+        planned = [(profile, profile_state(profile)) for profile in profiles]
+        forecasts = {}
+        if "itinerary" in kinds:
+            # Every forecast up front, in batched requests that don't block the loop
+            forecasts = await get_weather_service().get_many([top_destination(state)["name"]
+                                                             for _, state in planned])
+        jobs = _plan_jobs(planned, kinds, forecasts)
+        done = completed_keys(output_path)
+        pending = [job for job in jobs if job.key not in done]
+        stats = BatchStats(profiles=len(planned), prompts=len(jobs), skipped=len(jobs) - len(pending))
+        # A scheduled model queues these behind every interactive call
+        with session_context("batch", bulk=True):
+            await self._run(pending, output_path, stats)
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    async def _run(self, pending, output_path, stats):
+        queue = asyncio.Queue()
+        for job in pending:
+            queue.put_nowait(job)
+
+        with open(output_path, "a", encoding="utf-8") as out:
+            async def worker():
+                while not queue.empty():
+                    job = queue.get_nowait()
+                    try:
+                        text = await self._generate(job.prompt, job.kind, stats)
+                    except Exception as exc:
+                        stats.failed += 1
+                        logger.warning("%s for %s failed: %r", job.kind, job.destination, exc)
+                        continue
+                    record = {
+                        "key": job.key,
+                        "kind": job.kind,
+                        "destination": job.destination,
+                        "duration": job.duration,
+                        "profiles": job.profiles,
+                        "text": text,
+                    }
+                    if job.sources is not None:
+                        record["sources"] = job.sources
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    stats.completed += 1
+
+            workers = min(self.max_concurrency, len(pending))
+            await asyncio.gather(*(worker() for _ in range(workers)))
+
+
+def _read_profiles(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("profiles", nargs="?", help="JSON-lines file of preference dicts")
+    parser.add_argument("output", help="JSON-lines results file (appended to; resumable)")
+    parser.add_argument("--catalog", action="store_true", help="every destination x 2-7 days x season")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    if not args.catalog and not args.profiles:
+        parser.error("give a profiles file or --catalog")
+
+    from dotenv import load_dotenv
+    from agent.providers import create_llm
+
+    logging.basicConfig(format="[batch] %(message)s")
+    load_dotenv()
+    llm = create_llm()
+
+    profiles = catalog_profiles() if args.catalog else _read_profiles(args.profiles)
+    runner = BatchRunner(llm, max_concurrency=args.concurrency)
+    stats = asyncio.run(runner.run(profiles, args.output, kinds=args.kinds))
+    print(json.dumps(stats.as_dict()))
+
+
+if __name__ == "__main__":
+    main()
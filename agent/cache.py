@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from agent.llm import response_text
+
+
+def canonicalize_prompt(prompt_string):
+    """Normalize a prompt so trivially different requests share a cache key.
+
+    Applies Unicode NFKC, lowercases, and collapses all whitespace runs.
+    """
+    text = unicodedata.normalize("NFKC", prompt_string).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(prompt_string, namespace=""):
+    """Return the exact-match cache key for a prompt."""
+    canonical = canonicalize_prompt(prompt_string)
+    return hashlib.sha256(f"{namespace}\0{canonical}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for a `CachedLLM`."""
+    hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+
+    @property
+    def lookups(self):
+        return self.hits + self.semantic_hits + self.misses
+
+    @property
+    def hit_rate(self):
+        return (self.hits + self.semantic_hits) / self.lookups if self.lookups else 0.0
+
+    def as_dict(self):
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+class MemoryCacheStore:
+    """In-process LRU cache with an optional TTL (seconds)."""
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheStore:
+    """On-disk cache in SQLite with TTL and least-recently-used eviction."""
+
+    def __init__(self, path, max_entries=10_000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl and row[1] + self.ttl < now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # Evict least recently used rows beyond the size limit
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+class SemanticIndex:
+    """Embedding-similarity tier mapping near-duplicate prompts to cached keys.
+
+    `embed` is any callable returning a vector (list of floats) for a string.
+    Vectors are kept in memory; the responses themselves live in the store.
+    """
+
+    def __init__(self, embed, threshold=0.95, max_entries=1024):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def add(self, key, text):
+        vector = self._normalize(self.embed(text))
+        with self._lock:
+            self._entries[key] = vector
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def nearest(self, text):
+        """Return the key of the most similar prompt above the threshold, if any."""
+        query = self._normalize(self.embed(text))
+        best_key, best_score = None, self.threshold
+        with self._lock:
+            for key, vector in self._entries.items():
+                score = sum(a * b for a, b in zip(query, vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+        return best_key
+
+
+class CachedResponse:
+    """Minimal stand-in for a model response served from the cache."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class CachedLLM:
+    """Wrap any `generate_content` model with a response cache.
+
+    Lookups go through exact keys over canonicalized prompts first, then the
+    optional `semantic` tier. Streaming calls are supported: hits are replayed
+    as a single chunk, misses are passed through and stored once complete.
+
+    Usage:
+        llm = CachedLLM(GenerativeModel("gemini-1.5-pro"), SQLiteCacheStore("llm_cache.db"))
+        travel_agent = build_travel_agent(llm)
+        print(llm.stats.as_dict())
+    """
+
+    def __init__(self, llm, store=None, semantic=None, namespace=None):
+        self.llm = llm
+        self.store = store if store is not None else MemoryCacheStore()
+        self.semantic = semantic
+        self.namespace = namespace if namespace is not None else getattr(llm, "model_name", "")
+        self.stats = CacheStats()
+
+    def __getattr__(self, name):
+        # Expose the wrapped model's other attributes (model_name etc.)
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def _lookup(self, prompt_string):
+        key = cache_key(prompt_string, self.namespace)
+        cached = self.store.get(key)
+        if cached is not None:
+            self.stats.hits += 1
+            return key, cached
+
+        if self.semantic is not None:
+            similar = self.semantic.nearest(canonicalize_prompt(prompt_string))
+            cached = self.store.get(similar) if similar else None
+            if cached is not None:
+                self.stats.semantic_hits += 1
+                return key, cached
+
+        self.stats.misses += 1
+        return key, None
+
+    def _remember(self, key, prompt_string, text):
+        self.store.set(key, text)
+        if self.semantic is not None:
+            self.semantic.add(key, canonicalize_prompt(prompt_string))
+
+    def _stream_and_remember(self, key, prompt_string, response):
+        chunks = []
+        for chunk in response:
+            chunks.append(response_text(chunk))
+            yield chunk
+        self._remember(key, prompt_string, "".join(chunks))
+
+    def generate_content(self, prompt_string, stream=False, **kwargs):
+        key, cached = self._lookup(prompt_string)
+        if cached is not None:
+            return [CachedResponse(cached)] if stream else CachedResponse(cached)
+
+        if stream:
+            response = self.llm.generate_content(prompt_string, stream=True, **kwargs)
+            return self._stream_and_remember(key, prompt_string, response)
+
+        response = self.llm.generate_content(prompt_string, **kwargs)
+        self._remember(key, prompt_string, response_text(response))
+        return response
+
+    async def _astream_and_remember(self, key, prompt_string, response):
+        chunks = []
+        async for chunk in response:
+            chunks.append(response_text(chunk))
+            yield chunk
+        self._remember(key, prompt_string, "".join(chunks))
+
+    async def _areplay(self, text):
+        yield CachedResponse(text)
+
+    async def generate_content_async(self, prompt_string, stream=False, **kwargs):
+        key, cached = self._lookup(prompt_string)
+        if cached is not None:
+            return self._areplay(cached) if stream else CachedResponse(cached)
+
+        if not hasattr(self.llm, "generate_content_async"):
+            response = await asyncio.to_thread(self.llm.generate_content, prompt_string, **kwargs)
+            text = response_text(response)
+            self._remember(key, prompt_string, text)
+            return self._areplay(text) if stream else response
+
+        if stream:
+            response = await self.llm.generate_content_async(prompt_string, stream=True, **kwargs)
+            return self._astream_and_remember(key, prompt_string, response)
+
+        response = await self.llm.generate_content_async(prompt_string, **kwargs)
+        self._remember(key, prompt_string, response_text(response))
+        return response
+
+
+def find_caches(llm):
+    """Every `CachedLLM` inside a model and the wrappers around it.
+
+    Follows the models a wrapper holds (a `ModelRouter`'s per-role models, a
+    `HedgedModel`'s primary and backup, a `ScheduledModel`'s model), so the
+    caches are found however the model was composed. Shared models count once.
+    """
+    caches, seen, pending = [], set(), [llm]
+    while pending:
+        model = pending.pop()
+        if id(model) in seen:
+            continue
+        seen.add(id(model))
+        if isinstance(model, CachedLLM):
+            caches.append(model)
+        # vars(), not getattr: CachedLLM forwards unknown attributes to its model
+        for value in vars(model).values() if hasattr(model, "__dict__") else ():
+            for inner in value.values() if isinstance(value, dict) else (value,):
+                if hasattr(inner, "generate_content") and not isinstance(inner, type):
+                    pending.append(inner)
+    return caches
+
+
+def cache_stats(llm):
+    """Combined `CacheStats` of every cache in `llm` (see `find_caches`), or None."""
+    caches = find_caches(llm)
+    if not caches:
+        return None
+    return CacheStats(
+        hits=sum(cache.stats.hits for cache in caches),
+        semantic_hits=sum(cache.stats.semantic_hits for cache in caches),
+        misses=sum(cache.stats.misses for cache in caches),
+    )
@@ -0,0 +1,226 @@
+"""Durable per-session checkpoints in SQLite.
+
+After every graph node, the state change is appended as a delta (see
+`agent.records.pack_state`): the new history messages plus the small fields,
+never the whole conversation. Encoding happens on the node's thread. The
+SQLite writes happen on a background thread that commits whatever has queued
+up in one transaction, so nodes never wait on disk.
+
+Every `snapshot_every` deltas a session is compacted into a single snapshot.
+Resuming loads one snapshot and at most `snapshot_every` deltas, however
+long the conversation is.
+"""
+import functools
+import inspect
+import logging
+import queue
+import sqlite3
+import threading
+
+from agent.records import pack_state, unpack_state
+
+_STOP = object()
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCheckpointer:
+    """Append-only delta log with periodic snapshots, in WAL mode."""
+
+    def __init__(self, path, snapshot_every=16, max_batch=256):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.max_batch = max_batch
+        self._recorded = {}         # session_id -> history length already written
+        # session_id -> write failures so far; deltas queued before the latest
+        # failure build on lost data and are skipped
+        self._epochs = {}
+        self._record_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._read_lock = threading.Lock()
+
+        self._read_conn = self._connect()
+        self._read_conn.executescript(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "session_id TEXT PRIMARY KEY, upto INTEGER NOT NULL, data BLOB NOT NULL);"
+            # AUTOINCREMENT: ids must never be reused once compaction deletes rows
+            "CREATE TABLE IF NOT EXISTS deltas ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, data BLOB NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS deltas_session ON deltas (session_id, id);"
+        )
+        self._read_conn.commit()
+        self._writer = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only risks the last commits on power loss, not corruption
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, state):
+        """Queue the change since the last checkpoint of `state.session_id`."""
+        session_id = state.session_id
+        if not session_id:
+            return
+        with self._record_lock:
+            start = self._recorded.get(session_id, 0)
+            if start > len(state.history):
+                start = 0
+            self._queue.put((session_id, pack_state(state, history_start=start), self._epochs.get(session_id, 0)))
+            self._recorded[session_id] = len(state.history)
+
+    def rewind(self, state):
+        """Checkpoint `state` in full if later changes were already recorded.
+
+        For a turn that failed after some of its nodes were checkpointed:
+        `state` is the session as it was before the turn.
+        """
+        session_id = state.session_id
+        with self._record_lock:
+            if not session_id or self._recorded.get(session_id, 0) == len(state.history):
+                return
+            self._recorded.pop(session_id, None)
+        self.record(state)
+
+    def wrap(self, node):
+        """Wrap a graph node (sync or async) so its result is checkpointed."""
+        if inspect.iscoroutinefunction(node):
+            @functools.wraps(node)
+            async def _checkpointed_async(state):
+                result = await node(state)
+                self.record(result)
+                return result
+            return _checkpointed_async
+
+        @functools.wraps(node)
+        def _checkpointed(state):
+            result = node(state)
+            self.record(result)
+            return result
+        return _checkpointed
+
+    def load(self, session_id):
+        """Rebuild the latest state for a session, or None if it has none."""
+        self.flush()
+        with self._read_lock:
+            snapshot = self._read_conn.execute(
+                "SELECT upto, data FROM snapshots WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            upto = snapshot[0] if snapshot else 0
+            deltas = self._read_conn.execute(
+                "SELECT data FROM deltas WHERE session_id = ? AND id > ? ORDER BY id", (session_id, upto)
+            ).fetchall()
+        if snapshot is None and not deltas:
+            return None
+        state = unpack_state(snapshot[1]) if snapshot else None
+        for (data,) in deltas:
+            state = unpack_state(data, state.history if state else None)
+        with self._record_lock:
+            self._recorded[session_id] = len(state.history)
+        return state
+
+    def forget(self, session_id):
+        """Drop a session's checkpoints."""
+        self.flush()
+        with self._record_lock:
+            self._recorded.pop(session_id, None)
+        with self._read_lock:
+            self._read_conn.execute("DELETE FROM snapshots WHERE session_id = ?", (session_id,))
+            self._read_conn.execute("DELETE FROM deltas WHERE session_id = ?", (session_id,))
+            self._read_conn.commit()
+
+    def flush(self):
+        """Block until every queued delta is committed."""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._read_conn.close()
+
+    def _write_loop(self):
+        conn = self._connect()
+        pending = {}    # session_id -> deltas since its snapshot (None = unknown)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            with self._record_lock:
+                items = [(session_id, data) for session_id, data, epoch in
+                         (item for item in batch if item is not _STOP) if epoch == self._epochs.get(session_id, 0)]
+            try:
+                with conn:
+                    conn.executemany("INSERT INTO deltas (session_id, data) VALUES (?, ?)", items)
+            except Exception:
+                # The deltas are lost, so later ones for these sessions would
+                # build on history that was never written: start them over
+                logger.exception("Failed to write %d checkpoint deltas", len(items))
+                self._restart({session_id for session_id, _ in items})
+                pending.clear()
+            else:
+                self._compact_due(conn, items, pending)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _restart(self, session_ids):
+        """Make the next checkpoint of each session a full one and skip the
+        deltas already queued for it."""
+        with self._record_lock:
+            for session_id in session_ids:
+                self._epochs[session_id] = self._epochs.get(session_id, 0) + 1
+                self._recorded.pop(session_id, None)
+
+    def _compact_due(self, conn, items, pending):
+        try:
+            for session_id, _ in items:
+                if pending.get(session_id) is None:
+                    pending[session_id] = self._count_deltas(conn, session_id)
+                else:
+                    pending[session_id] += 1
+                if pending[session_id] >= self.snapshot_every:
+                    self._compact(conn, session_id)
+                    pending[session_id] = 0
+        except Exception:
+            # Keep the writer alive; a failed compaction is retried on the next delta
+            logger.exception("Failed to compact checkpoints")
+            pending.clear()
+
+    @staticmethod
+    def _count_deltas(conn, session_id):
+        row = conn.execute(
+            "SELECT COUNT(*) FROM deltas WHERE session_id = ? AND id > "
+            "COALESCE((SELECT upto FROM snapshots WHERE session_id = ?), 0)",
+            (session_id, session_id),
+        ).fetchone()
+        return row[0]
+
+    @staticmethod
+    def _compact(conn, session_id):
+        """Fold a session's deltas into its snapshot."""
+        snapshot = conn.execute("SELECT upto, data FROM snapshots WHERE session_id = ?", (session_id,)).fetchone()
+        upto = snapshot[0] if snapshot else 0
+        rows = conn.execute(
+            "SELECT id, data FROM deltas WHERE session_id = ? AND id > ? ORDER BY id", (session_id, upto)
+        ).fetchall()
+        if not rows:
+            return
+        state = unpack_state(snapshot[1]) if snapshot else None
+        for _, data in rows:
+            state = unpack_state(data, state.history if state else None)
+        last_id = rows[-1][0]
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (session_id, upto, data) VALUES (?, ?, ?)",
+                (session_id, last_id, pack_state(state)),
+            )
+            conn.execute("DELETE FROM deltas WHERE session_id = ? AND id <= ?", (session_id, last_id))
@@ -0,0 +1,79 @@
+"""Prompt compaction: project only the fields a prompt needs, serialized tightly.
+
+Prompts used to embed whole records with `json.dumps(..., indent=2)`: every
+destination's budget for all three tiers, the internal `match_score`, and a
+follow-up's full itinerary as an escaped JSON string. The projections below
+keep just what each prompt uses, and `compact_json` drops the whitespace
+and keeps non-ASCII text (₹) as is instead of escaping it.
+
+Prompt templates are laid out as static instructions followed by the
+per-request data (see `template`), so every prompt of a kind starts with the
+same prefix and providers that cache prompt prefixes can reuse it.
+"""
+import inspect
+import json
+
+# Destination fields the recommendation and itinerary prompts use
+DESTINATION_FIELDS = ("name", "country", "tags", "best_seasons", "ideal_duration")
+# Preference keys that are bookkeeping rather than something the user asked for
+INTERNAL_PREFERENCES = ("error",)
+
+
+def compact_json(value):
+    """JSON without whitespace or ASCII escaping, for embedding in prompts."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def template(instructions, data):
+    """Join dedented static instructions and the per-request data section.
+
+    Everything before the first placeholder is the same for every request.
+    """
+    return inspect.cleandoc(instructions) + "\n\n" + inspect.cleandoc(data) + "\n"
+
+
+def project_preferences(preferences):
+    """Preferences without empty values or internal keys."""
+    return {key: value for key, value in preferences.items()
+            if key not in INTERNAL_PREFERENCES and value not in (None, "", [], {})}
+
+
+def project_destination(destination, budget=None):
+    """The fields of a destination record a prompt needs.
+
+    Of the per-tier `budget_inr` ranges, only the traveller's tier (or the
+    destination's own level when no budget is known) is kept.
+    """
+    projected = {key: destination[key] for key in DESTINATION_FIELDS if key in destination}
+    tiers = destination.get("budget_inr")
+    tier = budget if budget in (tiers or {}) else destination.get("budget_level")
+    if tiers and tier in tiers:
+        projected["budget_inr"] = tiers[tier]
+    elif "budget_level" in destination:
+        projected["budget_level"] = destination["budget_level"]
+    return projected
+
+
+def project_destinations(destinations, preferences):
+    budget = preferences.get("budget")
+    return [project_destination(destination, budget) for destination in destinations]
+
+
+def project_weather(weather, days):
+    """The forecast for the first `days` days of the trip only."""
+    if not isinstance(weather, dict) or not isinstance(weather.get("forecast"), list):
+        return weather
+    try:
+        days = max(1, int(days))
+    except (TypeError, ValueError):
+        return weather
+    return dict(weather, forecast=weather["forecast"][:days])
+
+
+def itinerary_text(itinerary):
+    """A prose itinerary as plain text (no JSON string escaping)."""
+    if not itinerary:
+        return "(none yet)"
+    places = " → ".join(stop["name"] for stop in itinerary["route"]) if itinerary.get("route") else None
+    header = f"{places or itinerary.get('destination', 'Unknown')}, {itinerary.get('duration', '?')} days"
+    return f"{header}\n{itinerary.get('plan', '')}".strip()
@@ -0,0 +1,93 @@
+import math
+import re
+from agent.state import AgentState
+from agent.structured import RECOMMENDATIONS_HEADER
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)."""
+    return math.ceil(len(text) / 4)
+
+
+def summarize_message(message, max_chars=160):
+    """One-line extractive summary: the first sentence, truncated."""
+    content = " ".join(message["content"].split())
+    first_sentence = re.split(r"(?<=[.!?])\s", content, maxsplit=1)[0]
+    if len(first_sentence) > max_chars:
+        first_sentence = first_sentence[:max_chars - 3].rstrip() + "..."
+    return f"{message['role']}: {first_sentence}"
+
+
+class ConversationContext:
+    """Builds a token-bounded conversation history for follow-up prompts.
+
+    - System bookkeeping entries are dropped.
+    - Assistant messages containing the current itinerary are dropped, since the
+      prompt already includes the itinerary once. So are rendered structured
+      recommendations, which the prompt includes as JSON.
+    - The most recent messages are kept verbatim within `token_budget` minus
+      `summary_budget`. Older messages are folded into a rolling summary.
+
+    The summary is cached on the state (`context_summary`, `summarized_until`)
+    and only extended with newly evicted messages, so it is never rebuilt from
+    scratch.
+    """
+
+    def __init__(self, token_budget=1200, summary_budget=300):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+
+    def _is_relevant(self, message, state: AgentState):
+        if message["role"] == "system":
+            return False
+        plan = state.itinerary.get("plan") if state.itinerary else None
+        if plan and message["role"] == "assistant" and plan in message["content"]:
+            return False
+        if (state.recommendations and message["role"] == "assistant"
+                and message["content"].startswith(RECOMMENDATIONS_HEADER)):
+            return False
+        return True
+
+    def _extend_summary(self, summary, messages):
+        lines = summary.splitlines() if summary else []
+        lines.extend(summarize_message(message) for message in messages)
+        # Keep the newest summary lines that fit the summary budget
+        kept, used = [], 0
+        for line in reversed(lines):
+            used += estimate_tokens(line) + 1
+            if used > self.summary_budget:
+                break
+            kept.append(line)
+        return "\n".join(reversed(kept))
+
+    def build(self, state: AgentState, upto):
+        """Return the formatted history for messages before index `upto`."""
+        entries = [(i, msg) for i, msg in enumerate(state.history[:upto]) if self._is_relevant(msg, state)]
+
+        # Step 1: Walk back from the newest message, keeping what fits verbatim.
+        # Messages already folded into the summary are never shown verbatim again.
+        budget = self.token_budget - self.summary_budget
+        recent = []
+        for i, msg in reversed(entries):
+            line = f"{msg['role']}: {msg['content']}"
+            cost = estimate_tokens(line) + 1
+            if i < state.summarized_until or cost > budget:
+                break
+            recent.append((i, line))
+            budget -= cost
+        recent.reverse()
+
+        # Step 2: Fold any newly evicted messages into the cached summary
+        boundary = recent[0][0] if recent else upto
+        if boundary > state.summarized_until:
+            evicted = [msg for i, msg in entries if state.summarized_until <= i < boundary]
+            state.context_summary = self._extend_summary(state.context_summary, evicted)
+            state.summarized_until = boundary
+
+        # Step 3: Summary first, then the recent messages
+        parts = []
+        if state.context_summary:
+            parts.append(f"Summary of earlier conversation:\n{state.context_summary}")
+        if recent:
+            parts.append("\n".join(line for _, line in recent))
+        return "\n\n".join(parts)
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+
+# Marker text identifying which node a prompt came from
+PROMPT_KINDS = [
+    ("preferences", "Extract travel preferences"),
+    ("recommendations", "recommend the top 3"),
+    ("itinerary", "day-by-day itinerary"),
+    ("followup", "follow-up question"),
+]
+
+
+# Structured prompts end with the JSON schema of the expected reply
+SCHEMA_MARKER = "matching this JSON schema"
+
+
+def prompt_kind(prompt_string):
+    """Return which node produced a prompt ("other" if unknown)."""
+    for kind, marker in PROMPT_KINDS:
+        if marker in prompt_string:
+            return kind
+    return "other"
+
+
+class FakeResponse:
+    """Response object with the same `.text` attribute as Gemini responses."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeLLM:
+    """Deterministic stand-in for a `generate_content` model.
+
+    Sleeps `latency` seconds per call (spread across chunks when streaming) and
+    returns a canned reply of `response_words` words, so graph overhead can be
+    measured without network calls. Both settings take either a single value
+    or a dict keyed by prompt kind ("preferences", "recommendations",
+    "itinerary", "followup"). Preference-extraction prompts always get a small
+    JSON object back, and structured prompts (see `agent.structured`) get JSON
+    that fills every field of the schema up to its length limit. Calls are
+    counted per kind in `calls_by_kind`.
+    """
+
+    def __init__(self, latency=0.0, response_words=200, chunk_words=20,
+                 preferences=None):
+        self.latency = latency
+        self.response_words = response_words
+        self.chunk_words = chunk_words
+        self.preferences = preferences or {"budget": "medium", "duration": 5, "interests": ["nature", "food"]}
+        self.calls = 0
+        self.calls_by_kind = {}
+
+    @staticmethod
+    def _setting(value, kind):
+        return value.get(kind, 0) if isinstance(value, dict) else value
+
+    def _reply(self, prompt_string):
+        kind = prompt_kind(prompt_string)
+        self.calls += 1
+        self.calls_by_kind[kind] = self.calls_by_kind.get(kind, 0) + 1
+        if kind == "preferences":
+            text = f"```json\n{json.dumps(self.preferences)}\n```"
+        elif SCHEMA_MARKER in prompt_string:
+            schema = prompt_string.split(SCHEMA_MARKER, 1)[1].split(":", 1)[1].strip().splitlines()[0]
+            text = json.dumps(_fill(json.loads(schema)))
+        else:
+            text = " ".join(f"word{i}" for i in range(self._setting(self.response_words, kind)))
+        return text, self._setting(self.latency, kind)
+
+    def _chunks(self, text):
+        words = text.split(" ")
+        return [" ".join(words[i:i + self.chunk_words]) + (" " if i + self.chunk_words < len(words) else "")
+                for i in range(0, len(words), self.chunk_words)]
+
+    def generate_content(self, prompt_string, stream=False, **kwargs):
+        text, latency = self._reply(prompt_string)
+        if not stream:
+            time.sleep(latency)
+            return FakeResponse(text)
+        return self._stream(text, latency)
+
+    def _stream(self, text, latency):
+        chunks = self._chunks(text)
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            yield FakeResponse(chunk)
+
+    async def generate_content_async(self, prompt_string, stream=False, **kwargs):
+        text, latency = self._reply(prompt_string)
+        if not stream:
+            await asyncio.sleep(latency)
+            return FakeResponse(text)
+        return self._astream(text, latency)
+
+    async def _astream(self, text, latency):
+        chunks = self._chunks(text)
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield FakeResponse(chunk)
+
+
+def _fill(schema, index=1):
+    """Largest value allowed by a JSON schema: full-length strings, max items."""
+    kind = schema["type"]
+    if kind == "object":
+        return {name: _fill(sub, index) for name, sub in schema["properties"].items()}
+    if kind == "array":
+        return [_fill(schema["items"], i) for i in range(1, schema.get("maxItems", 1) + 1)]
+    if kind == "integer":
+        return index
+    words = " ".join(f"word{i}" for i in range(schema.get("maxLength", 40)))
+    return words[:schema.get("maxLength", 40)].rstrip()
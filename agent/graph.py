@@ -1,40 +1,80 @@
-import os
-from typing import TypedDict, Annotated, List
 from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.runnables.graph import MermaidDrawMethod
-from dotenv import load_dotenv
 from agent.state import AgentState
-from agent.nodes.preference_extractor import extract_preferences
+from agent.tracing import traced_node
+from agent.nodes.preference_extractor import extract_preferences, aextract_preferences
 from agent.nodes.destination_finder import find_destinations
-from agent.nodes.itinerary_creator import create_itinerary
-from agent.nodes.followup_handler import handle_followup
+from agent.nodes.itinerary_creator import create_itinerary, acreate_itinerary
+from agent.nodes.followup_handler import handle_followup, ahandle_followup
+from agent.nodes.trip_planner import aplan_trip
+from agent.routing import ANSWER, ITINERARY, RANK, next_stage
 
 
-def build_travel_agent(llm):
+def _node(name, node, checkpointer):
+    """Wrap a node for tracing and, if enabled, checkpointing."""
+    if checkpointer is not None:
+        node = checkpointer.wrap(node)
+    return traced_node(name, node)
+
+
+def build_travel_agent(llm, itinerary_store=None, checkpointer=None, structured=False):
+    """Build the travel agent graph.
+
+    Follow-up turns are routed by `agent.routing.next_stage`, so unchanged
+    preferences go straight to `handle_followup`. Every node is wrapped with
+    `traced_node`, which costs one flag check while tracing is off.
+    An optional `ItineraryStore` serves precomputed itineraries, and an
+    optional `SQLiteCheckpointer` persists each node's state change. With
+    `structured`, recommendations and itineraries are generated as bounded
+    JSON and rendered locally (see `agent.structured`).
+    """
     workflow = StateGraph(AgentState)
 
     # Add nodes
-    workflow.add_node("extract_preferences", extract_preferences(llm))
-    workflow.add_node("find_destinations", find_destinations(llm))
-    workflow.add_node("create_itinerary", create_itinerary(llm))
-    workflow.add_node("handle_followup", handle_followup(llm))
+    workflow.add_node("extract_preferences", _node("extract_preferences", extract_preferences(llm), checkpointer))
+    workflow.add_node("find_destinations", _node("find_destinations", find_destinations(llm, structured), checkpointer))
+    workflow.add_node("create_itinerary", _node("create_itinerary", create_itinerary(llm, itinerary_store, structured), checkpointer))
+    workflow.add_node("handle_followup", _node("handle_followup", handle_followup(llm), checkpointer))
 
     # Add edges
-    workflow.add_edge("extract_preferences", "find_destinations")
+    # Follow-ups only re-run the stages whose inputs changed
+    workflow.add_conditional_edges("extract_preferences", next_stage, {
+        RANK: "find_destinations",
+        ITINERARY: "create_itinerary",
+        ANSWER: "handle_followup",
+    })
     workflow.add_edge("find_destinations", "create_itinerary")
+    workflow.add_edge("create_itinerary", END)
+    workflow.add_edge("handle_followup", END)
+
+    workflow.set_entry_point("extract_preferences")
+    return workflow.compile()
 
-    def route_after_itinerary(state):
-        return "handle_followup" if state.is_followup else END
 
-    workflow.add_conditional_edges("create_itinerary", route_after_itinerary)
+def build_async_travel_agent(llm, itinerary_store=None, checkpointer=None, structured=False):
+    """Build the travel agent graph for `ainvoke`.
 
-    def route_after_followup(state):
-        return "extract_preferences" if state.is_followup else END
+    Destination recommendations and the itinerary are generated concurrently
+    in a single `plan_trip` node, so a first turn waits for two model
+    round-trips instead of three.
+    """
+    workflow = StateGraph(AgentState)
 
-    workflow.add_conditional_edges("handle_followup", route_after_followup)
+    # Add nodes
+    workflow.add_node("extract_preferences", _node("extract_preferences", aextract_preferences(llm), checkpointer))
+    workflow.add_node("plan_trip", _node("plan_trip", aplan_trip(llm, itinerary_store, structured), checkpointer))
+    workflow.add_node("create_itinerary", _node("create_itinerary", acreate_itinerary(llm, itinerary_store, structured), checkpointer))
+    workflow.add_node("handle_followup", _node("handle_followup", ahandle_followup(llm), checkpointer))
+
+    # Add edges
+    # Follow-ups only re-run the stages whose inputs changed
+    workflow.add_conditional_edges("extract_preferences", next_stage, {
+        RANK: "plan_trip",
+        ITINERARY: "create_itinerary",
+        ANSWER: "handle_followup",
+    })
+    workflow.add_edge("plan_trip", END)
+    workflow.add_edge("create_itinerary", END)
+    workflow.add_edge("handle_followup", END)
 
     workflow.set_entry_point("extract_preferences")
     return workflow.compile()
@@ -0,0 +1,326 @@
+"""Precomputed itineraries served in place of full generation.
+
+Entries are keyed on (destination, duration, budget, interest set, season).
+A lookup finds the nearest stored profile for the same destination (and
+season, when both name one) and serves its plan. If an `editor` model is configured, a near match goes through a cheap
+edit pass that adapts the stored plan instead of generating one from scratch.
+Trips long enough to be planned as a multi-stop circuit are only served from
+the same profile: the route follows from the profile, and a plan written for
+other stops would not match the route shown above it.
+
+Each entry remembers a fingerprint of the destination record and its weather
+forecast, taken from the weather service's cache (the itinerary nodes fetch
+the forecast before looking up the store, so lookups never fetch). When
+either changes, old entries for that destination stop matching. The weather
+service calls `invalidate()` when a refreshed forecast differs, and the
+`run_refresh()` background task picks up edits to data/destinations.json.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from collections import namedtuple
+from dataclasses import dataclass
+
+from langchain_core.prompts import ChatPromptTemplate
+from agent.llm import agenerate_text, generate_text
+from agent.tools.destination_db import get_catalog
+from agent.tools.route_planner import MIN_CIRCUIT_DAYS
+from agent.tools.weather_api import get_weather_service
+
+BUDGET_RANK = {"low": 0, "medium": 1, "high": 2}
+DEFAULT_DURATION = 7
+# Seconds between checks of data/destinations.json for edits
+REFRESH_INTERVAL = 5.0
+
+ItineraryProfile = namedtuple("ItineraryProfile", ["destination", "duration", "budget", "interests", "season"])
+
+# Prompt for adapting a stored itinerary to a nearby profile
+edit_prompt = ChatPromptTemplate.from_template(
+    """You are a travel agent assistant. Adapt the existing itinerary for {destination} below to
+    the traveller's preferences. Keep its structure and style and change only what the
+    differences require.
+
+    Existing itinerary ({stored_duration} days, budget: {stored_budget}, interests: {stored_interests}):
+    {plan}
+
+    Traveller's preferences: {trip_duration} days, budget: {budget}, interests: {interests}.
+
+    IMPORTANT: Always display all costs in Indian Rupees (₹).
+    The trip should last exactly {trip_duration} days.
+    """
+)
+
+
+def profile_of(preferences, destination):
+    """The store key for a destination name and a preferences dict."""
+    interests = preferences.get("interests") or []
+    season = preferences.get("season")
+    return ItineraryProfile(
+        destination=destination,
+        duration=preferences.get("duration", DEFAULT_DURATION),
+        budget=preferences.get("budget"),
+        interests=frozenset(i.lower() for i in interests),
+        season=season.lower() if isinstance(season, str) else None,
+    )
+
+
+def profile_distance(a, b):
+    """How far apart two profiles for the same destination are.
+
+    One unit per day of difference, per budget level, up to one unit for
+    the interest sets (Jaccard distance), and half a unit when only one of
+    them names a season. Profiles for different seasons never match (see
+    `ItineraryStore.nearest`).
+    """
+    distance = abs(a.duration - b.duration)
+    if a.budget != b.budget:
+        ranks = BUDGET_RANK.get(a.budget), BUDGET_RANK.get(b.budget)
+        distance += abs(ranks[0] - ranks[1]) if None not in ranks else 1
+    union = a.interests | b.interests
+    if union:
+        distance += 1 - len(a.interests & b.interests) / len(union)
+    if (a.season is None) != (b.season is None):
+        distance += 0.5
+    return distance
+
+
+def is_circuit(profile):
+    """Whether a profile's trip is long enough to get a multi-stop route."""
+    duration = profile.duration
+    return not isinstance(duration, bool) and isinstance(duration, (int, float)) and duration >= MIN_CIRCUIT_DAYS
+
+
+def source_fingerprint(destination, forecast):
+    """Hash of the inputs an itinerary depends on besides the preferences."""
+    catalog = get_catalog()
+    idx = catalog.name_index.get(destination)
+    record = catalog.destinations[idx] if idx is not None else {"name": destination}
+    payload = json.dumps([record, forecast], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class StoreStats:
+    """Outcome counters for `ItineraryStore` lookups."""
+    exact: int = 0
+    near: int = 0
+    edited: int = 0
+    misses: int = 0
+
+    def as_dict(self):
+        lookups = self.exact + self.near + self.edited + self.misses
+        return {
+            "exact": self.exact,
+            "near": self.near,
+            "edited": self.edited,
+            "misses": self.misses,
+            "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
+
+
+class ItineraryStore:
+    """In-memory itinerary store with nearest-profile lookup.
+
+    `max_distance` bounds how far a stored profile may be from the request
+    (see `profile_distance`). Without an `editor`, only entries with the same
+    duration are served, since the plan text can't be adjusted. Itineraries
+    generated on a miss are added back with `remember`. Lookups and `add`
+    need the destination's forecast in the weather service's cache; without
+    it they miss or store nothing.
+    """
+
+    def __init__(self, editor=None, max_distance=2.0):
+        self.editor = editor
+        self.max_distance = max_distance
+        self.stats = StoreStats()
+        self._entries = {}          # destination -> {profile: (fingerprint, plan)}
+        self._fingerprints = {}     # destination -> current fingerprint
+        self._data_mtime = _data_file_mtime()
+        get_weather_service().on_change(self.invalidate)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def _fingerprint(self, destination):
+        """The destination's current fingerprint, or None if its forecast isn't cached."""
+        fingerprint = self._fingerprints.get(destination)
+        if fingerprint is None:
+            forecast = get_weather_service().cached(destination)
+            if forecast is None:
+                return None
+            fingerprint = self._fingerprints[destination] = source_fingerprint(destination, forecast)
+        return fingerprint
+
+    def add(self, profile, plan, fingerprint=None):
+        """Store a plan for a profile (fingerprinted against current data by default)."""
+        fingerprint = fingerprint or self._fingerprint(profile.destination)
+        if fingerprint is None:
+            return
+        self._entries.setdefault(profile.destination, {})[profile] = (fingerprint, plan)
+
+    def remember(self, state, plan):
+        """Store an itinerary just generated for the state's top destination."""
+        if state.destinations:
+            self.add(profile_of(state.preferences, state.destinations[0]["name"]), plan)
+
+    def nearest(self, profile):
+        """Return (stored profile, plan, distance) for the closest valid entry, or None."""
+        entries = self._entries.get(profile.destination)
+        if not entries:
+            return None
+        current = self._fingerprint(profile.destination)
+        if current is None:
+            return None
+        best = None
+        for stored, (fingerprint, plan) in entries.items():
+            if fingerprint != current:
+                continue
+            if stored != profile and (is_circuit(stored) or is_circuit(profile)):
+                continue
+            if self.editor is None and stored.duration != profile.duration:
+                continue
+            if None not in (stored.season, profile.season) and stored.season != profile.season:
+                continue
+            distance = profile_distance(profile, stored)
+            if distance <= self.max_distance and (best is None or distance < best[2]):
+                best = (stored, plan, distance)
+        return best
+
+    def _match(self, state):
+        if not state.destinations:
+            return None, None
+        profile = profile_of(state.preferences, state.destinations[0]["name"])
+        match = self.nearest(profile)
+        if match is None:
+            self.stats.misses += 1
+            return profile, None
+        return profile, match
+
+    def _edit_prompt(self, profile, stored, plan):
+        return edit_prompt.format(
+            destination=profile.destination,
+            stored_duration=stored.duration,
+            stored_budget=stored.budget or "any",
+            stored_interests=", ".join(sorted(stored.interests)) or "any",
+            plan=plan,
+            trip_duration=profile.duration,
+            budget=profile.budget or "any",
+            interests=", ".join(sorted(profile.interests)) or "any",
+        )
+
+    def _serve_stored(self, match, on_chunk):
+        """Return the stored plan if it can be served without an edit pass."""
+        _, plan, distance = match
+        if distance and self.editor is not None:
+            return None
+        if distance:
+            self.stats.near += 1
+        else:
+            self.stats.exact += 1
+        if on_chunk:
+            on_chunk(plan)
+        return plan
+
+    def get(self, state, on_chunk=None):
+        """Plan text for the state's top destination, or None to generate one.
+
+        The served text (edited or not) is also passed to `on_chunk`.
+        """
+        profile, match = self._match(state)
+        if match is None:
+            return None
+        plan = self._serve_stored(match, on_chunk)
+        if plan is not None:
+            return plan
+        self.stats.edited += 1
+        return generate_text(self.editor, self._edit_prompt(profile, *match[:2]), on_chunk=on_chunk)
+
+    async def aget(self, state, on_chunk=None):
+        """Async `get`: the edit pass doesn't block the event loop."""
+        profile, match = self._match(state)
+        if match is None:
+            return None
+        plan = self._serve_stored(match, on_chunk)
+        if plan is not None:
+            return plan
+        self.stats.edited += 1
+        return await agenerate_text(self.editor, self._edit_prompt(profile, *match[:2]), on_chunk=on_chunk)
+
+    def invalidate(self, destination=None):
+        """Recompute fingerprints (all, or one destination's) on next lookup.
+
+        Entries whose destination record or weather changed stop matching and
+        are dropped.
+        """
+        names = [destination] if destination is not None else set(self._fingerprints) | set(self._entries)
+        for name in names:
+            self._fingerprints.pop(name, None)
+            current = self._fingerprint(name)
+            if current is None:
+                continue    # checked against the forecast on the next lookup
+            entries = self._entries.get(name, {})
+            for profile in [p for p, (fingerprint, _) in entries.items() if fingerprint != current]:
+                del entries[profile]
+
+    def refresh_if_changed(self):
+        """Reload the catalog and invalidate if data/destinations.json changed."""
+        if not self._reload_catalog():
+            return False
+        self.invalidate()
+        return True
+
+    def _reload_catalog(self):
+        mtime = _data_file_mtime()
+        if mtime == self._data_mtime:
+            return False
+        self._data_mtime = mtime
+        get_catalog.cache_clear()
+        get_catalog()   # load it now rather than in the next request
+        return True
+
+    async def run_refresh(self, interval=REFRESH_INTERVAL):
+        """Background task that checks data/destinations.json every `interval` seconds.
+
+        The catalog is reloaded in a worker thread, off the event loop.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if await asyncio.to_thread(self._reload_catalog):
+                self.invalidate()
+
+    def load_batch_results(self, path):
+        """Add the itinerary records written by `agent.batch`. Returns the count."""
+        added = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("kind") != "itinerary":
+                    continue
+                for preferences in record["profiles"]:
+                    self.add(profile_of(preferences, record["destination"]), record["text"],
+                             fingerprint=record.get("sources"))
+                    added += 1
+        return added
+
+
+def load_store_from_env(variable="ITINERARY_STORE", editor=None):
+    """An `ItineraryStore` preloaded from the batch results file named by `variable`, or None."""
+    path = os.getenv(variable)
+    if not path:
+        return None
+    store = ItineraryStore(editor=editor)
+    if os.path.exists(path):
+        store.load_batch_results(path)
+    return store
+
+
+def _data_file_mtime():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "destinations.json")
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
@@ -0,0 +1,85 @@
+import asyncio
+from agent import tracing
+from agent.context import estimate_tokens
+from agent.models import model_name
+
+
+def response_text(response):
+    """Extract the text content from a `generate_content` response."""
+    try:
+        return response.text
+    except AttributeError:
+        return response.candidates[0].content if hasattr(response, "candidates") else str(response)
+
+
+def _record_sizes(span, llm, prompt_string, text):
+    span.set(
+        model=model_name(llm),
+        prompt_chars=len(prompt_string),
+        prompt_tokens=estimate_tokens(prompt_string),
+        response_chars=len(text),
+        response_tokens=estimate_tokens(text),
+    )
+
+
+def generate_text(llm, prompt_string, on_chunk=None):
+    """Send a prompt to the LLM and return the response text.
+
+    If `on_chunk` is given, the response is streamed and each text chunk is
+    passed to it as it arrives. The returned text is the same either way.
+    """
+    with tracing.span("llm.generate", streamed=on_chunk is not None) as span:
+        text = _generate_text(llm, prompt_string, on_chunk)
+        _record_sizes(span, llm, prompt_string, text)
+    return text
+
+
+def _generate_text(llm, prompt_string, on_chunk):
+    if on_chunk is None:
+        return response_text(llm.generate_content(prompt_string))
+
+    try:
+        response = llm.generate_content(prompt_string, stream=True)
+    except TypeError:
+        # Model doesn't support streaming: deliver the whole reply as one chunk
+        text = _generate_text(llm, prompt_string, None)
+        on_chunk(text)
+        return text
+
+    chunks = []
+    for chunk in response:
+        text = response_text(chunk)
+        chunks.append(text)
+        on_chunk(text)
+    return "".join(chunks)
+
+
+async def agenerate_text(llm, prompt_string, on_chunk=None):
+    """Async version of `generate_text`.
+
+    Uses the model's native `generate_content_async` when it has one (Gemini
+    does), otherwise runs the blocking call in a worker thread so other
+    coroutines keep running.
+    """
+    with tracing.span("llm.generate", streamed=on_chunk is not None) as span:
+        text = await _agenerate_text(llm, prompt_string, on_chunk)
+        _record_sizes(span, llm, prompt_string, text)
+    return text
+
+
+async def _agenerate_text(llm, prompt_string, on_chunk):
+    if not hasattr(llm, "generate_content_async"):
+        text = await asyncio.to_thread(_generate_text, llm, prompt_string, None)
+        if on_chunk is not None:
+            on_chunk(text)
+        return text
+
+    if on_chunk is None:
+        return response_text(await llm.generate_content_async(prompt_string))
+
+    chunks = []
+    async for chunk in await llm.generate_content_async(prompt_string, stream=True):
+        text = response_text(chunk)
+        chunks.append(text)
+        on_chunk(text)
+    return "".join(chunks)
@@ -0,0 +1,200 @@
+"""Model clients: per-node model selection and hedged requests.
+
+Nodes never call a model directly; each node factory resolves its model with
+`model_for(llm, role)`, where role is one of `ROLES`. A plain model serves
+every role, while a `ModelRouter` picks one per role:
+
+    router = ModelRouter(create_llm("gemini", "gemini-1.5-pro"), {
+        "preferences": create_llm("openai", "gpt-4o-mini"),
+    })
+    travel_agent = build_async_travel_agent(router)
+
+`HedgedModel` wraps a primary model with a backup: if the primary hasn't
+answered (or, when streaming, produced its first chunk) within `hedge_after`
+seconds, the same prompt is sent to the backup and whichever answers first is
+used. A primary that fails outright falls back to the backup immediately.
+Both wrappers expose the usual `generate_content(prompt, stream=...)` and
+`generate_content_async`, so they also work with `CachedLLM` and `agent.llm`.
+"""
+import asyncio
+import concurrent.futures
+from dataclasses import dataclass
+
+from agent import tracing
+
+ROLES = ("preferences", "recommendations", "itinerary", "followup")
+_END = object()
+
+
+def model_for(llm, role):
+    """Return the model that should serve `role` (the model itself unless routed)."""
+    return llm.for_role(role) if isinstance(llm, ModelRouter) else llm
+
+
+def model_name(llm):
+    """Best-effort model name, for traces and cache namespaces."""
+    return getattr(llm, "model_name", None) or type(llm).__name__
+
+
+class ModelRouter:
+    """Route each node role to its own model, falling back to `default`.
+
+    Calling the router directly uses the default model.
+    """
+
+    def __init__(self, default, models=None):
+        unknown = set(models or {}) - set(ROLES)
+        if unknown:
+            raise ValueError(f"Unknown model roles: {', '.join(sorted(unknown))}")
+        self.default = default
+        self.models = dict(models or {})
+        self.model_name = model_name(default)
+
+    def for_role(self, role):
+        return self.models.get(role, self.default)
+
+    def map(self, wrap):
+        """Return a router with every model wrapped (shared models stay shared)."""
+        wrapped = {}
+
+        def once(model):
+            if id(model) not in wrapped:
+                wrapped[id(model)] = wrap(model)
+            return wrapped[id(model)]
+
+        return ModelRouter(once(self.default), {role: once(model) for role, model in self.models.items()})
+
+    def generate_content(self, prompt_string, stream=False, **kwargs):
+        return self.default.generate_content(prompt_string, stream=stream, **kwargs)
+
+    async def generate_content_async(self, prompt_string, stream=False, **kwargs):
+        return await _acall(self.default, prompt_string, stream, kwargs)
+
+    async def aclose(self):
+        for model in {id(m): m for m in [self.default, *self.models.values()]}.values():
+            if hasattr(model, "aclose"):
+                await model.aclose()
+
+
+@dataclass
+class HedgeStats:
+    """Counters for a `HedgedModel`."""
+    requests: int = 0
+    hedged: int = 0         # backup request sent (slow or failed primary)
+    backup_wins: int = 0    # backup answered first
+
+    def as_dict(self):
+        return {"requests": self.requests, "hedged": self.hedged, "backup_wins": self.backup_wins}
+
+
+async def _acall(model, prompt_string, stream, kwargs):
+    """Call a model asynchronously, in a worker thread if it has no async API."""
+    if hasattr(model, "generate_content_async"):
+        return await model.generate_content_async(prompt_string, stream=stream, **kwargs)
+    response = await asyncio.to_thread(model.generate_content, prompt_string, **kwargs)
+    return _aonce(response) if stream else response
+
+
+async def _aonce(response):
+    yield response
+
+
+async def _afirst_chunk(model, prompt_string, kwargs):
+    stream = await _acall(model, prompt_string, True, kwargs)
+    return stream, await anext(stream, _END)
+
+
+async def _aresume(stream, first):
+    if first is not _END:
+        yield first
+        async for chunk in stream:
+            yield chunk
+
+
+def _first_chunk(model, prompt_string, kwargs):
+    stream = iter(model.generate_content(prompt_string, stream=True, **kwargs))
+    return stream, next(stream, _END)
+
+
+def _resume(stream, first):
+    if first is not _END:
+        yield first
+        yield from stream
+
+
+class HedgedModel:
+    """Send a backup request when the primary model is slow or fails."""
+
+    def __init__(self, primary, backup, hedge_after=2.0):
+        self.primary = primary
+        self.backup = backup
+        self.hedge_after = hedge_after
+        self.model_name = model_name(primary)
+        self.stats = HedgeStats()
+        self._executor = None
+
+    async def _arace(self, start):
+        """Run `start(primary)`, adding `start(backup)` after `hedge_after`."""
+        self.stats.requests += 1
+        primary = asyncio.ensure_future(start(self.primary))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done and primary.exception() is None:
+            return primary.result()
+
+        self.stats.hedged += 1
+        with tracing.span("llm.hedge", after=self.hedge_after, primary_failed=bool(done)) as span:
+            backup = asyncio.ensure_future(start(self.backup))
+            pending, error = {primary, backup} - done, primary.exception() if done else None
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            self.stats.backup_wins += task is backup
+                            span.set(winner="backup" if task is backup else "primary")
+                            return task.result()
+                        error = error or task.exception()
+                raise error
+            finally:
+                for task in pending:
+                    task.cancel()
+
+    async def generate_content_async(self, prompt_string, stream=False, **kwargs):
+        if not stream:
+            return await self._arace(lambda model: _acall(model, prompt_string, False, kwargs))
+        # Hedge on time to first chunk; the winner's stream is then used as is
+        return _aresume(*await self._arace(lambda model: _afirst_chunk(model, prompt_string, kwargs)))
+
+    def _race(self, start):
+        """Thread-based `_arace` for the blocking API (the loser is left to finish)."""
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="hedge")
+        self.stats.requests += 1
+        primary = self._executor.submit(start, self.primary)
+        done, _ = concurrent.futures.wait({primary}, timeout=self.hedge_after)
+        if done and primary.exception() is None:
+            return primary.result()
+
+        self.stats.hedged += 1
+        backup = self._executor.submit(start, self.backup)
+        pending, error = {primary, backup} - done, primary.exception() if done else None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.stats.backup_wins += future is backup
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def generate_content(self, prompt_string, stream=False, **kwargs):
+        if not stream:
+            return self._race(lambda model: model.generate_content(prompt_string, **kwargs))
+        return _resume(*self._race(lambda model: _first_chunk(model, prompt_string, kwargs)))
+
+    async def aclose(self):
+        for model in (self.primary, self.backup):
+            if hasattr(model, "aclose"):
+                await model.aclose()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
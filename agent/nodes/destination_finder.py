@@ -1,114 +1,153 @@
 # Import necessary libraries
-import json
-import os
-from langchain.prompts import ChatPromptTemplate
-from agent.tools.destination_db import get_destinations
+import re
+from langchain_core.prompts import ChatPromptTemplate
+from agent import tracing
+from agent.compaction import compact_json, project_destinations, project_preferences, template
+from agent.llm import agenerate_text, generate_text
+from agent.models import model_for
+from agent.structured import RECOMMENDATIONS_SCHEMA, parse_structured, render_recommendations, schema_text
+from agent.tools.destination_db import get_catalog
 from agent.state import AgentState
 
-def find_destinations(llm):
-    """Node for finding suitable destinations based on user preferences."""
-    
-    # Create a simple prompt template with clear variables
-    prompt = ChatPromptTemplate.from_template(
-        """You are a travel agent assistant. Based on the user preferences and available destinations, 
-        recommend the top 3 most suitable destinations.
+# Per-request data, after the static instructions
+DATA = """
+    User preferences: {user_preferences}
+    Available destinations: {available_destinations}
+    """
+
+# Prompt template shared by the sync and async nodes
+prompt = ChatPromptTemplate.from_template(template(
+    """You are a travel agent assistant. Based on the user preferences and available destinations,
+    recommend the top 3 most suitable destinations.
+
+    For each recommended destination, provide:
+    1. Name and country
+    2. Why it's a good match for the preferences
+    3. Best time to visit
+    4. Estimated budget requirements in Indian Rupees (₹)
+
+    IMPORTANT: Always display all costs in Indian Rupees (₹) and use the budget_inr field from the destination data
+    (or its budget_level when there is none). For example: "Budget: ₹15,000-40,000 for a 5-day trip"
+
+    Return your recommendations in a well-formatted response that's ready to show to the user.
+    """,
+    DATA
+))
+
+# Structured mode: bounded JSON instead of prose, rendered locally
+structured_prompt = ChatPromptTemplate.from_template(template(
+    """You are a travel agent assistant. Based on the user preferences and available destinations,
+    recommend the top 3 most suitable destinations.
+
+    For each destination give one sentence on why it matches, the best time to visit, and the budget
+    in Indian Rupees (₹) from its budget_inr field, e.g. "₹15,000-40,000 for 5 days".
+    Respond with only JSON matching this JSON schema, keeping every string within its maxLength:
+    """ + schema_text(RECOMMENDATIONS_SCHEMA).replace("{", "{{").replace("}", "}}"),
+    DATA
+))
+
+
+# Preferences that change the destination ranking. Duration also scores, but a
+# duration-only change just regenerates the itinerary (see agent/routing.py),
+# unless there is a budget ceiling, which is split over the trip's days.
+RANKING_KEYS = ("budget", "budget_max_inr", "interests", "season")
+
+
+def ranking_inputs(preferences):
+    """Return the subset of preferences that the ranking depends on."""
+    keys = RANKING_KEYS + (("duration",) if "budget_max_inr" in preferences else ())
+    return {key: preferences[key] for key in keys if key in preferences}
+
+
+def rank_destinations(state: AgentState):
+    """Rank destinations locally and save the top 5 to the state (no LLM call)."""
+    # Rank destinations with the indexed catalog (loaded once per process)
+    with tracing.span("destinations.rank"):
+        state.destinations = get_catalog().rank(state.preferences, k=5)
+    state.ranked_preferences = ranking_inputs(state.preferences)
+    return state.destinations
+
+
+def mentioned_destination(state: AgentState, message):
+    """Name of the runner-up destination `message` mentions, or None."""
+    text = message.lower()
+    for destination in state.destinations[1:]:
+        if re.search(r"\b" + re.escape(destination["name"].lower()) + r"\b", text):
+            return destination["name"]
+    return None
+
+
+def select_destination(state: AgentState, name):
+    """Move the ranked destination called `name` to the top."""
+    state.destinations.sort(key=lambda destination: destination["name"] != name)
+    return state
 
-        User preferences:
-        {user_preferences}
 
-        Available destinations:
-        {available_destinations}
+def build_recommendation_prompt(state: AgentState, structured=False):
+    """Format the recommendation prompt for the ranked destinations."""
+    with tracing.span("prompt.serialize"):
+        preferences = project_preferences(state.preferences)
+        user_preferences = compact_json(preferences)
+        available_destinations = compact_json(project_destinations(state.destinations, preferences))
+    with tracing.span("prompt.format"):
+        return (structured_prompt if structured else prompt).format(
+            user_preferences=user_preferences,
+            available_destinations=available_destinations
+        )
+
+
+def record_recommendations(state: AgentState, response_content, structured=False):
+    """Add the selected destinations and the model's recommendations to history.
+
+    In structured mode the JSON reply is kept on the state and rendered for
+    display; a reply that isn't JSON is shown as is.
+    """
+    parsed = parse_structured(response_content, RECOMMENDATIONS_SCHEMA) if structured else None
+    state.recommendations = parsed["recommendations"] if parsed else []
+    if state.recommendations:
+        response_content = render_recommendations(state.recommendations)
+
+    # Add a system message to track selected destinations
+    state.history.append({
+        "role": "system",
+        "content": f"Selected destinations: {[d['name'] for d in state.destinations]}"
+    })
 
-        For each recommended destination, provide:
-        1. Name and country
-        2. Why it's a good match for the preferences
-        3. Best time to visit
-        4. Estimated budget requirements in Indian Rupees (₹)
+    # Add the assistant's recommendations to the conversation history
+    state.history.append({
+        "role": "assistant",
+        "content": response_content
+    })
+    return state
 
-        IMPORTANT: Always display all costs in Indian Rupees (₹) and use the budget_inr field from the destination data.
-        For example: "Budget: ₹15,000-40,000 for a 5-day trip"
 
-        Return your recommendations in a well-formatted response that's ready to show to the user.
-        """
-    )
+def find_destinations(llm, structured=False):
+    """Node for finding suitable destinations based on user preferences."""
+    llm = model_for(llm, "recommendations")
     
     def _find_destinations(state):
-        # Step 1: Load all possible destinations from our database
-        all_destinations = get_destinations()
-        
-        # Step 2: Prepare to score each destination based on user preferences
-        filtered_destinations = []
-        
-        # Step 3: Score each destination based on how well it matches preferences
-        for dest in all_destinations:
-            score = 0
-            
-            # Budget matching - higher score for exact matches
-            if "budget" in state.preferences:
-                if state.preferences["budget"] == dest["budget_level"]:
-                    # Exact budget match
-                    score += 2
-                # Give some points if user wants higher budget than needed
-                elif (state.preferences["budget"] == "high" and dest["budget_level"] in ["medium", "low"]) or \
-                     (state.preferences["budget"] == "medium" and dest["budget_level"] == "low"):
-                    score += 1
-            
-            # Duration matching - check if destination's ideal duration includes user's preference
-            if "duration" in state.preferences:
-                if dest["ideal_duration"][0] <= state.preferences["duration"] <= dest["ideal_duration"][1]:
-                    score += 2
-            
-            # Interests matching - add points for each matching interest
-            if "interests" in state.preferences:
-                for interest in state.preferences["interests"]:
-                    # Case-insensitive matching of interests to destination tags
-                    if interest.lower() in [tag.lower() for tag in dest["tags"]]:
-                        score += 1
-            
-            # Season matching - check if user's preferred season is good for this destination
-            if "season" in state.preferences:
-                if state.preferences["season"].lower() in [s.lower() for s in dest["best_seasons"]]:
-                    score += 2
-            
-            # Save the score with the destination
-            dest["match_score"] = score
-            filtered_destinations.append(dest)
-        
-        # Step 4: Sort destinations by score and take the top 5
-        filtered_destinations.sort(key=lambda x: x["match_score"], reverse=True)
-        top_destinations = filtered_destinations[:5]
+        # Step 1: Rank destinations and save the best ones to the agent's state
+        rank_destinations(state)
         
-        # Step 5: Save the best destinations to the agent's state
-        state.destinations = top_destinations
+        # Step 2: Format the prompt as a plain string
+        prompt_string = build_recommendation_prompt(state, structured)
         
-        # Step 6: Format the prompt as a plain string
-        prompt_string = prompt.format(
-            user_preferences=json.dumps(state.preferences, indent=2),
-            available_destinations=json.dumps(top_destinations, indent=2)
-        )
-        
-        # Step 7: Send the prompt to the LLM and get recommendations
-        response = llm.generate_content(prompt_string)
-        
-        # Extract the text content from the response
-        try:
-            response_content = response.text
-        except AttributeError:
-            response_content = response.candidates[0].content if hasattr(response, "candidates") else str(response)
-        
-        # Step 8: Add a system message to track selected destinations
-        state.history.append({
-            "role": "system",
-            "content": f"Selected destinations: {[d['name'] for d in top_destinations]}"
-        })
-        
-        # Step 9: Add the assistant's recommendations to the conversation history
-        state.history.append({
-            "role": "assistant",
-            "content": response_content
-        })
+        # Step 3: Send the prompt to the LLM and get recommendations
+        response_content = generate_text(llm, prompt_string)
         
-        # Step 10: Return the updated state
-        return state
+        # Step 4: Record the recommendations and return the updated state
+        return record_recommendations(state, response_content, structured)
     
-    return _find_destinations
\ No newline at end of file
+    return _find_destinations
+
+
+def afind_destinations(llm, structured=False):
+    """Async node for finding suitable destinations based on user preferences."""
+    llm = model_for(llm, "recommendations")
+
+    async def _afind_destinations(state):
+        rank_destinations(state)
+        response_content = await agenerate_text(llm, build_recommendation_prompt(state, structured))
+        return record_recommendations(state, response_content, structured)
+
+    return _afind_destinations
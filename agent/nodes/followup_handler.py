@@ -1,64 +1,136 @@
 # Import necessary libraries
-from langchain.prompts import ChatPromptTemplate
-import json
+from langchain_core.prompts import ChatPromptTemplate
+from agent.context import ConversationContext, estimate_tokens
+from agent import tracing
+from agent.compaction import compact_json, itinerary_text, project_preferences, template
+from agent.llm import agenerate_text, generate_text
+from agent.models import model_for
+from agent.streaming import current_sink
 from agent.state import AgentState
 
-def handle_followup(llm):
-    """Node for handling follow-up questions about the travel plan."""
+# Static instructions, shared by both templates so they form the prompt prefix
+INSTRUCTIONS = """
+    You are a travel agent assistant. The user has a follow-up question or request about their travel plan.
+    Please respond to the follow-up in a helpful way. If they want to modify the itinerary, suggest specific changes.
+    If they have questions, provide detailed answers based on the existing plan.
+    """
+
+# Prompt template shared by the sync and async nodes
+prompt = ChatPromptTemplate.from_template(template(
+    INSTRUCTIONS,
+    """
+    User preferences: {user_preferences}
+
+    Current itinerary:
+    {current_itinerary}
+
+    Conversation history:
+    {conversation_history}
+
+    Follow-up question/request:
+    {user_question}
+    """
+))
+
+# Used when the plan is structured: the JSON is sent instead of the rendered text
+structured_prompt = ChatPromptTemplate.from_template(template(
+    INSTRUCTIONS,
+    """
+    User preferences: {user_preferences}
+    Recommended destinations (JSON): {recommendations}
+    Current itinerary (JSON): {current_itinerary}
+
+    Conversation history:
+    {conversation_history}
+
+    Follow-up question/request:
+    {user_question}
+    """
+))
+
+
+def is_structured(state: AgentState):
+    """Whether the state holds structured recommendations or itinerary."""
+    return bool(state.recommendations or "days" in state.itinerary)
+
+
+def build_followup_prompt(state: AgentState, context: ConversationContext):
+    """Format the follow-up prompt from the state and bounded conversation history."""
+    # Step 1: Get the user's follow-up question from the last user message
+    question_index = max(i for i, msg in enumerate(state.history) if msg["role"] == "user")
+    followup_question = state.history[question_index]["content"]
     
-    # Create a simple prompt template with clear variable names
-    prompt = ChatPromptTemplate.from_template(
-        """You are a travel agent assistant. The user has a follow-up question or request about their travel plan.
-        
-        User preferences:
-        {user_preferences}
-        
-        Current itinerary:
-        {current_itinerary}
-        
-        Conversation history:
-        {conversation_history}
-        
-        Follow-up question/request:
-        {user_question}
-        
-        Please respond to the follow-up in a helpful way. If they want to modify the itinerary, suggest specific changes.
-        If they have questions, provide detailed answers based on the existing plan.
-        """
-    )
+    # Step 2: Format the conversation history within the token budget
+    # Recent messages are kept as "role: content", older ones are summarized
+    with tracing.span("context.build"):
+        history_formatted = context.build(state, question_index)
+    
+    # Step 3: Format the prompt as a plain string
+    with tracing.span("prompt.serialize"):
+        user_preferences = compact_json(project_preferences(state.preferences))
+        if is_structured(state):
+            # The rendered plan is derived from the structure, so it isn't sent
+            recommendations = compact_json(state.recommendations)
+            current_itinerary = compact_json({k: v for k, v in state.itinerary.items() if k != "plan"})
+        else:
+            current_itinerary = itinerary_text(state.itinerary)
+    with tracing.span("prompt.format"):
+        if is_structured(state):
+            prompt_string = structured_prompt.format(
+                user_preferences=user_preferences,
+                recommendations=recommendations,
+                current_itinerary=current_itinerary,
+                conversation_history=history_formatted,
+                user_question=followup_question
+            )
+        else:
+            prompt_string = prompt.format(
+                user_preferences=user_preferences,
+                current_itinerary=current_itinerary,
+                conversation_history=history_formatted,
+                user_question=followup_question
+            )
+    
+    # Step 4: Track prompt size per turn
+    state.prompt_tokens.append(estimate_tokens(prompt_string))
+    return prompt_string
+
+
+def record_followup(state: AgentState, response_content):
+    """Add the assistant's follow-up answer to the conversation history."""
+    state.history.append({
+        "role": "assistant",
+        "content": response_content
+    })
+    return state
+
+
+def handle_followup(llm, context=None):
+    """Node for handling follow-up questions about the travel plan."""
+    context = context or ConversationContext()
+    llm = model_for(llm, "followup")
     
     def _handle_followup(state):
-        # Step 1: Get the user's follow-up question from the last message
-        followup_question = state.history[-1]["content"]
+        # Step 1: Build the prompt from the question and conversation so far
+        prompt_string = build_followup_prompt(state, context)
         
-        # Step 2: Format the conversation history to provide context
-        # This creates a string with each previous message in the format "role: content"
-        history_formatted = "\n".join([f"{msg['role']}: {msg['content']}" for msg in state.history[:-1]])
+        # Step 2: Send the prompt to the LLM to generate a response
+        # (streamed chunk by chunk when a stream sink is active)
+        response_content = generate_text(llm, prompt_string, on_chunk=current_sink())
         
-        # Step 3: Format the prompt as a plain string
-        prompt_string = prompt.format(
-            user_preferences=json.dumps(state.preferences, indent=2),
-            current_itinerary=json.dumps(state.itinerary, indent=2),
-            conversation_history=history_formatted,
-            user_question=followup_question
-        )
-        
-        # Step 4: Send the prompt to the LLM to generate a response
-        response = llm.generate_content(prompt_string)
-        
-        # Extract the text content from the response
-        try:
-            response_content = response.text
-        except AttributeError:
-            response_content = response.candidates[0].content if hasattr(response, "candidates") else str(response)
-        
-        # Step 5: Add the assistant's response to the conversation history
-        state.history.append({
-            "role": "assistant",
-            "content": response_content
-        })
-        
-        # Step 6: Return the updated state
-        return state
+        # Step 3: Add the response to the history and return the updated state
+        return record_followup(state, response_content)
     
-    return _handle_followup
\ No newline at end of file
+    return _handle_followup
+
+
+def ahandle_followup(llm, context=None):
+    """Async node for handling follow-up questions about the travel plan."""
+    context = context or ConversationContext()
+    llm = model_for(llm, "followup")
+
+    async def _ahandle_followup(state):
+        response_content = await agenerate_text(llm, build_followup_prompt(state, context), on_chunk=current_sink())
+        return record_followup(state, response_content)
+
+    return _ahandle_followup
@@ -1,98 +1,297 @@
 # Import necessary libraries
-import json
-from langchain.prompts import ChatPromptTemplate
-from agent.tools.weather_api import get_weather_forecast
+from langchain_core.prompts import ChatPromptTemplate
+from agent import tracing
+from agent.compaction import compact_json, project_destinations, project_preferences, project_weather, template
+from agent.llm import agenerate_text, generate_text
+from agent.models import model_for
+from agent.streaming import current_sink
+from agent.structured import itinerary_schema, parse_structured, render_itinerary, schema_text
+from agent.tools.destination_db import get_catalog
+from agent.tools.route_planner import plan_route
+from agent.tools.weather_api import get_weather_forecast, get_weather_service
 from agent.state import AgentState
 
-def create_itinerary(llm):
-    """Node for creating a detailed itinerary based on selected destinations."""
+# Per-request data, after the static instructions
+DATA = """
+    User preferences: {user_preferences}
+    Selected destinations: {selected_destinations}
+    Route: {route}
+    Weather forecast for the destination(s): {weather_forecast}
+    The trip should last for {trip_duration} days based on the user's preferences.
+    """
+
+# Prompt template shared by the sync and async nodes
+prompt = ChatPromptTemplate.from_template(template(
+    """You are a travel agent assistant. Create a detailed day-by-day itinerary for the user based on
+    their preferences and the recommended destinations.
+
+    Create a detailed itinerary with:
+    1. Day-by-day breakdown
+    2. Morning, afternoon, and evening activities
+    3. Suggested accommodations
+    4. Transportation recommendations
+    5. Estimated costs for activities in Indian Rupees (₹)
+
+    IMPORTANT: Always display all costs in Indian Rupees (₹) and use the budget_inr field from the destination data.
+    For example: "Hotel: ₹2,500 per night", "Meal: ₹300-500 per person", "Activity: ₹1,200 per person"
+
+    If a route is given, the trip follows it exactly: plan each stop for its days and describe the
+    drives between stops, without changing the stops, their order or their days.
+
+    Format the itinerary in a clear, readable manner.
+    """,
+    DATA
+))
+
+# Structured mode: one bounded JSON item per day instead of an unbounded plan.
+# The schema's day limit varies with the trip, so it goes after the data.
+structured_prompt = ChatPromptTemplate.from_template(template(
+    """You are a travel agent assistant. Create a day-by-day itinerary for the user based on
+    their preferences and the recommended destinations.
+
+    Give one item per day with short morning, afternoon and evening activities, where to stay and
+    the day's estimated cost, plus transport tips and the estimated total. Show all costs in
+    Indian Rupees (₹) based on the budget_inr field, e.g. "₹2,500". If a route is given, follow its
+    stops, order and days exactly.
+    """,
+    DATA + """
+    Respond with only JSON matching this JSON schema, keeping every string within its maxLength:
+    {schema}
+    """
+))
+
+
+def top_destination(state: AgentState):
+    """Return the top-ranked destination, or a placeholder if none were found."""
+    return state.destinations[0] if state.destinations else {"name": "Unknown", "country": "Unknown"}
+
+
+# Default for the `route` arguments below: plan it from the state
+PLAN_ROUTE = object()
+
+
+def trip_route(state: AgentState, route=PLAN_ROUTE):
+    """The fixed multi-stop route for a long trip, or None to stay at the top destination.
+
+    A `route` that was already planned for this turn is returned as is.
+    """
+    if route is not PLAN_ROUTE:
+        return route
+    with tracing.span("route.plan"):
+        return plan_route(get_catalog(), state.preferences, top_destination(state)["name"])
+
+
+def route_destinations(route):
+    """Catalog records of the stops on a route."""
+    catalog = get_catalog()
+    return [catalog.destinations[catalog.name_index[stop["name"]]] for stop in route]
+
+
+def needs_itinerary(state: AgentState):
+    """Whether this turn has to generate an itinerary."""
+    # On a follow-up, reuse the existing itinerary unless the top destination
+    # or the trip duration has changed since it was created
+    if not (state.is_followup and state.itinerary):
+        return True
+    return (state.itinerary.get("destination") != top_destination(state)["name"]
+            or state.itinerary.get("duration") != state.preferences.get("duration", 7))
+
+
+def build_itinerary_prompt(state: AgentState, weather=None, structured=False, route=PLAN_ROUTE):
+    """Format the itinerary prompt for the top destination.
+
+    Only needs the ranked destinations and the weather, not the
+    recommendation text, so it can run alongside the recommendation call.
+    Long trips get a fixed route (see `trip_route`) that the model only
+    describes.
+    Pass `weather` when it was already fetched; otherwise it is looked up
+    synchronously. Likewise pass `route` when it was already planned.
+    """
+    # Step 1: Get the top destination from our ranked list
+    destination = top_destination(state)
     
-    # Create a simple prompt template with clear variable names
-    prompt = ChatPromptTemplate.from_template(
-        """You are a travel agent assistant. Create a detailed day-by-day itinerary for the user based on 
-        their preferences and the recommended destinations.
-
-        User preferences:
-        {user_preferences}
-
-        Selected destinations:
-        {selected_destinations}
-
-        Weather forecast for the destination(s):
-        {weather_forecast}
-
-        Create a detailed itinerary with:
-        1. Day-by-day breakdown
-        2. Morning, afternoon, and evening activities
-        3. Suggested accommodations
-        4. Transportation recommendations
-        5. Estimated costs for activities in Indian Rupees (₹)
-
-        IMPORTANT: Always display all costs in Indian Rupees (₹) and use the budget_inr field from the destination data.
-        For example: "Hotel: ₹2,500 per night", "Meal: ₹300-500 per person", "Activity: ₹1,200 per person"
-
-        The trip should last for {trip_duration} days based on the user's preferences.
-        Format the itinerary in a clear, readable manner.
-        """
-    )
+    # Step 2: Get weather forecast for the destination
+    # This comes from our weather API tool (cached per destination)
+    if weather is None:
+        weather = get_weather_forecast(destination["name"])
     
-    def _create_itinerary(state):
-        # Step 1: Check if this is a follow-up request and we already have an itinerary
-        # If so, we don't need to create a new one
-        if state.is_followup and state.itinerary:
-            return state
-        
-        # Step 2: Get the top destination from our ranked list
-        # If no destinations were found, use a placeholder
-        top_destination = state.destinations[0] if state.destinations else {"name": "Unknown", "country": "Unknown"}
-        
-        # Step 3: Get weather forecast for the destination
-        # This comes from our weather API tool
-        weather = get_weather_forecast(top_destination["name"])
-        
-        # Step 4: Get the trip duration from user preferences (default to 7 days)
-        duration = state.preferences.get("duration", 7)
-        
-        # Step 5: Format the prompt as a plain string
-        prompt_string = prompt.format(
-            user_preferences=json.dumps(state.preferences, indent=2),
-            selected_destinations=json.dumps([top_destination], indent=2),
-            weather_forecast=json.dumps(weather, indent=2),
+    # Step 3: Get the trip duration from user preferences (default to 7 days)
+    duration = state.preferences.get("duration", 7)
+    
+    # Step 4: Fix the order of stops and their days locally for long trips
+    route = trip_route(state, route)
+    destinations = route_destinations(route) if route else [destination]
+
+    # Step 5: Format the prompt as a plain string
+    with tracing.span("prompt.serialize"):
+        preferences = project_preferences(state.preferences)
+        user_preferences = compact_json(preferences)
+        selected_destinations = compact_json(project_destinations(destinations, preferences))
+        weather_forecast = compact_json(project_weather(weather, duration))
+        route = compact_json(route) if route else "none (single destination)"
+    with tracing.span("prompt.format"):
+        if structured:
+            return structured_prompt.format(
+                user_preferences=user_preferences,
+                selected_destinations=selected_destinations,
+                route=route,
+                weather_forecast=weather_forecast,
+                trip_duration=duration,
+                schema=schema_text(itinerary_schema(duration))
+            )
+        return prompt.format(
+            user_preferences=user_preferences,
+            selected_destinations=selected_destinations,
+            route=route,
+            weather_forecast=weather_forecast,
             trip_duration=duration
         )
+
+
+def structured_itinerary(state: AgentState, response_content):
+    """Parse a structured itinerary reply; returns None if it isn't JSON."""
+    return parse_structured(response_content, itinerary_schema(state.preferences.get("duration", 7)))
+
+
+def itinerary_intro(state: AgentState, route=PLAN_ROUTE):
+    """Text shown before the generated plan in the assistant's reply."""
+    destination = top_destination(state)
+    duration = state.preferences.get("duration", 7)
+    route = trip_route(state, route)
+    places = " → ".join(stop["name"] for stop in route) if route else destination["name"]
+    return f"Here's your {duration}-day itinerary for {places}, {destination['country']}:\n\n"
+
+
+ITINERARY_OUTRO = "\n\nDo you have any questions about this itinerary or would you like me to modify anything?"
+
+
+def record_itinerary(state: AgentState, response_content, route=PLAN_ROUTE):
+    """Save the generated itinerary to the state and the conversation.
+
+    `response_content` is the plan text, or a parsed structured itinerary,
+    which is kept alongside its rendered text.
+    """
+    destination = top_destination(state)
+    duration = state.preferences.get("duration", 7)
+    structure = response_content if isinstance(response_content, dict) else None
+    if structure is not None:
+        response_content = render_itinerary(structure, duration)
+
+    # Step 1: Create a simple itinerary object with the key information
+    itinerary = {
+        "destination": destination["name"],
+        "duration": duration,
+        "plan": response_content
+    }
+    route = trip_route(state, route)
+    if route:
+        itinerary["route"] = route
+    if structure is not None:
+        itinerary.update(structure)
+    
+    # Step 2: Save the itinerary to the agent's state
+    state.itinerary = itinerary
+    
+    # Step 3: Add a system message to track that we created an itinerary
+    state.history.append({
+        "role": "system",
+        "content": f"Created itinerary for {destination['name']}"
+    })
+    
+    # Step 4: Add the assistant's response with the itinerary to the conversation
+    state.history.append({
+        "role": "assistant",
+        "content": itinerary_intro(state, route) + response_content + ITINERARY_OUTRO
+    })
+    return state
+
+
+async def astream_itinerary(llm, state: AgentState, store=None, structured=False, route=PLAN_ROUTE):
+    """Generate the plan text, streaming the full reply to the active sink if any.
+
+    In structured mode the JSON reply is parsed and its rendered text is sent
+    to the sink in one piece; the parsed itinerary is returned (or the raw
+    text if it isn't JSON).
+    """
+    # Awaiting the forecast yields to the event loop; if `plan_trip` already
+    # prefetched it, this joins the in-flight request or hits the cache
+    weather = await get_weather_service().get(top_destination(state)["name"])
+    route = trip_route(state, route)
+    sink = current_sink()
+    if sink:
+        sink(itinerary_intro(state, route))
+    on_chunk = None if structured else sink
+    response_content = await store.aget(state, on_chunk=on_chunk) if store is not None else None
+    if response_content is None:
+        response_content = await agenerate_text(
+            llm, build_itinerary_prompt(state, weather, structured, route), on_chunk=on_chunk)
+        if store is not None:
+            store.remember(state, response_content)
+    if structured:
+        response_content = _emit_structured(state, response_content, sink)
+    if sink:
+        sink(ITINERARY_OUTRO)
+    return response_content
+
+
+def _emit_structured(state: AgentState, response_content, sink):
+    structure = structured_itinerary(state, response_content)
+    if sink:
+        sink(render_itinerary(structure, state.preferences.get("duration", 7)) if structure else response_content)
+    return structure or response_content
+
+
+def create_itinerary(llm, store=None, structured=False):
+    """Node for creating a detailed itinerary based on selected destinations.
+
+    With an `ItineraryStore`, a stored plan for a nearby profile is served
+    instead of generating a new one.
+    """
+    llm = model_for(llm, "itinerary")
+    
+    def _create_itinerary(state):
+        # Step 1: Skip generation if we can reuse the existing itinerary
+        if not needs_itinerary(state):
+            return state
         
-        # Step 6: Send the prompt to the LLM to generate an itinerary
-        response = llm.generate_content(prompt_string)
-        
-        # Extract the text content from the response
-        try:
-            response_content = response.text
-        except AttributeError:
-            response_content = response.candidates[0].content if hasattr(response, "candidates") else str(response)
-        
-        # Step 7: Create a simple itinerary object with the key information
-        itinerary = {
-            "destination": top_destination["name"],
-            "duration": duration,
-            "plan": response_content
-        }
-        
-        # Step 8: Save the itinerary to the agent's state
-        state.itinerary = itinerary
-        
-        # Step 9: Add a system message to track that we created an itinerary
-        state.history.append({
-            "role": "system",
-            "content": f"Created itinerary for {top_destination['name']}"
-        })
-        
-        # Step 10: Add the assistant's response with the itinerary to the conversation
-        state.history.append({
-            "role": "assistant",
-            "content": f"Here's your {duration}-day itinerary for {top_destination['name']}, {top_destination['country']}:\n\n{response_content}\n\nDo you have any questions about this itinerary or would you like me to modify anything?"
-        })
+        # Step 2: Serve a stored plan, or build the prompt from the top
+        # destination and its weather and send it to the LLM
+        # When a stream sink is active, the reply is streamed chunk by chunk
+        # (structured replies are parsed first and rendered in one piece)
+        # The route is planned once and shared by the prompt, intro and record
+        route = trip_route(state)
+        # Fetched before the store lookup, which checks stored plans against it
+        weather = get_weather_forecast(top_destination(state)["name"])
+        sink = current_sink()
+        if sink:
+            sink(itinerary_intro(state, route))
+        on_chunk = None if structured else sink
+        response_content = store.get(state, on_chunk=on_chunk) if store is not None else None
+        if response_content is None:
+            response_content = generate_text(llm, build_itinerary_prompt(state, weather, structured, route),
+                                             on_chunk=on_chunk)
+            if store is not None:
+                store.remember(state, response_content)
+        if structured:
+            response_content = _emit_structured(state, response_content, sink)
+        if sink:
+            sink(ITINERARY_OUTRO)
         
-        # Step 11: Return the updated state
-        return state
+        # Step 3: Save the itinerary and return the updated state
+        return record_itinerary(state, response_content, route)
     
-    return _create_itinerary
\ No newline at end of file
+    return _create_itinerary
+
+
+def acreate_itinerary(llm, store=None, structured=False):
+    """Async node for creating a detailed itinerary based on selected destinations."""
+    llm = model_for(llm, "itinerary")
+
+    async def _acreate_itinerary(state):
+        if not needs_itinerary(state):
+            return state
+        route = trip_route(state)
+        response_content = await astream_itinerary(llm, state, store, structured, route)
+        return record_itinerary(state, response_content, route)
+
+    return _acreate_itinerary
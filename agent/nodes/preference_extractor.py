@@ -1,98 +1,215 @@
 import json
 import re
-from langchain.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate
+from agent import tracing
+from agent.compaction import template
+from agent.llm import agenerate_text, generate_text
+from agent.models import model_for
+from agent.nodes.destination_finder import mentioned_destination, select_destination
+from agent.tools.destination_db import get_catalog
+from agent.tools.preference_parser import get_preference_parser
+from agent.tools.price_index import budget_ceiling
 from agent.state import AgentState
 
-def extract_preferences(llm):
-    """Node for extracting travel preferences from user input."""
-    
-    # Create a prompt template
-    prompt = ChatPromptTemplate.from_template(
-        """You are a travel agent assistant. Extract travel preferences from the user's message.
-        Consider the following:
-        - Budget (low, medium, high)
-        - Trip duration (days)
-        - Interests (e.g. beaches, food, culture)
-        - Season
-        - Party (solo, couple, family, group)
-        - Any constraints
-
-        User message: {user_input}
-
-        Return only a JSON object like:
-        ```json
-        {{
-            "budget": "medium",
-            "duration": 7,
-            "interests": ["beaches", "food"],
-            "season": "summer",
-            "party": "couple",
-            "constraints": "no long flights"
-        }}
-        ```
-        Only include fields you are confident about.
-        """
-    )
-    
-    def _extract_preferences(state: AgentState):
-        # Get the latest user message
-        user_message = state.history[-1]["content"]
+# Prompt template shared by the sync and async nodes
+# (static instructions first, so every prompt shares the same prefix)
+prompt = ChatPromptTemplate.from_template(template(
+    """You are a travel agent assistant. Extract travel preferences from the user's message.
+    Consider the following:
+    - Budget (low, medium, high)
+    - Maximum total budget in Indian Rupees, if the user gives an amount (budget_max_inr)
+    - Trip duration (days)
+    - Interests (e.g. beaches, food, culture)
+    - Season
+    - Party (solo, couple, family, group)
+    - Any constraints
 
-        # Format the prompt as a plain string
-        prompt_string = prompt.format(user_input=user_message)
+    Return only a JSON object like:
+    ```json
+    {{"budget": "medium", "budget_max_inr": 50000, "duration": 7, "interests": ["beaches", "food"], "season": "summer", "party": "couple", "constraints": "no long flights"}}
+    ```
+    Only include fields you are confident about.
+    """,
+    """
+    User message: {user_input}
+    """
+))
 
-        # Use Google's Gemini model (or any other that supports `generate_content`)
-        response = llm.generate_content(prompt_string)
 
-        # Extract the text content from the response
-        try:
-            response_text = response.text
-        except AttributeError:
-            response_text = response.candidates[0].content if hasattr(response, "candidates") else str(response)
+# Minimum rule-parser confidence needed to skip the LLM call
+DEFAULT_CONFIDENCE_THRESHOLD = 0.5
+
+
+def destination_switch(state: AgentState):
+    """Runner-up a follow-up switches to ("what about Shimla instead?"), or None.
+
+    Negated mentions ("I don't want Shimla") never switch.
+    """
+    if not state.is_followup:
+        return None
+    message = state.history[-1]["content"]
+    if get_preference_parser().is_negated(message):
+        return None
+    return mentioned_destination(state, message)
+
+
+def parse_locally(state: AgentState, confidence_threshold, switched=False):
+    """Try the rule-based parser on the latest message.
+
+    Returns the extracted preferences, or None when confidence is below the
+    threshold and the LLM should be asked instead. Follow-ups only need to know
+    what changed: a partial match in a message phrased as an edit ("make it 3
+    days") is trusted, a message that `switched` to a runner-up destination
+    changes only what the rules matched, and a plain question ("is it cold
+    there in winter?") changes nothing, whatever words it matches.
+    """
+    parser = get_preference_parser()
+    message = state.history[-1]["content"]
+    with tracing.span("preferences.rules") as span:
+        preferences, confidence = parser.parse(message)
+        span.set(confidence=confidence)
+    if switched:
+        # Switching to a runner-up only changes the top destination, plus
+        # whatever the rules matched ("Shimla for 3 days instead")
+        return preferences
+    if state.is_followup:
+        if parser.is_edit(message):
+            if confidence > 0:
+                return preferences
+        elif parser.is_plain_question(message):
+            return {}
+    if confidence >= confidence_threshold:
+        return preferences
+    return None
 
-        # Extract JSON using regex
-        json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            json_str = response_text  # Fallback
-
-        # Try to parse the JSON
-        try:
-            extracted_preferences = json.loads(json_str)
-        except json.JSONDecodeError:
-            extracted_preferences = {"error": "Could not parse preferences"}
-
-        # Update the agent state
-        state.preferences.update(extracted_preferences)
-
-        # Add to conversation history
-        state.history.append({
-            "role": "system",
-            "content": f"Extracted preferences: {extracted_preferences}"
-        })
-
-        # Acknowledge to the user
-        acknowledgment = f"I understand you're looking for a {state.preferences.get('duration', 'short')} day trip "
-        if "budget" in state.preferences:
-            acknowledgment += f"with a {state.preferences['budget']} budget "
-        if "interests" in state.preferences:
-            interests = state.preferences["interests"]
-            if len(interests) > 1:
-                interests_str = ", ".join(interests[:-1]) + " and " + interests[-1]
-            else:
-                interests_str = interests[0]
-            acknowledgment += f"focused on {interests_str}. "
-        else:
-            acknowledgment += ". "
-        acknowledgment += "Let me find some suitable destinations for you."
 
-        # Add the assistant's reply
-        state.history.append({
-            "role": "assistant",
-            "content": acknowledgment
-        })
+def build_preferences_prompt(state: AgentState):
+    """Format the extraction prompt for the latest user message."""
+    # Get the latest user message
+    user_message = state.history[-1]["content"]
 
+    # Format the prompt as a plain string
+    with tracing.span("prompt.format"):
+        return prompt.format(user_input=user_message)
+
+
+def parse_preferences(response_text):
+    """Parse the preferences JSON out of the model's reply."""
+    with tracing.span("response.parse"):
+        return _parse_preferences_json(response_text)
+
+
+def _parse_preferences_json(response_text):
+    # Extract JSON using regex
+    json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
+    if json_match:
+        json_str = json_match.group(1)
+    else:
+        json_str = response_text  # Fallback
+
+    # Try to parse the JSON
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        return {"error": "Could not parse preferences"}
+
+
+def record_preferences(state: AgentState, extracted_preferences):
+    """Merge extracted preferences into the state and acknowledge them."""
+    # Update the agent state; a follow-up adds interests to the existing ones
+    previous_preferences = dict(state.preferences)
+    interests = extracted_preferences.get("interests")
+    current = state.preferences.get("interests")
+    if state.is_followup and isinstance(interests, list) and isinstance(current, list):
+        extracted_preferences = dict(extracted_preferences,
+                                     interests=current + [i for i in interests if i not in current])
+    state.preferences.update(extracted_preferences)
+
+    # A follow-up that doesn't change anything is just a question; leave the
+    # history alone so it goes straight to the follow-up handler
+    if state.is_followup and state.preferences == previous_preferences:
         return state
 
+    # Add to conversation history
+    state.history.append({
+        "role": "system",
+        "content": f"Extracted preferences: {extracted_preferences}"
+    })
+
+    # Acknowledge to the user
+    acknowledgment = f"I understand you're looking for a {state.preferences.get('duration', 'short')} day trip "
+    if "budget" in state.preferences:
+        acknowledgment += f"with a {state.preferences['budget']} budget "
+    # A ceiling nothing fits is not applied to the ranking (see PriceIndex.eligible)
+    ceiling = budget_ceiling(state.preferences)
+    affordable = get_catalog().price_index.fits(state.preferences)
+    if ceiling and affordable:
+        acknowledgment += f"under ₹{int(ceiling):,} "
+    if "interests" in state.preferences:
+        interests = state.preferences["interests"]
+        if len(interests) > 1:
+            interests_str = ", ".join(interests[:-1]) + " and " + interests[-1]
+        else:
+            interests_str = interests[0]
+        acknowledgment += f"focused on {interests_str}. "
+    else:
+        acknowledgment += ". "
+    if ceiling and not affordable:
+        acknowledgment += (f"Nothing I know of fits under ₹{int(ceiling):,}, so I'll suggest the closest matches "
+                           "at any price. ")
+    acknowledgment += "Let me find some suitable destinations for you."
+
+    # Add the assistant's reply
+    state.history.append({
+        "role": "assistant",
+        "content": acknowledgment
+    })
+
+    return state
+
+
+def extract_preferences(llm, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+    """Node for extracting travel preferences from user input.
+
+    Simple requests are handled by the local rule parser; the LLM is only
+    called when its confidence is below `confidence_threshold`.
+    """
+    llm = model_for(llm, "preferences")
+
+    def _extract_preferences(state: AgentState):
+        destination = destination_switch(state)
+        if destination is not None:
+            select_destination(state, destination)
+
+        # Fast path: no model round-trip for simple messages
+        local_preferences = parse_locally(state, confidence_threshold, switched=destination is not None)
+        if local_preferences is not None:
+            return record_preferences(state, local_preferences)
+
+        prompt_string = build_preferences_prompt(state)
+
+        # Use the preference model (any that supports `generate_content`)
+        response_text = generate_text(llm, prompt_string)
+
+        return record_preferences(state, parse_preferences(response_text))
+
     return _extract_preferences
+
+
+def aextract_preferences(llm, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+    """Async node for extracting travel preferences from user input."""
+    llm = model_for(llm, "preferences")
+
+    async def _aextract_preferences(state: AgentState):
+        destination = destination_switch(state)
+        if destination is not None:
+            select_destination(state, destination)
+        local_preferences = parse_locally(state, confidence_threshold, switched=destination is not None)
+        if local_preferences is not None:
+            return record_preferences(state, local_preferences)
+
+        prompt_string = build_preferences_prompt(state)
+        response_text = await agenerate_text(llm, prompt_string)
+        return record_preferences(state, parse_preferences(response_text))
+
+    return _aextract_preferences
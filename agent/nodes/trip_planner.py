@@ -0,0 +1,42 @@
+# Import necessary libraries
+import asyncio
+from agent.llm import agenerate_text
+from agent.models import model_for
+from agent.nodes.destination_finder import build_recommendation_prompt, rank_destinations, record_recommendations
+from agent.nodes.itinerary_creator import astream_itinerary, needs_itinerary, record_itinerary, trip_route
+from agent.state import AgentState
+from agent.tools.weather_api import get_weather_service
+
+
+def aplan_trip(llm, itinerary_store=None, structured=False):
+    """Async node that runs destination recommendations and itinerary creation together.
+
+    The itinerary prompt only depends on the ranked destinations and the
+    weather, so both model calls are sent concurrently once ranking is done.
+    History entries are recorded in the same order as the sequential graph.
+    Only the itinerary is streamed to an active sink. Each call uses the
+    model selected for its role.
+    """
+    recommender, planner = model_for(llm, "recommendations"), model_for(llm, "itinerary")
+
+    async def _aplan_trip(state: AgentState):
+        # Step 1: Rank destinations locally (no LLM call)
+        rank_destinations(state)
+        # Fetch forecasts for all top-k destinations in one batch, in the background
+        get_weather_service().prefetch([d["name"] for d in state.destinations])
+
+        # Step 2: Start both model calls at the same time
+        calls = [agenerate_text(recommender, build_recommendation_prompt(state, structured))]
+        route = None
+        if needs_itinerary(state):
+            route = trip_route(state)
+            calls.append(astream_itinerary(planner, state, itinerary_store, structured, route))
+        responses = await asyncio.gather(*calls)
+
+        # Step 3: Record the results in the usual order
+        record_recommendations(state, responses[0], structured)
+        if len(responses) > 1:
+            record_itinerary(state, responses[1], route)
+        return state
+
+    return _aplan_trip
@@ -0,0 +1,173 @@
+"""Model provider registry.
+
+Each provider is a factory that imports its SDK only when called, so picking
+a provider never pays for the others' imports. Select one with
+`LLM_PROVIDER` (gemini, openai or fake) and optionally `LLM_MODEL`:
+
+    from agent.providers import create_llm
+    llm = create_llm()                    # from the environment
+    llm = create_llm("openai", "gpt-4o-mini")
+
+Every provider returns an object with `generate_content(prompt, stream=...)`
+and, where the SDK supports it, `generate_content_async`, as used by
+`agent.llm`.
+
+Per-node models and hedging are configured with `provider:model` specs (the
+provider defaults to LLM_PROVIDER):
+
+    LLM_MODEL_PREFERENCES=openai:gpt-4o-mini   # also _RECOMMENDATIONS, _ITINERARY, _FOLLOWUP
+    LLM_HEDGE_MODEL=openai:gpt-4o-mini         # raced after LLM_HEDGE_AFTER seconds (default 2)
+
+in which case `create_llm()` returns an `agent.models.ModelRouter`.
+"""
+import functools
+import os
+
+DEFAULT_PROVIDER = "gemini"
+# Connections kept open per OpenAI-compatible endpoint
+POOL_LIMITS = {"max_connections": 64, "max_keepalive_connections": 16, "keepalive_expiry": 60.0}
+
+
+class TextResponse:
+    """Minimal response object exposing `.text` like Gemini's responses."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class OpenAIChatModel:
+    """`generate_content`-style adapter over the OpenAI chat completions API.
+
+    Works with any OpenAI-compatible server via `base_url`. Pass `clients`
+    (from `openai_clients`) to share one keep-alive connection pool between
+    models served by the same endpoint.
+    """
+
+    def __init__(self, model="gpt-4o-mini", clients=None, **client_options):
+        self.model = self.model_name = model
+        self._client, self._async_client = clients or _make_openai_clients(**client_options)
+
+    def _request(self, prompt_string, stream):
+        return {"model": self.model, "messages": [{"role": "user", "content": prompt_string}], "stream": stream}
+
+    def generate_content(self, prompt_string, stream=False, **kwargs):
+        response = self._client.chat.completions.create(**self._request(prompt_string, stream))
+        if not stream:
+            return TextResponse(response.choices[0].message.content or "")
+        return (
+            TextResponse(chunk.choices[0].delta.content)
+            for chunk in response
+            if chunk.choices and chunk.choices[0].delta.content
+        )
+
+    async def generate_content_async(self, prompt_string, stream=False, **kwargs):
+        response = await self._async_client.chat.completions.create(**self._request(prompt_string, stream))
+        if not stream:
+            return TextResponse(response.choices[0].message.content or "")
+        return self._astream(response)
+
+    @staticmethod
+    async def _astream(response):
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield TextResponse(chunk.choices[0].delta.content)
+
+    async def aclose(self):
+        await self._async_client.close()
+
+
+def _make_openai_clients(**client_options):
+    import httpx
+    import openai
+
+    limits = httpx.Limits(**POOL_LIMITS)
+    return (
+        openai.OpenAI(http_client=httpx.Client(limits=limits), **client_options),
+        openai.AsyncOpenAI(http_client=httpx.AsyncClient(limits=limits), **client_options),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def openai_clients(base_url=None):
+    """Sync and async SDK clients for an endpoint, created once per process."""
+    return _make_openai_clients(base_url=base_url)
+
+
+def _gemini(model=None):
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return genai.GenerativeModel(model or "gemini-1.5-pro")
+
+
+def _openai(model=None):
+    return OpenAIChatModel(model or "gpt-4o-mini", clients=openai_clients(os.getenv("OPENAI_BASE_URL")))
+
+
+def _fake(model=None):
+    from agent.fake_llm import FakeLLM
+
+    return FakeLLM(latency=float(os.getenv("FAKE_LLM_LATENCY", "0")))
+
+
+PROVIDERS = {
+    "gemini": _gemini,
+    "openai": _openai,
+    "fake": _fake,
+}
+
+
+def register_provider(name, factory):
+    """Add a provider: `factory(model=None)` returns a model object."""
+    PROVIDERS[name] = factory
+
+
+def _create(provider, model):
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider {provider!r}; choose from {', '.join(sorted(PROVIDERS))}")
+    return PROVIDERS[provider](model)
+
+
+def parse_model_spec(spec, provider=None):
+    """Split "provider:model" (or just "model") into (provider, model)."""
+    name, _, model = spec.partition(":")
+    if name not in PROVIDERS:
+        name, model = "", spec
+    return name or provider or os.getenv("LLM_PROVIDER", DEFAULT_PROVIDER), model or None
+
+
+def create_llm(provider=None, model=None):
+    """Create a model from the registry (defaults from LLM_PROVIDER / LLM_MODEL).
+
+    With no arguments, per-node LLM_MODEL_<ROLE> and LLM_HEDGE_MODEL settings
+    are applied as well.
+    """
+    name = provider or os.getenv("LLM_PROVIDER", DEFAULT_PROVIDER)
+    default = _create(name, model or os.getenv("LLM_MODEL"))
+    if provider is not None or model is not None:
+        return default
+
+    from agent.models import ROLES
+
+    specs = {role: os.getenv(f"LLM_MODEL_{role.upper()}") for role in ROLES}
+    specs = {role: parse_model_spec(spec) for role, spec in specs.items() if spec}
+    hedge = os.getenv("LLM_HEDGE_MODEL")
+    if not specs and not hedge:
+        return default
+
+    from agent.models import HedgedModel, ModelRouter
+
+    models = {(name, os.getenv("LLM_MODEL")): default}     # one client per distinct (provider, model)
+    for spec in specs.values():
+        if spec not in models:
+            models[spec] = _create(*spec)
+    router = ModelRouter(default, {role: models[spec] for role, spec in specs.items()})
+    if hedge:
+        spec = parse_model_spec(hedge)
+        backup = models[spec] if spec in models else _create(*spec)
+        hedge_after = float(os.getenv("LLM_HEDGE_AFTER", "2.0"))
+        # No point racing the backup against itself
+        router = router.map(lambda primary: primary if primary is backup else HedgedModel(primary, backup, hedge_after))
+    return router
@@ -0,0 +1,211 @@
+"""Typed records and a compact msgpack encoding for `AgentState`.
+
+The live state keeps plain dicts (they are formatted straight into prompts),
+but checkpoints are stored as slotted records packed positionally with
+msgpack instead of as JSON objects:
+
+- `Preferences`: the four known fields, plus any extra keys the model added.
+- `DestinationRef`: a catalog index and match score instead of a copy of the
+  catalog record (the full record is kept only if it isn't in the catalog).
+- `HistoryEntry`: a role code and the content.
+
+The itinerary plan is also stored in the assistant message that presented
+it, so it is encoded as a reference to that message. `pack_state` can encode
+`history` as a delta against an earlier checkpoint, which makes per-turn
+checkpoints proportional to the new messages rather than the whole
+conversation.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+import ormsgpack
+
+from agent.state import AgentState
+from agent.tools.destination_db import get_catalog
+
+FORMAT_VERSION = 2
+ROLES = ("user", "assistant", "system")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+PREFERENCE_FIELDS = ("budget", "duration", "interests", "season")
+
+
+@dataclass(slots=True)
+class Preferences:
+    budget: Optional[str] = None
+    duration: Optional[float] = None
+    interests: Optional[Tuple[str, ...]] = None
+    season: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+    # Original key order, kept only when it differs from the default so
+    # prompts built from a restored state are byte-identical
+    order: Optional[Tuple[str, ...]] = None
+
+    @classmethod
+    def from_dict(cls, preferences):
+        known = {k: v for k, v in preferences.items() if k in PREFERENCE_FIELDS and v is not None}
+        extra = {k: v for k, v in preferences.items() if k not in known}
+        interests = known.get("interests")
+        record = cls(
+            budget=known.get("budget"),
+            duration=known.get("duration"),
+            interests=tuple(interests) if isinstance(interests, list) else interests,
+            season=known.get("season"),
+            extra=extra,
+        )
+        if list(record.as_dict()) != list(preferences):
+            record.order = tuple(preferences)
+        return record
+
+    def as_dict(self):
+        preferences = {}
+        for name in PREFERENCE_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                preferences[name] = list(value) if isinstance(value, tuple) else value
+        preferences.update(self.extra)
+        if self.order:
+            preferences = {key: preferences[key] for key in self.order}
+        return preferences
+
+    def pack(self):
+        return [self.budget, self.duration, self.interests, self.season, self.extra or None, self.order]
+
+    @classmethod
+    def unpack(cls, row):
+        budget, duration, interests, season, extra, order = row
+        return cls(budget, duration, tuple(interests) if isinstance(interests, list) else interests,
+                   season, extra or {}, tuple(order) if order else None)
+
+
+@dataclass(slots=True)
+class DestinationRef:
+    catalog_index: Optional[int]
+    match_score: Optional[int] = None
+    record: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, destination, catalog):
+        base = {k: v for k, v in destination.items() if k != "match_score"}
+        index = catalog.name_index.get(destination.get("name"))
+        if index is not None and catalog.destinations[index] == base:
+            return cls(index, destination.get("match_score"))
+        return cls(None, destination.get("match_score"), base)
+
+    def as_dict(self, catalog):
+        record = dict(self.record if self.catalog_index is None else catalog.destinations[self.catalog_index])
+        if self.match_score is not None:
+            record["match_score"] = self.match_score
+        return record
+
+    def pack(self):
+        return [self.catalog_index, self.match_score, self.record]
+
+    @classmethod
+    def unpack(cls, row):
+        return cls(*row)
+
+
+@dataclass(slots=True)
+class HistoryEntry:
+    role: str
+    content: str
+
+    @classmethod
+    def from_dict(cls, message):
+        return cls(message["role"], message["content"])
+
+    def as_dict(self):
+        return {"role": self.role, "content": self.content}
+
+    def pack(self):
+        code = ROLE_CODES.get(self.role)
+        return [code if code is not None else self.role, self.content]
+
+    @classmethod
+    def unpack(cls, row):
+        role, content = row
+        return cls(ROLES[role] if isinstance(role, int) else role, content)
+
+
+def _pack_itinerary(itinerary, history):
+    """Encode the plan as (message index, offset) when a message contains it."""
+    if not itinerary:
+        return None
+    plan = itinerary.get("plan")
+    rest = {k: v for k, v in itinerary.items() if k != "plan"}
+    if isinstance(plan, str) and plan:
+        for index in range(len(history) - 1, -1, -1):
+            offset = history[index]["content"].find(plan)
+            if offset >= 0:
+                return [rest, index, offset, len(plan)]
+    return [itinerary, None, None, None]
+
+
+def _unpack_itinerary(row, history):
+    if row is None:
+        return {}
+    itinerary, index, offset, length = row
+    if index is None:
+        return itinerary
+    return dict(itinerary, plan=history[index]["content"][offset:offset + length])
+
+
+def pack_state(state: AgentState, history_start=0):
+    """Encode a state as msgpack bytes.
+
+    Only `history[history_start:]` is included; pass the history length of
+    the previous checkpoint to write a delta. Everything else is small and
+    always written in full.
+    """
+    catalog = get_catalog()
+    history = state.history
+    row = [
+        FORMAT_VERSION,
+        Preferences.from_dict(state.preferences).pack(),
+        [DestinationRef.from_dict(d, catalog).pack() for d in state.destinations],
+        _pack_itinerary(state.itinerary, history),
+        history_start,
+        [HistoryEntry.from_dict(m).pack() for m in history[history_start:]],
+        Preferences.from_dict(state.ranked_preferences).pack() if state.ranked_preferences else None,
+        state.context_summary,
+        state.summarized_until,
+        state.prompt_tokens,
+        state.is_followup,
+        state.session_id,
+        state.recommendations or None,
+    ]
+    return ormsgpack.packb(row)
+
+
+def unpack_state(data, history=None):
+    """Decode `pack_state` output.
+
+    For a delta, pass the history the delta was taken against (at least
+    `history_start` messages long); it is not modified.
+    """
+    row = ormsgpack.unpackb(data)
+    if row[0] == 1:
+        row.append(None)    # version 1 had no structured recommendations
+    elif row[0] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format version: {row[0]}")
+    (_, preferences, destinations, itinerary, history_start, entries,
+     ranked, summary, summarized_until, prompt_tokens, is_followup, session_id, recommendations) = row
+    if history_start and (history is None or len(history) < history_start):
+        raise ValueError("Delta checkpoint needs the earlier history to decode")
+
+    catalog = get_catalog()
+    full_history = list(history[:history_start]) if history_start else []
+    full_history.extend(HistoryEntry.unpack(row).as_dict() for row in entries)
+    return AgentState(
+        preferences=Preferences.unpack(preferences).as_dict(),
+        destinations=[DestinationRef.unpack(row).as_dict(catalog) for row in destinations],
+        itinerary=_unpack_itinerary(itinerary, full_history),
+        history=full_history,
+        ranked_preferences=Preferences.unpack(ranked).as_dict() if ranked else {},
+        context_summary=summary,
+        summarized_until=summarized_until,
+        prompt_tokens=prompt_tokens,
+        is_followup=is_followup,
+        session_id=session_id,
+        recommendations=recommendations or [],
+    )
@@ -0,0 +1,23 @@
+from agent.nodes.destination_finder import ranking_inputs
+from agent.nodes.itinerary_creator import needs_itinerary
+
+# Stages a turn can resume from, in pipeline order
+RANK = "rank"
+ITINERARY = "itinerary"
+ANSWER = "answer"
+
+
+def next_stage(state):
+    """Pick the earliest stage whose inputs changed after preference extraction.
+
+    - first turn, or budget/interests/season changed: re-rank destinations
+    - only the duration changed: regenerate the itinerary
+    - nothing changed: answer the follow-up from the existing plan
+    """
+    if not state.is_followup or not state.destinations:
+        return RANK
+    if ranking_inputs(state.preferences) != state.ranked_preferences:
+        return RANK
+    if needs_itinerary(state):
+        return ITINERARY
+    return ANSWER
@@ -0,0 +1,333 @@
+"""Cross-session LLM scheduler: admission control, rate limits, fair queueing.
+
+Every model call from every session goes through one `LLMScheduler`, which
+decides when it may start:
+
+- Token buckets hold calls to the provider's requests-per-minute and
+  tokens-per-minute quotas (prompt tokens, estimated), so bursts queue
+  locally instead of coming back as quota errors.
+- At most `max_in_flight` calls run at once, and at most `max_queue` wait;
+  beyond that new calls are rejected with `SchedulerOverloaded` rather than
+  queueing without bound.
+- Waiting calls are served by priority (follow-up answers first, bulk jobs
+  last, see `ROLE_PRIORITIES`), and within a priority round-robin across
+  sessions, so one session with many queued calls can't starve the others.
+
+`wrap` puts the scheduler in front of a model (or every model of a
+`ModelRouter`), with the priority taken from each node's role:
+
+    scheduler = LLMScheduler(requests_per_minute=300, tokens_per_minute=400_000)
+    travel_agent = build_async_travel_agent(scheduler.wrap(llm))
+
+`load_scheduler_from_env` builds one from LLM_RPM, LLM_TPM,
+LLM_MAX_IN_FLIGHT and LLM_MAX_QUEUE for the server.
+
+The session a call belongs to comes from `session_context`, which
+`agent.sessions.run_turn` sets for every turn. Only the async API is
+scheduled; blocking `generate_content` calls (the single-user CLI) pass
+straight through.
+"""
+import asyncio
+import collections
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from agent import tracing
+from agent.context import estimate_tokens
+from agent.models import ROLES, ModelRouter, model_for, model_name
+
+# Lower runs first. Follow-up answers are what a user is waiting on right
+# now; itineraries are long and can wait behind them; bulk jobs go last.
+FOLLOWUP, INTERACTIVE, GENERATION, BULK = range(4)
+ROLE_PRIORITIES = {
+    "followup": FOLLOWUP,
+    "preferences": INTERACTIVE,
+    "recommendations": INTERACTIVE,
+    "itinerary": GENERATION,
+}
+PRIORITY_NAMES = ("followup", "interactive", "generation", "bulk")
+# Recent waits kept per priority for the percentiles in `metrics()`
+WAIT_WINDOW = 1000
+
+# (session id, bulk) of the calls made in the current task
+_session = ContextVar("llm_session", default=(None, False))
+
+
+@contextmanager
+def session_context(session_id, bulk=False):
+    """Attribute model calls made inside the block to `session_id`.
+
+    With `bulk=True` they are scheduled at the lowest priority (batch jobs).
+    """
+    token = _session.set((session_id, bulk))
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+class SchedulerOverloaded(RuntimeError):
+    """Raised when the scheduler's queue is full."""
+
+
+class TokenBucket:
+    """Refills `rate` units per second up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, cost, now=None):
+        """Seconds until `cost` units are available (0 if they are now)."""
+        self._refill(time.monotonic() if now is None else now)
+        cost = min(cost, self.capacity)
+        return 0.0 if self.level >= cost else (cost - self.level) / self.rate
+
+    def take(self, cost):
+        self.level -= min(cost, self.capacity)
+
+
+@dataclass
+class SchedulerStats:
+    """Counters for an `LLMScheduler`."""
+    admitted: int = 0
+    rejected: int = 0
+    completed: int = 0
+    rate_limited: int = 0   # times the head of the queue waited for a bucket
+    max_queued: int = 0
+    waits: dict = field(default_factory=lambda: {p: collections.deque(maxlen=WAIT_WINDOW) for p in range(BULK + 1)})
+
+    def as_dict(self):
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "rate_limited": self.rate_limited,
+            "max_queued": self.max_queued,
+            "wait_ms": {PRIORITY_NAMES[p]: _percentiles(waits) for p, waits in self.waits.items() if waits},
+        }
+
+
+def _percentiles(waits):
+    ordered = sorted(waits)
+
+    def ms(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+    return {"p50": ms(0.5), "p99": ms(0.99), "max": ms(1.0)}
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "session", "cost", "queued_at")
+
+    def __init__(self, future, priority, session, cost):
+        self.future = future
+        self.priority = priority
+        self.session = session
+        self.cost = cost
+        self.queued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Admission control, token-bucket rate limiting and per-session fair queueing."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_in_flight=16, max_queue=1000):
+        self.requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60)) \
+            if requests_per_minute else None
+        # A minute's quota may be spent in a burst, like the provider allows
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.stats = SchedulerStats()
+        # priority -> session -> FIFO of waiters; session order is the round-robin ring
+        self._queues = [collections.OrderedDict() for _ in range(BULK + 1)]
+        self._queued = 0
+        self._timer = None
+        self._closed = set()
+
+    def queue_depth(self):
+        """Waiting calls per priority name."""
+        return {PRIORITY_NAMES[p]: sum(len(q) for q in sessions.values())
+                for p, sessions in enumerate(self._queues)}
+
+    def metrics(self):
+        """Queue depth, in-flight calls, counters and recent wait percentiles."""
+        return dict(self.stats.as_dict(), queued=self._queued, queue_depth=self.queue_depth(),
+                    in_flight=self.in_flight)
+
+    async def acquire(self, priority, cost=1):
+        """Wait for a slot for one call; returns the seconds spent queued.
+
+        Each successful `acquire` must be paired with a `release`.
+        """
+        if self._queued >= self.max_queue:
+            self.stats.rejected += 1
+            raise SchedulerOverloaded("LLM queue is full, try again shortly")
+        session, _ = _session.get()
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, session, cost)
+        self._queues[priority].setdefault(session, collections.deque()).append(waiter)
+        self._queued += 1
+        self.stats.max_queued = max(self.stats.max_queued, self._queued)
+        self._dispatch()
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()  # granted just as the caller gave up
+            else:
+                self._remove(waiter)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self.stats.completed += 1
+        self._dispatch()
+
+    def _remove(self, waiter):
+        sessions = self._queues[waiter.priority]
+        queue = sessions.get(waiter.session)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del sessions[waiter.session]
+
+    def _next(self):
+        """Highest-priority waiter, taking sessions of a priority in turn."""
+        for sessions in self._queues:
+            if sessions:
+                session, queue = next(iter(sessions.items()))
+                return sessions, session, queue
+        return None
+
+    def _dispatch(self):
+        while self.in_flight < self.max_in_flight:
+            head = self._next()
+            if head is None:
+                return
+            sessions, session, queue = head
+            waiter = queue[0]
+            if waiter.future.done():
+                # Cancelled, but its task hasn't run yet to take it out
+                self._remove(waiter)
+                continue
+            now = time.monotonic()
+            delay = max([bucket.delay(cost, now) for bucket, cost in self._costs(waiter)], default=0.0)
+            if delay > 0:
+                # Strict priority: nothing else starts before the head does
+                self.stats.rate_limited += 1
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+
+            queue.popleft()
+            self._queued -= 1
+            # Move the session to the back of the ring (or drop it if drained)
+            del sessions[session]
+            if queue:
+                sessions[session] = queue
+            for bucket, cost in self._costs(waiter):
+                bucket.take(cost)
+            self.in_flight += 1
+            self.stats.admitted += 1
+            wait = now - waiter.queued_at
+            self.stats.waits[waiter.priority].append(wait)
+            waiter.future.set_result(wait)
+
+    def _costs(self, waiter):
+        """(bucket, cost) for each configured quota: one request, the prompt's tokens."""
+        return [(bucket, cost) for bucket, cost in ((self.requests, 1), (self.tokens, waiter.cost))
+                if bucket is not None]
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def priority_for(self, role):
+        """Priority for a call from `role` in the current session context."""
+        _, bulk = _session.get()
+        return BULK if bulk else ROLE_PRIORITIES.get(role, INTERACTIVE)
+
+    def wrap(self, llm):
+        """Schedule every async call to `llm` (a model or `ModelRouter`), with each role's priority."""
+        default = llm.default if isinstance(llm, ModelRouter) else llm
+        return ModelRouter(ScheduledModel(default, self),
+                           {role: ScheduledModel(model_for(llm, role), self, role) for role in ROLES})
+
+
+class ScheduledModel:
+    """A model whose async calls wait for an `LLMScheduler` slot first."""
+
+    def __init__(self, model, scheduler, role=None):
+        self.model = model
+        self.scheduler = scheduler
+        self.role = role
+        self.model_name = model_name(model)
+
+    def generate_content(self, prompt_string, stream=False, **kwargs):
+        return self.model.generate_content(prompt_string, stream=stream, **kwargs)
+
+    async def _acquire(self, prompt_string):
+        priority = self.scheduler.priority_for(self.role)
+        with tracing.span("llm.queue", priority=PRIORITY_NAMES[priority]) as span:
+            wait = await self.scheduler.acquire(priority, estimate_tokens(prompt_string))
+            span.set(wait_ms=round(wait * 1000, 1))
+
+    async def generate_content_async(self, prompt_string, stream=False, **kwargs):
+        await self._acquire(prompt_string)
+        try:
+            if hasattr(self.model, "generate_content_async"):
+                response = await self.model.generate_content_async(prompt_string, stream=stream, **kwargs)
+            else:
+                # No async API: one blocking call in a worker thread, streamed as a single chunk
+                response = await asyncio.to_thread(self.model.generate_content, prompt_string, **kwargs)
+                response = [response] if stream else response
+        except BaseException:
+            self.scheduler.release()
+            raise
+        if not stream:
+            self.scheduler.release()
+            return response
+        # A streamed call holds its slot until the stream is finished
+        return self._release_after(response)
+
+    async def _release_after(self, stream):
+        try:
+            if hasattr(stream, "__aiter__"):
+                async for chunk in stream:
+                    yield chunk
+            else:
+                for chunk in stream:
+                    yield chunk
+        finally:
+            self.scheduler.release()
+
+    async def aclose(self):
+        # Every role of a wrapped router shares the underlying model; close it once
+        if hasattr(self.model, "aclose") and id(self.model) not in self.scheduler._closed:
+            self.scheduler._closed.add(id(self.model))
+            await self.model.aclose()
+
+
+def load_scheduler_from_env():
+    """An `LLMScheduler` configured from LLM_RPM / LLM_TPM / LLM_MAX_IN_FLIGHT /
+    LLM_MAX_QUEUE, or None when none of them is set."""
+    names = ("LLM_RPM", "LLM_TPM", "LLM_MAX_IN_FLIGHT", "LLM_MAX_QUEUE")
+    if not any(os.getenv(name) for name in names):
+        return None
+    return LLMScheduler(
+        requests_per_minute=float(os.getenv("LLM_RPM") or 0) or None,
+        tokens_per_minute=float(os.getenv("LLM_TPM") or 0) or None,
+        max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT") or 16),
+        max_queue=int(os.getenv("LLM_MAX_QUEUE") or 1000),
+    )
@@ -0,0 +1,131 @@
+import asyncio
+import copy
+import dataclasses
+import time
+from agent import tracing
+from agent.scheduler import session_context
+from agent.state import AgentState
+from agent.streaming import TurnStream
+
+
+def latest_reply(state: AgentState):
+    """Return the latest assistant message in the state's history."""
+    if state.history and state.history[-1].get("role") == "assistant":
+        return state.history[-1].get("content")
+    return "I'm processing your request..."
+
+
+def _fields(state: AgentState):
+    """Shallow copies of the state's fields, for undoing a failed turn."""
+    return {field.name: copy.copy(getattr(state, field.name)) for field in dataclasses.fields(state)}
+
+
+async def run_turn(travel_agent, state: AgentState, message, on_chunk=None, checkpointer=None):
+    """Run one conversation turn through a compiled async graph.
+
+    Returns the new state. If `on_chunk` is given, streamed text is passed to
+    it as it arrives (it may be a coroutine function). If the turn fails, the
+    state (including the user's message) is put back the way it was before
+    the error is raised, so the session can simply be retried; pass the
+    graph's `checkpointer` so its checkpoints are rewound too.
+    """
+    previous = _fields(state)
+    # Every turn after the first is a follow-up
+    state.is_followup = bool(state.history)
+    state.history.append({"role": "user", "content": message})
+
+    # Model calls made during the turn are queued under this session
+    try:
+        with tracing.span("turn", followup=state.is_followup), session_context(state.session_id):
+            turn = TurnStream(travel_agent, state)
+            async for chunk in turn:
+                if on_chunk is not None:
+                    result = on_chunk(chunk)
+                    if asyncio.iscoroutine(result):
+                        await result
+    except BaseException:
+        for name, value in previous.items():
+            setattr(state, name, value)
+        if checkpointer is not None:
+            checkpointer.rewind(state)
+        raise
+
+    result = turn.result
+    return result if isinstance(result, AgentState) else AgentState(**result)
+
+
+class Session:
+    """One user's conversation state plus the lock serializing its turns."""
+
+    __slots__ = ("session_id", "state", "lock", "last_used")
+
+    def __init__(self, session_id, state=None):
+        self.session_id = session_id
+        self.state = state or AgentState(session_id=session_id)
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """In-memory per-session `AgentState` store with idle eviction.
+
+    With a `checkpointer`, a session that isn't in memory (after a restart or
+    eviction) is resumed from its last checkpoint.
+    """
+
+    def __init__(self, idle_timeout=1800, max_sessions=None, checkpointer=None):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.checkpointer = checkpointer
+        self._sessions = {}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        """Return the session, creating it on first use."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            self._make_room()
+            state = self.checkpointer.load(session_id) if self.checkpointer is not None else None
+            session = self._sessions[session_id] = Session(session_id, state)
+        session.last_used = time.monotonic()
+        return session
+
+    async def aget(self, session_id):
+        """Async `get`: a checkpoint is loaded in a worker thread, off the event loop."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            self._make_room()
+            state = None
+            if self.checkpointer is not None:
+                state = await asyncio.to_thread(self.checkpointer.load, session_id)
+            # Another request for the session may have created it meanwhile
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id, state)
+        session.last_used = time.monotonic()
+        return session
+
+    def _make_room(self):
+        if self.max_sessions and len(self._sessions) >= self.max_sessions:
+            self.evict_idle()
+            if len(self._sessions) >= self.max_sessions:
+                raise RuntimeError("Too many active sessions")
+
+    def evict_idle(self, now=None):
+        """Drop sessions idle for longer than `idle_timeout`. Returns the count."""
+        now = time.monotonic() if now is None else now
+        expired = [
+            session_id for session_id, session in self._sessions.items()
+            if now - session.last_used > self.idle_timeout and not session.lock.locked()
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+        return len(expired)
+
+    async def run_eviction(self, interval=60):
+        """Background task that evicts idle sessions every `interval` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
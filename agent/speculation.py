@@ -0,0 +1,213 @@
+"""Speculative itineraries generated while the user reads the last one.
+
+After an itinerary turn the next message is often "what about Shimla
+instead?" (a runner-up from `state.destinations`) or "make it 3 days" (a
+neighbouring duration). `Speculator.start` generates those itineraries in
+background tasks, at bulk priority when the model goes through an
+`LLMScheduler`, into a small per-session cache. The itinerary node asks the
+cache first, because the speculator stands in for the `ItineraryStore`:
+
+    speculator = Speculator(llm, store=itinerary_store, max_per_session=3)
+    travel_agent = build_async_travel_agent(llm, speculator)
+    state = await run_turn(travel_agent, state, message)
+    speculator.start(state)
+
+Each `start` keeps the entries that are still candidates for the new state
+and cancels or drops the rest. `stats` counts hits, misses and plans
+generated but never used, for tuning how much to spend on speculation.
+"""
+import asyncio
+import collections
+import itertools
+from dataclasses import dataclass
+
+from agent import tracing
+from agent.itinerary_store import DEFAULT_DURATION, profile_of
+from agent.llm import agenerate_text
+from agent.models import model_for
+from agent.nodes.itinerary_creator import build_itinerary_prompt
+from agent.scheduler import session_context
+from agent.state import AgentState
+from agent.tools.weather_api import get_weather_service
+
+# Duration changes tried for the top destination, most likely first
+DURATION_STEPS = (-1, 1)
+
+
+@dataclass
+class SpeculationStats:
+    """Counters for a `Speculator`."""
+    started: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    hits: int = 0
+    misses: int = 0
+    late: int = 0      # misses whose plan was still being generated
+    wasted: int = 0    # plans generated and dropped unused
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "late": self.late,
+            "wasted": self.wasted,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "used_rate": round(self.hits / self.completed, 4) if self.completed else 0.0,
+        }
+
+
+def speculative_state(state: AgentState, destination, duration):
+    """The state a follow-up switching to `destination` / `duration` would have."""
+    destinations = sorted(state.destinations, key=lambda d: d["name"] != destination)
+    return AgentState(preferences=dict(state.preferences, duration=duration), destinations=destinations,
+                      ranked_preferences=dict(state.ranked_preferences), session_id=state.session_id)
+
+
+def _plan(task):
+    """A finished speculation task's plan, or None."""
+    return task.result() if task.done() and not task.cancelled() else None
+
+
+class Speculator:
+    """Per-session cache of itineraries generated ahead of the next turn.
+
+    Implements the `ItineraryStore` lookup interface (`get`, `aget`,
+    `remember`) so it can be passed to the graph as its store; lookups it
+    can't serve go to the wrapped `store`, if any. At most `max_per_session`
+    plans are kept or in flight per session, for the `max_sessions` most
+    recently active sessions.
+    """
+
+    def __init__(self, llm, store=None, max_per_session=3, durations=DURATION_STEPS, structured=False,
+                 max_sessions=1000):
+        self.llm = model_for(llm, "itinerary")
+        self.store = store
+        self.max_per_session = max_per_session
+        self.durations = durations
+        self.structured = structured
+        self.max_sessions = max_sessions
+        self.stats = SpeculationStats()
+        # session id -> {profile: task}, least recently started first
+        self._sessions = collections.OrderedDict()
+
+    def __len__(self):
+        return sum(len(tasks) for tasks in self._sessions.values())
+
+    def candidates(self, state: AgentState):
+        """(destination, duration) pairs likely to be asked for next, most likely first.
+
+        Runner-up destinations and neighbouring durations of the top one
+        alternate, up to `max_per_session`.
+        """
+        if not state.itinerary or not state.destinations:
+            return []
+        duration = state.preferences.get("duration", DEFAULT_DURATION)
+        runner_ups = [(d["name"], duration) for d in state.destinations[1:]]
+        top = state.destinations[0]["name"]
+        durations = [(top, duration + step) for step in self.durations
+                     if isinstance(duration, int) and duration + step >= 1]
+        pairs = [pair for pair in itertools.chain(*itertools.zip_longest(runner_ups, durations)) if pair]
+        return pairs[:self.max_per_session]
+
+    def start(self, state: AgentState):
+        """Speculate for the session's next turn, replacing stale work."""
+        session_id = state.session_id
+        wanted = {profile_of(dict(state.preferences, duration=duration), destination): (destination, duration)
+                  for destination, duration in self.candidates(state)}
+        tasks = self._sessions.pop(session_id, {})
+        for profile in [p for p in tasks if p not in wanted]:
+            self._drop(tasks.pop(profile))
+        for profile, (destination, duration) in wanted.items():
+            if profile not in tasks:
+                variant = speculative_state(state, destination, duration)
+                tasks[profile] = asyncio.create_task(self._generate(variant))
+                self.stats.started += 1
+        if tasks:
+            self._sessions[session_id] = tasks
+        while len(self._sessions) > self.max_sessions:
+            self.cancel(next(iter(self._sessions)))
+
+    async def _generate(self, state: AgentState):
+        destination = state.destinations[0]["name"]
+        with session_context(state.session_id, bulk=True), \
+                tracing.span("speculate", destination=destination, duration=state.preferences["duration"]):
+            try:
+                weather = await get_weather_service().get(destination)
+                plan = await agenerate_text(self.llm, build_itinerary_prompt(state, weather, self.structured))
+            except Exception:
+                # Nothing is waiting on a speculative plan; the turn generates its own
+                self.stats.failed += 1
+                return None
+        self.stats.completed += 1
+        return plan
+
+    def _drop(self, task):
+        if not task.done():
+            task.cancel()
+            self.stats.cancelled += 1
+        elif _plan(task) is not None:
+            self.stats.wasted += 1
+
+    def cancel(self, session_id):
+        """Stop and forget all speculation for a session."""
+        for task in self._sessions.pop(session_id, {}).values():
+            self._drop(task)
+
+    async def aclose(self):
+        """Cancel every session's speculation and wait for the tasks to stop."""
+        tasks = [task for session in self._sessions.values() for task in session.values()]
+        for session_id in list(self._sessions):
+            self.cancel(session_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def drain(self, session_id=None):
+        """Wait for in-flight speculation (one session's, or all)."""
+        sessions = [self._sessions.get(session_id, {})] if session_id is not None else self._sessions.values()
+        await asyncio.gather(*(task for tasks in sessions for task in tasks.values()), return_exceptions=True)
+
+    def _lookup(self, state: AgentState, on_chunk):
+        """A speculated plan for the state's top destination, or None."""
+        tasks = self._sessions.get(state.session_id)
+        if not state.is_followup or not tasks or not state.destinations:
+            return None
+        profile = profile_of(state.preferences, state.destinations[0]["name"])
+        task = tasks.get(profile)
+        plan = _plan(task) if task is not None else None
+        if plan is not None:
+            del tasks[profile]
+            self.stats.hits += 1
+            if on_chunk:
+                on_chunk(plan)
+            return plan
+        self.stats.misses += 1
+        if task is not None:
+            # Still generating at bulk priority; the turn generates its own
+            del tasks[profile]
+            if not task.done():
+                self.stats.late += 1
+            self._drop(task)
+        return None
+
+    def get(self, state: AgentState, on_chunk=None):
+        """Speculated plan for the state, else the wrapped store's `get`."""
+        plan = self._lookup(state, on_chunk)
+        if plan is None and self.store is not None:
+            plan = self.store.get(state, on_chunk=on_chunk)
+        return plan
+
+    async def aget(self, state: AgentState, on_chunk=None):
+        """Speculated plan for the state, else the wrapped store's `aget`."""
+        plan = self._lookup(state, on_chunk)
+        if plan is None and self.store is not None:
+            plan = await self.store.aget(state, on_chunk=on_chunk)
+        return plan
+
+    def remember(self, state: AgentState, plan):
+        if self.store is not None:
+            self.store.remember(state, plan)
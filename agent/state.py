@@ -1,10 +1,23 @@
-from typing import Dict, List, Any, TypedDict, Optional
-from pydantic import BaseModel, Field
+from dataclasses import dataclass, field
+from typing import Dict, List, Any
 
-class AgentState(BaseModel):
-    """State for the Travel Planner Agent."""
-    preferences: Dict[str, Any] = Field(default_factory=dict, description="User travel preferences")
-    destinations: List[Dict[str, Any]] = Field(default_factory=list, description="Suggested destinations")
-    itinerary: Dict[str, Any] = Field(default_factory=dict, description="Created travel itinerary")
-    history: List[Dict[str, str]] = Field(default_factory=list, description="Conversation history")
-    is_followup: bool = Field(default=False, description="Whether this is a follow-up request")
\ No newline at end of file
+
+@dataclass(slots=True)
+class AgentState:
+    """State for the Travel Planner Agent.
+
+    A slotted dataclass rather than a pydantic model: LangGraph rebuilds the
+    state before every node, and skipping validation makes that ~10x cheaper.
+    See `agent.records` for the compact checkpoint encoding.
+    """
+    preferences: Dict[str, Any] = field(default_factory=dict)         # User travel preferences
+    destinations: List[Dict[str, Any]] = field(default_factory=list)  # Suggested destinations
+    recommendations: List[Dict[str, str]] = field(default_factory=list)  # Structured recommendations, if any
+    itinerary: Dict[str, Any] = field(default_factory=dict)           # Created travel itinerary
+    history: List[Dict[str, str]] = field(default_factory=list)       # Conversation history
+    ranked_preferences: Dict[str, Any] = field(default_factory=dict)  # Preferences the current ranking was built from
+    context_summary: str = ""                                         # Rolling summary of older conversation turns
+    summarized_until: int = 0                                         # History index up to which turns are summarized
+    prompt_tokens: List[int] = field(default_factory=list)            # Estimated follow-up prompt tokens per turn
+    is_followup: bool = False                                         # Whether this is a follow-up request
+    session_id: str = ""                                              # Conversation id used for checkpoints
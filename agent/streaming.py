@@ -0,0 +1,61 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Callback that receives text chunks as the model produces them. It lives in a
+# context variable so one compiled graph can stream to many callers at once.
+_token_sink = ContextVar("token_sink", default=None)
+
+
+def current_sink():
+    """Return the active chunk callback, or None when not streaming."""
+    return _token_sink.get()
+
+
+@contextmanager
+def stream_to(callback):
+    """Stream node output to `callback` while the block runs.
+
+    Usage:
+        with stream_to(lambda chunk: print(chunk, end="", flush=True)):
+            travel_agent.invoke(state)
+    """
+    token = _token_sink.set(callback)
+    try:
+        yield
+    finally:
+        _token_sink.reset(token)
+
+
+class TurnStream:
+    """Async iterator over the chunks of one `ainvoke` turn.
+
+    After iteration finishes, `result` holds the final graph state.
+
+    Usage:
+        turn = TurnStream(travel_agent, state)
+        async for chunk in turn:
+            print(chunk, end="")
+        state = turn.result
+    """
+
+    def __init__(self, travel_agent, state):
+        self.travel_agent = travel_agent
+        self.state = state
+        self.result = None
+
+    async def __aiter__(self):
+        queue = asyncio.Queue()
+
+        # The task copies the current context, so the sink is only seen by this turn
+        with stream_to(queue.put_nowait):
+            task = asyncio.create_task(self.travel_agent.ainvoke(self.state))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+        finally:
+            if not task.done():
+                task.cancel()
+        self.result = task.result()
@@ -0,0 +1,152 @@
+"""Structured, size-bounded model output for recommendations and itineraries.
+
+In structured mode the model returns JSON matching a schema with explicit
+per-field length limits instead of free-form prose, which caps how many
+tokens it can generate. The reply is checked against the same limits
+locally (`conform`) and rendered for display with fixed templates, and the
+structure is kept on the state so follow-ups can send it instead of the
+rendered text.
+"""
+import json
+import re
+
+from agent import tracing
+
+# Per-field length limits (characters); the schemas below are built from these
+FIELD_LIMITS = {
+    "name": 40,
+    "country": 30,
+    "why": 160,
+    "best_time": 40,
+    "budget": 40,
+    "title": 40,
+    "morning": 90,
+    "afternoon": 90,
+    "evening": 90,
+    "stay": 60,
+    "cost": 30,
+    "transport": 120,
+    "total_cost": 40,
+}
+MAX_RECOMMENDATIONS = 3
+# Longest structured itinerary; longer trips are planned for their first
+# MAX_DAYS days and the reply says so
+MAX_DAYS = 14
+DEFAULT_DAYS = 7
+DAYS_CAP_NOTE = ("This plan covers the first {max_days} of your {days} days. "
+                 "Ask me to plan the remaining days next.")
+
+RECOMMENDATIONS_HEADER = "Here are my top picks for you:"
+RECOMMENDATION_TEMPLATE = "{index}. {name}, {country}\n   {why}\n   Best time: {best_time} | Budget: {budget}"
+DAY_TEMPLATE = (
+    "Day {day}: {title}\n"
+    "  - Morning: {morning}\n"
+    "  - Afternoon: {afternoon}\n"
+    "  - Evening: {evening}\n"
+    "  - Stay: {stay} | Est. cost: {cost}"
+)
+
+
+def _strings(*names):
+    return {name: {"type": "string", "maxLength": FIELD_LIMITS[name]} for name in names}
+
+
+def _object(properties):
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+RECOMMENDATIONS_SCHEMA = _object({
+    "recommendations": {
+        "type": "array",
+        "maxItems": MAX_RECOMMENDATIONS,
+        "items": _object(_strings("name", "country", "why", "best_time", "budget")),
+    },
+})
+
+
+def trip_days(duration):
+    """Trip length in days from a preference value such as 5, 5.0 or "7 days".
+
+    Anything without a positive number falls back to DEFAULT_DAYS.
+    """
+    if isinstance(duration, str):
+        match = re.search(r"\d+", duration)
+        duration = int(match.group()) if match else None
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration < 1:
+        return DEFAULT_DAYS
+    return int(duration)
+
+
+def itinerary_schema(duration):
+    """Schema for an itinerary of `duration` days (one item per day, at most MAX_DAYS)."""
+    days = min(trip_days(duration), MAX_DAYS)
+    return _object({
+        "days": {
+            "type": "array",
+            "maxItems": days,
+            "items": _object({"day": {"type": "integer"},
+                              **_strings("title", "morning", "afternoon", "evening", "stay", "cost")}),
+        },
+        **_strings("transport", "total_cost"),
+    })
+
+
+def schema_text(schema):
+    """Compact one-line JSON for embedding a schema in a prompt."""
+    return json.dumps(schema, separators=(",", ":"))
+
+
+def conform(value, schema):
+    """Coerce parsed JSON to `schema`, enforcing its length and item limits.
+
+    Strings are truncated to `maxLength`, arrays to `maxItems`, missing
+    required fields become empty values and unknown fields are dropped.
+    """
+    kind = schema["type"]
+    if kind == "object":
+        value = value if isinstance(value, dict) else {}
+        return {name: conform(value.get(name), sub) for name, sub in schema["properties"].items()}
+    if kind == "array":
+        items = value if isinstance(value, list) else []
+        return [conform(item, schema["items"]) for item in items[:schema.get("maxItems", len(items))]]
+    if kind == "integer":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+    text = " ".join(str(value).split()) if value is not None else ""
+    limit = schema.get("maxLength")
+    if limit and len(text) > limit:
+        text = text[:limit - 1].rstrip() + "…"
+    return text
+
+
+def parse_structured(response_text, schema):
+    """Parse and conform a JSON reply, or return None if it isn't JSON."""
+    with tracing.span("response.parse"):
+        match = re.search(r"```(?:json)?\s*(.*?)\s*```", response_text, re.DOTALL)
+        try:
+            value = json.loads(match.group(1) if match else response_text)
+        except json.JSONDecodeError:
+            return None
+        return conform(value, schema)
+
+
+def render_recommendations(recommendations):
+    """Display text for structured recommendations."""
+    lines = [RECOMMENDATIONS_HEADER]
+    for index, item in enumerate(recommendations, 1):
+        lines.append(RECOMMENDATION_TEMPLATE.format(index=index, **item))
+    return "\n".join(lines)
+
+
+def render_itinerary(itinerary, duration=None):
+    """Display text for a structured itinerary of a `duration`-day trip."""
+    parts = [DAY_TEMPLATE.format(**day) for day in itinerary["days"]]
+    if itinerary["transport"]:
+        parts.append(f"Getting around: {itinerary['transport']}")
+    if itinerary["total_cost"]:
+        parts.append(f"Estimated total: {itinerary['total_cost']}")
+    if duration is not None and trip_days(duration) > MAX_DAYS:
+        parts.append(DAYS_CAP_NOTE.format(max_days=MAX_DAYS, days=trip_days(duration)))
+    return "\n\n".join(parts)
@@ -1,17 +1,173 @@
+import heapq
 import json
+import math
 import os
+from functools import lru_cache
+from agent.tools.price_index import PriceIndex
+from agent.tools.destination_scoring import ColumnarScorer, as_score, score_key
+from agent.tools.route_planner import TravelTimes
+from agent.tools.tag_index import load_matcher
+
+
+class DestinationCatalog:
+    """Destination records with inverted indexes for fast candidate lookup.
+
+    The catalog is built once per process (see `get_catalog`). Tags, seasons and
+    budget levels are indexed as value -> set of record ids, and ideal_duration is
+    indexed as day -> set of record ids, so ranking only touches records that
+    match at least one preference.
+    """
+
+    def __init__(self, destinations):
+        self.destinations = list(destinations)
+        self.tag_index = {}
+        self.season_index = {}
+        self.budget_index = {}
+        self.duration_index = {}
+        self.name_index = {}
+        self._scorer = None
+        self._tag_matcher = None
+        self._price_index = None
+        self._travel_times = None
+
+        for idx, dest in enumerate(self.destinations):
+            self.name_index.setdefault(dest.get("name"), idx)
+            for tag in dest.get("tags", []):
+                self.tag_index.setdefault(tag.lower(), set()).add(idx)
+            for season in dest.get("best_seasons", []):
+                self.season_index.setdefault(season.lower(), set()).add(idx)
+            if "budget_level" in dest:
+                self.budget_index.setdefault(dest["budget_level"], set()).add(idx)
+            if dest.get("ideal_duration"):
+                low, high = dest["ideal_duration"]
+                for day in range(low, high + 1):
+                    self.duration_index.setdefault(day, set()).add(idx)
+
+    def __len__(self):
+        return len(self.destinations)
+
+    @property
+    def scorer(self):
+        """Columnar NumPy view of the catalog, built on first use."""
+        if self._scorer is None:
+            self._scorer = ColumnarScorer(self.destinations, self.tag_matcher)
+        return self._scorer
+
+    @property
+    def tag_matcher(self):
+        """Interest-to-tag matcher over the catalog's tags, loaded on first use."""
+        if self._tag_matcher is None:
+            self._tag_matcher = load_matcher(self.tag_index)
+        return self._tag_matcher
+
+    @property
+    def price_index(self):
+        """Numeric per-day price ranges for budget_max_inr filtering, built on first use."""
+        if self._price_index is None:
+            self._price_index = PriceIndex(self.destinations)
+        return self._price_index
+
+    @property
+    def travel_times(self):
+        """Nearest-neighbour travel-time table for route planning, built on first use."""
+        if self._travel_times is None:
+            self._travel_times = TravelTimes(self.destinations)
+        return self._travel_times
+
+    def match_duration(self, duration):
+        """Return ids of destinations whose ideal_duration contains `duration`."""
+        if isinstance(duration, bool) or not isinstance(duration, (int, float)):
+            return set()
+        # Bounds are whole days, so low <= d <= high is the same as
+        # low <= floor(d) and ceil(d) <= high.
+        lower, upper = math.floor(duration), math.ceil(duration)
+        if lower == upper:
+            return self.duration_index.get(lower, set())
+        return self.duration_index.get(lower, set()) & self.duration_index.get(upper, set())
+
+    def score(self, preferences):
+        """Score every destination matching at least one preference.
+
+        Uses the same weights as the original linear scan: 2 for an exact budget
+        match (1 if the user can afford more), 2 for duration, 1 per matching
+        interest (its similarity for fuzzy matches, see `tag_matcher`) and 2 for
+        season. Destinations that match nothing are omitted.
+        """
+        scores = {}
+
+        if "budget" in preferences:
+            budget = preferences["budget"]
+            for idx in self.budget_index.get(budget, ()):
+                scores[idx] = scores.get(idx, 0) + 2
+            cheaper = {"high": ["medium", "low"], "medium": ["low"]}.get(budget, [])
+            for level in cheaper:
+                for idx in self.budget_index.get(level, ()):
+                    scores[idx] = scores.get(idx, 0) + 1
+
+        if "duration" in preferences:
+            for idx in self.match_duration(preferences["duration"]):
+                scores[idx] = scores.get(idx, 0) + 2
+
+        if preferences.get("interests"):
+            for tag, weight in self.tag_matcher.weights(preferences["interests"]).items():
+                for idx in self.tag_index.get(tag, ()):
+                    scores[idx] = scores.get(idx, 0) + weight
+
+        if preferences.get("season"):
+            for idx in self.season_index.get(preferences["season"].lower(), ()):
+                scores[idx] = scores.get(idx, 0) + 2
+
+        return scores
+
+    def rank(self, preferences, k=5):
+        """Return copies of the top `k` destinations with a `match_score` field.
+
+        Scoring runs on the columnar engine. Ties keep catalog order, exactly
+        like a stable sort over the whole catalog would. With a numeric
+        `budget_max_inr`, destinations whose cheapest trip costs more are
+        left out (see `PriceIndex.eligible`).
+        """
+        top = self.scorer.top_k(preferences, k, self.price_index.eligible(preferences))
+        return [dict(self.destinations[i], match_score=score) for i, score in top]
+
+    def rank_indexed(self, preferences, k=5):
+        """Same result as `rank`, computed from the inverted indexes only.
+
+        Cheaper than a full columnar pass when preferences are very selective.
+        """
+        scores = self.score(preferences)
+        eligible = self.price_index.eligible(preferences)
+        if eligible is not None:
+            scores = {idx: score for idx, score in scores.items() if eligible[idx]}
+        top = heapq.nsmallest(k, scores.items(), key=lambda item: (-score_key(item[1]), item[0]))
+
+        # Zero-score destinations fill any remaining slots in catalog order
+        idx = 0
+        while len(top) < k and idx < len(self.destinations):
+            if idx not in scores and (eligible is None or eligible[idx]):
+                top.append((idx, 0))
+            idx += 1
+
+        return [dict(self.destinations[i], match_score=as_score(score)) for i, score in top]
+
+
+@lru_cache(maxsize=None)
+def get_catalog():
+    """Return the process-wide destination catalog, loading it on first use."""
+    return DestinationCatalog(get_destinations())
+
 
 def get_destinations():
     """Load destinations from the mock database."""
     # Get the directory of the current file
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    # Go up two levels to reach the project root
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+    # Go up two levels (agent/tools -> agent -> project root)
+    project_root = os.path.dirname(os.path.dirname(current_dir))
     # Path to destinations.json
     json_path = os.path.join(project_root, 'data', 'destinations.json')
     
     try:
-        with open(json_path, 'r') as f:
+        with open(json_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     except FileNotFoundError:
         # If file not found, return sample data with Indian destinations and budget in INR
@@ -23,7 +179,9 @@ def get_destinations():
                 "budget_level": "medium",
                 "budget_inr": {"low": "₹15,000-25,000", "medium": "₹25,000-40,000", "high": "₹40,000+"},
                 "ideal_duration": [3, 7],
-                "best_seasons": ["summer", "spring"]
+                "best_seasons": ["summer", "spring"],
+                "latitude": 32.2432,
+                "longitude": 77.1892
             },
             {
                 "name": "Shimla",
@@ -32,7 +190,9 @@ def get_destinations():
                 "budget_level": "medium",
                 "budget_inr": {"low": "₹12,000-20,000", "medium": "₹20,000-35,000", "high": "₹35,000+"},
                 "ideal_duration": [2, 5],
-                "best_seasons": ["summer", "spring", "autumn"]
+                "best_seasons": ["summer", "spring", "autumn"],
+                "latitude": 31.1048,
+                "longitude": 77.1734
             },
             {
                 "name": "Dharamshala",
@@ -41,7 +201,9 @@ def get_destinations():
                 "budget_level": "low",
                 "budget_inr": {"low": "₹10,000-18,000", "medium": "₹18,000-30,000", "high": "₹30,000+"},
                 "ideal_duration": [3, 6],
-                "best_seasons": ["spring", "autumn"]
+                "best_seasons": ["spring", "autumn"],
+                "latitude": 32.219,
+                "longitude": 76.3234
             },
             {
                 "name": "Dalhousie",
@@ -50,7 +212,9 @@ def get_destinations():
                 "budget_level": "medium",
                 "budget_inr": {"low": "₹12,000-20,000", "medium": "₹20,000-35,000", "high": "₹35,000+"},
                 "ideal_duration": [2, 5],
-                "best_seasons": ["summer", "spring"]
+                "best_seasons": ["summer", "spring"],
+                "latitude": 32.5387,
+                "longitude": 75.971
             },
             {
                 "name": "Kasol",
@@ -59,6 +223,8 @@ def get_destinations():
                 "budget_level": "low",
                 "budget_inr": {"low": "₹8,000-15,000", "medium": "₹15,000-25,000", "high": "₹25,000+"},
                 "ideal_duration": [3, 7],
-                "best_seasons": ["spring", "autumn"]
+                "best_seasons": ["spring", "autumn"],
+                "latitude": 32.01,
+                "longitude": 77.315
             }
         ]
\ No newline at end of file
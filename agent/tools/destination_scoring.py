@@ -0,0 +1,132 @@
+import numpy as np
+
+from agent.tools.tag_index import load_matcher
+
+# Budget levels the user can "afford down" to, mirroring the original scoring loop
+CHEAPER_BUDGETS = {"high": ["medium", "low"], "medium": ["low"]}
+# Fuzzy interest weights are in hundredths, so scores are ordered on
+# integer keys of score * SCORE_SCALE
+SCORE_SCALE = 100
+
+
+def score_key(score):
+    """Integer ordering key for a (possibly fractional) match score."""
+    return int(round(float(score) * SCORE_SCALE))
+
+
+def as_score(score):
+    """A match score as an int when whole, else rounded to hundredths."""
+    score = round(float(score), 2)
+    return int(score) if score.is_integer() else score
+
+
+def _bitsets(values_per_row, vocabulary):
+    """Pack each row's values into a (rows, words) uint64 bitset matrix."""
+    words = max(1, (len(vocabulary) + 63) // 64)
+    # Build each row as a Python int first; setting bits element-wise in
+    # NumPy is far slower for large catalogs
+    masks = [sum(1 << vocabulary[value] for value in values) for values in values_per_row]
+    bits = np.empty((len(masks), words), dtype=np.uint64)
+    for word in range(words):
+        shift = 64 * word
+        bits[:, word] = np.array([(mask >> shift) & 0xFFFFFFFFFFFFFFFF for mask in masks], dtype=np.uint64)
+    return bits
+
+
+class ColumnarScorer:
+    """Vectorized destination scoring over NumPy columns.
+
+    Budget levels are stored as integer codes, ideal_duration as two bound
+    columns, and tags/seasons as uint64 bitsets, so scoring the whole catalog
+    is a handful of array operations. Weights match the original loop:
+    2 for budget (1 if the user can afford more), 2 for duration,
+    1 per matching interest and 2 for season. Interests that aren't tags
+    are mapped to tags by `matcher` (see `agent.tools.tag_index`) and count
+    with their similarity weight.
+    """
+
+    def __init__(self, destinations, matcher=None):
+        self.destinations = list(destinations)
+
+        # Build vocabularies (lowercase for tags/seasons, exact for budget)
+        self.tag_ids = {}
+        self.season_ids = {}
+        self.budget_ids = {}
+        tags, seasons = [], []
+        for dest in self.destinations:
+            dest_tags = {tag.lower() for tag in dest.get("tags", [])}
+            dest_seasons = {season.lower() for season in dest.get("best_seasons", [])}
+            for tag in dest_tags:
+                self.tag_ids.setdefault(tag, len(self.tag_ids))
+            for season in dest_seasons:
+                self.season_ids.setdefault(season, len(self.season_ids))
+            tags.append(dest_tags)
+            seasons.append(dest_seasons)
+
+        self.budget = np.array(
+            [self.budget_ids.setdefault(d.get("budget_level"), len(self.budget_ids)) for d in self.destinations],
+            dtype=np.int16,
+        )
+        durations = [d.get("ideal_duration") or [np.inf, -np.inf] for d in self.destinations]
+        self.duration_low = np.array([low for low, _ in durations], dtype=np.float64)
+        self.duration_high = np.array([high for _, high in durations], dtype=np.float64)
+        self.tag_bits = _bitsets(tags, self.tag_ids)
+        self.matcher = matcher if matcher is not None else load_matcher(self.tag_ids)
+        self.season_bits = _bitsets(seasons, self.season_ids)
+
+    def __len__(self):
+        return len(self.destinations)
+
+    def _has_bit(self, bits, bit):
+        return ((bits[:, bit >> 6] >> np.uint64(bit & 63)) & np.uint64(1)).astype(np.int32)
+
+    def score(self, preferences):
+        """Return a float64 array with the match score of every destination."""
+        scores = np.zeros(len(self.destinations), dtype=np.float64)
+
+        if "budget" in preferences:
+            budget = preferences["budget"]
+            if budget in self.budget_ids:
+                scores += 2 * (self.budget == self.budget_ids[budget])
+            cheaper = [self.budget_ids[b] for b in CHEAPER_BUDGETS.get(budget, []) if b in self.budget_ids]
+            if cheaper:
+                scores += np.isin(self.budget, cheaper)
+
+        if "duration" in preferences:
+            duration = preferences["duration"]
+            if isinstance(duration, (int, float)) and not isinstance(duration, bool):
+                scores += 2 * ((self.duration_low <= duration) & (duration <= self.duration_high))
+
+        if preferences.get("interests"):
+            # Repeated interests count once per mention, like the original loop
+            for tag, weight in self.matcher.weights(preferences["interests"]).items():
+                scores += weight * self._has_bit(self.tag_bits, self.tag_ids[tag])
+
+        if preferences.get("season"):
+            season = self.season_ids.get(preferences["season"].lower())
+            if season is not None:
+                scores += 2 * self._has_bit(self.season_bits, season)
+
+        return scores
+
+    def top_k(self, preferences, k=5, eligible=None):
+        """Return (index, score) pairs for the top `k` destinations.
+
+        Ties keep catalog order, matching a stable descending sort. With an
+        `eligible` boolean mask only those destinations are considered.
+        """
+        n = len(self.destinations)
+        if n == 0 or k <= 0:
+            return []
+
+        scores = self.score(preferences)
+        rows = np.arange(n, dtype=np.int64) if eligible is None else np.flatnonzero(eligible)
+        # Fold the row index into the key so every key is unique and
+        # argpartition/argsort reproduce the stable sort order exactly
+        keys = -np.rint(scores[rows] * SCORE_SCALE).astype(np.int64) * n + rows
+        if k < len(rows):
+            candidates = np.argpartition(keys, k - 1)[:k]
+        else:
+            candidates = np.arange(len(rows))
+        order = rows[candidates[np.argsort(keys[candidates])]]
+        return [(int(i), as_score(scores[i])) for i in order]
@@ -0,0 +1,183 @@
+import re
+from functools import lru_cache
+from agent.tools.destination_db import get_catalog
+from agent.tools.price_index import to_rupees
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15,
+}
+_NUMBER = r"\b(\d{1,2}|" + "|".join(NUMBER_WORDS) + r")"
+
+DURATION_PATTERNS = [
+    (re.compile(_NUMBER + r"\s*-?\s*(?:days?|nights?)\b"), 1),
+    (re.compile(_NUMBER + r"\s*-?\s*weeks?\b"), 7),
+    (re.compile(r"\b(?:a|one)\s+week\b"), 7),
+    (re.compile(r"\bweekend\b"), 2),
+]
+
+BUDGET_PATTERNS = [
+    ("high", re.compile(r"\b(?:luxury|luxurious|high[- ]end|premium|splurge|high budget|expensive)\b")),
+    ("medium", re.compile(r"\b(?:mid[- ]range|moderate|medium budget|mid budget|comfortable budget)\b")),
+    # "a budget of 20000" names an amount, not a budget level
+    ("low", re.compile(r"\b(?:budget(?!\s+of\b)|cheap|affordable|low[- ]cost|low budget|shoestring|economical)\b")),
+]
+
+# A budget ceiling: "under ₹20,000", "below 20k", "up to rs 1.5 lakh", "max 30000 inr",
+# "within a budget of 20000". Only amounts marked as money count, so "under 5 days"
+# is not a ceiling (see `_ceiling`).
+BUDGET_CEILING_PATTERN = re.compile(
+    r"\b(?:under|below|less than|up to|upto|within|max(?:imum)?|at most)\s+(a budget of\s+)?"
+    r"(₹|rs\.?|inr)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|lakhs?|lacs?)?\b"
+    r"\s*(rupees|rs\b|inr\b)?"
+    r"(?!\s*(?:days?|nights?|weeks?|people|persons?|adults?|pax|travell?ers|guests)\b)"
+)
+
+SEASON_PATTERNS = {
+    "summer": re.compile(r"\b(?:summer|june)\b"),
+    "winter": re.compile(r"\b(?:winter|december|january|february)\b"),
+    "spring": re.compile(r"\b(?:spring|march|april)\b"),
+    "fall": re.compile(r"\b(?:fall|autumn|october|november)\b"),
+    "monsoon": re.compile(r"\b(?:monsoon|july|august|september)\b"),
+}
+
+PARTY_PATTERNS = [
+    ("solo", re.compile(r"\b(?:solo|alone|by myself)\b")),
+    ("couple", re.compile(r"\b(?:couple|honeymoon|my (?:wife|husband|partner|girlfriend|boyfriend))\b")),
+    ("family", re.compile(r"\b(?:family|kids|children|parents)\b")),
+    ("group", re.compile(r"\b(?:friends|group)\b")),
+]
+
+# Phrases the rule parser can't interpret (constraints, negations, comparisons).
+# Any of these sends the message to the LLM.
+COMPLEX_CUES = re.compile(r"\b(?:not|no|don't|dont|avoid|without|except|instead|but|rather|unless|prefer)\b")
+
+# Negations: "I don't want Shimla" rules a destination out rather than in
+NEGATION_CUES = re.compile(r"\b(?:not|no|don't|dont|avoid|without|except|never|skip)\b")
+
+# Phrasings that change the plan ("make it 3 days", "change to winter")
+EDIT_CUES = re.compile(
+    r"\b(?:make it|make this|change|switch|swap|update|extend|shorten|add|also|actually|instead of|"
+    r"let'?s (?:do|go|make)|(?:i|we)(?:'d| would) (?:like|prefer) to|plan (?:it )?for)\b"
+)
+
+# Questions about the current plan ("what should I pack?")
+QUESTION_PATTERN = re.compile(r"^\s*(?:what|which|how|when|where|why|who|is|are|can|could|should|do|does|will|would)\b|\?\s*$")
+
+# How much each field contributes to the confidence score
+FIELD_WEIGHTS = {"duration": 0.3, "budget": 0.25, "interests": 0.3, "season": 0.15}
+
+
+class PreferenceParser:
+    """Rule-based preference extractor for simple travel requests.
+
+    Uses precompiled patterns for duration, budget, season and party, and a
+    vocabulary built from the destination catalog's tags for interests.
+    `parse` returns the preferences it found plus a confidence in [0, 1].
+    """
+
+    def __init__(self, tags, seasons=()):
+        # Map word forms ("beach", "beaches") to catalog tags
+        self.tag_forms = {}
+        for tag in tags:
+            if tag == "budget":
+                continue  # Treated as a budget level, not an interest
+            self.tag_forms[tag] = tag
+            if tag.endswith("es"):
+                self.tag_forms.setdefault(tag[:-2], tag)
+            if tag.endswith("s"):
+                self.tag_forms.setdefault(tag[:-1], tag)
+            if tag.endswith("ing"):
+                stem = tag[:-3]
+                # "trekking" -> "trek", "shopping" -> "shop"
+                if len(stem) > 2 and stem[-1] == stem[-2]:
+                    stem = stem[:-1]
+                self.tag_forms.setdefault(stem, tag)
+        forms = sorted(self.tag_forms, key=len, reverse=True)
+        self.tag_pattern = re.compile(r"\b(" + "|".join(map(re.escape, forms)) + r")\b") if forms else None
+
+        # Use whichever spelling of autumn the catalog uses
+        self.fall_name = "autumn" if "autumn" in seasons and "fall" not in seasons else "fall"
+
+    def parse(self, message):
+        text = message.lower()
+        preferences = {}
+
+        for pattern, multiplier in DURATION_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                if match.groups():
+                    value = match.group(1)
+                    count = int(value) if value.isdigit() else NUMBER_WORDS[value]
+                else:
+                    count = 1
+                preferences["duration"] = count * multiplier
+                break
+
+        for level, pattern in BUDGET_PATTERNS:
+            if pattern.search(text):
+                preferences["budget"] = level
+                break
+
+        ceiling = _ceiling(text)
+        if ceiling:
+            preferences["budget_max_inr"] = ceiling
+
+        if self.tag_pattern:
+            interests = []
+            for match in self.tag_pattern.finditer(text):
+                tag = self.tag_forms[match.group(1)]
+                if tag not in interests:
+                    interests.append(tag)
+            if interests:
+                preferences["interests"] = interests
+
+        for season, pattern in SEASON_PATTERNS.items():
+            if pattern.search(text):
+                preferences["season"] = self.fall_name if season == "fall" else season
+                break
+
+        for party, pattern in PARTY_PATTERNS:
+            if pattern.search(text):
+                preferences["party"] = party
+                break
+
+        if COMPLEX_CUES.search(text):
+            return preferences, 0.0
+        # A numeric ceiling is as good as a budget level
+        found = set(preferences) | ({"budget"} if "budget_max_inr" in preferences else set())
+        confidence = sum(weight for field, weight in FIELD_WEIGHTS.items() if field in found)
+        return preferences, round(confidence, 2)
+
+    def is_negated(self, message):
+        """Whether the message negates or excludes something."""
+        return bool(NEGATION_CUES.search(message.lower()))
+
+    def is_edit(self, message):
+        """Whether the message asks to change the plan rather than about it."""
+        return bool(EDIT_CUES.search(message.lower()))
+
+    def is_plain_question(self, message):
+        """Whether the message is a question with no constraints or comparisons."""
+        text = message.lower()
+        return bool(QUESTION_PATTERN.search(text)) and not COMPLEX_CUES.search(text)
+
+
+def _ceiling(text):
+    """Rupees of the first budget ceiling in `text`, or None.
+
+    A number needs a currency marker or a unit to be read as rupees.
+    """
+    for match in BUDGET_CEILING_PATTERN.finditer(text):
+        budget_of, currency, number, unit, rupees = match.groups()
+        if budget_of or currency or unit or rupees:
+            return to_rupees(number, unit)
+    return None
+
+
+@lru_cache(maxsize=None)
+def get_preference_parser():
+    """Return the process-wide parser built from the destination catalog."""
+    catalog = get_catalog()
+    return PreferenceParser(catalog.tag_index.keys(), catalog.season_index.keys())
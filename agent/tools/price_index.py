@@ -0,0 +1,134 @@
+import math
+import re
+
+import numpy as np
+
+# An amount such as "₹15,000", "15000", "20k", "1.5 lakh"
+_AMOUNT = r"(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|lakhs?|lacs?)?\b"
+AMOUNT_PATTERN = re.compile(_AMOUNT)
+# A band such as "₹15,000-25,000" or "₹40,000+" (open-ended)
+BAND_PATTERN = re.compile(r"^\s*₹?\s*" + _AMOUNT + r"\s*(?:(\+)|[-–]\s*₹?\s*" + _AMOUNT + r")?\s*$", re.IGNORECASE)
+MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "lakh": 100_000, "lakhs": 100_000, "lac": 100_000, "lacs": 100_000}
+
+
+def to_rupees(number, unit=None):
+    """Rupees for a matched number and optional unit ("20", "k" -> 20000)."""
+    value = float(number.replace(",", ""))
+    return int(round(value * MULTIPLIERS.get((unit or "").lower(), 1)))
+
+
+def parse_band(text):
+    """(low, high) rupees for a budget_inr band; high is inf for "₹40,000+".
+
+    Returns None if the text isn't a band.
+    """
+    match = BAND_PATTERN.match(str(text))
+    if not match:
+        return None
+    number, unit, open_ended, high_number, high_unit = match.groups()
+    low = to_rupees(number, unit)
+    if open_ended:
+        return low, math.inf
+    if high_number is None:
+        return low, low
+    return low, to_rupees(high_number, high_unit)
+
+
+def typical_days(destination):
+    """Trip length the budget_inr bands are quoted for: the middle of ideal_duration."""
+    low, high = destination.get("ideal_duration") or (5, 5)
+    return (low + high) / 2
+
+
+def _sorted_ids(ids, values):
+    order = ids[np.argsort(values[ids], kind="stable")]
+    return order, values[order]
+
+
+class PriceIndex:
+    """Numeric per-day price ranges of every destination, sorted for range queries.
+
+    The budget_inr bands are display strings quoting a per-person trip of
+    the destination's typical length (see `typical_days`). They are parsed
+    once into per-day [low, high] arrays spanning all tiers, and the priced
+    destinations are kept sorted by their cheapest per-day and per-trip cost,
+    so "what can I do for at most X" is a binary search plus a slice.
+    Destinations without a parseable budget_inr are unpriced and never
+    filtered out by price.
+    """
+
+    def __init__(self, destinations):
+        n = len(destinations)
+        self.low = np.full(n, np.nan)
+        self.high = np.full(n, np.nan)
+        self.days = np.array([typical_days(d) for d in destinations], dtype=np.float64)
+        for idx, destination in enumerate(destinations):
+            bands = [parse_band(text) for text in (destination.get("budget_inr") or {}).values()]
+            bands = [band for band in bands if band is not None]
+            if bands:
+                self.low[idx] = min(low for low, _ in bands) / self.days[idx]
+                self.high[idx] = max(high for _, high in bands) / self.days[idx]
+
+        priced = np.flatnonzero(~np.isnan(self.low))
+        self.unpriced = np.flatnonzero(np.isnan(self.low))
+        self._by_day, self._day_low = _sorted_ids(priced, self.low)
+        self._by_trip, self._trip_low = _sorted_ids(priced, self.low * self.days)
+
+    def __len__(self):
+        return len(self.low)
+
+    def overlapping(self, low, high):
+        """Ids of priced destinations whose per-day range overlaps [low, high]."""
+        ids = self._by_day[:np.searchsorted(self._day_low, high, side="right")]
+        return ids[self.high[ids] >= low]
+
+    def within(self, max_total, days=None):
+        """Ids of priced destinations whose cheapest trip costs at most `max_total`.
+
+        With `days` the trip is that long; otherwise each destination's
+        typical length is assumed.
+        """
+        if days:
+            return self._by_day[:np.searchsorted(self._day_low, max_total / days, side="right")]
+        return self._by_trip[:np.searchsorted(self._trip_low, max_total, side="right")]
+
+    def affordable(self, preferences):
+        """Ids of priced destinations within the budget ceiling, or None without one."""
+        ceiling = budget_ceiling(preferences)
+        if ceiling is None:
+            return None
+        duration = preferences.get("duration")
+        days = duration if isinstance(duration, (int, float)) and not isinstance(duration, bool) and duration > 0 else None
+        return self.within(ceiling, days)
+
+    def fits(self, preferences):
+        """Whether anything is priced within the budget ceiling (True without one)."""
+        ids = self.affordable(preferences)
+        return ids is None or len(ids) > 0
+
+    def eligible(self, preferences):
+        """Boolean mask of destinations within the budget ceiling, or None.
+
+        None means no filtering: there is no usable `budget_max_inr`, or
+        nothing in the catalog fits it (the ranking then falls back to the
+        whole catalog rather than recommending nothing, and the reply says
+        so, see `fits`).
+        """
+        ids = self.affordable(preferences)
+        if ids is None or len(ids) == 0:
+            return None
+        mask = np.zeros(len(self.low), dtype=bool)
+        mask[ids] = True
+        mask[self.unpriced] = True
+        return mask
+
+
+def budget_ceiling(preferences):
+    """The numeric budget_max_inr preference, or None if missing or invalid."""
+    ceiling = preferences.get("budget_max_inr")
+    if isinstance(ceiling, str):
+        match = AMOUNT_PATTERN.search(ceiling.lower())
+        ceiling = to_rupees(*match.groups()) if match else None
+    if isinstance(ceiling, bool) or not isinstance(ceiling, (int, float)) or ceiling <= 0:
+        return None
+    return ceiling
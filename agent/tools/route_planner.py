@@ -0,0 +1,191 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+# Road distance is longer than the great-circle distance; 1.3 is a common
+# detour factor for Indian highways, driven at an average of 50 km/h
+ROAD_FACTOR = 1.3
+ROAD_SPEED_KMH = 50.0
+
+# Nearest destinations kept per destination in the travel-time table
+NEIGHBOURS = 32
+# Longest drive between two stops of a circuit
+MAX_LEG_HOURS = 8.0
+# Legs longer than this take a day of their own
+TRAVEL_DAY_HOURS = 4.0
+# Trips this long or longer are planned as a circuit of several stops
+MIN_CIRCUIT_DAYS = 7
+DAYS_PER_STOP = 3
+MAX_STOPS = 4
+
+
+def travel_hours(lat1, lon1, lat2, lon2):
+    """Estimated road travel time between points given in radians (broadcasts)."""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return km * ROAD_FACTOR / ROAD_SPEED_KMH
+
+
+class TravelTimes:
+    """Precomputed travel times from every destination to its nearest neighbours.
+
+    A dense pairwise matrix grows quadratically with the catalog (100 MB of
+    float32 at 5,000 destinations) while a circuit only ever uses legs of up
+    to `max_hours`, so each destination keeps just its `neighbours` closest
+    destinations within that reach, sorted by travel time, in two
+    (rows, neighbours) arrays padded with -1 / inf. Destinations are bucketed
+    into a latitude/longitude grid whose cells are at least one reach wide,
+    so each one is only compared with the 3x3 block of cells around it and
+    building the table stays close to linear in the catalog size.
+    Destinations without coordinates have no neighbours.
+    """
+
+    def __init__(self, destinations, neighbours=NEIGHBOURS, max_hours=MAX_LEG_HOURS, block=1024):
+        lat = np.array([d.get("latitude", np.nan) for d in destinations], dtype=np.float64)
+        lon = np.array([d.get("longitude", np.nan) for d in destinations], dtype=np.float64)
+        self.lat, self.lon = np.radians(lat), np.radians(lon)
+        self.max_hours = max_hours
+        self.neighbours = np.full((len(lat), neighbours), -1, dtype=np.int32)
+        self.hours = np.full((len(lat), neighbours), np.inf, dtype=np.float32)
+        known = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        if len(known) < 2 or neighbours == 0:
+            return
+
+        # Longitude cells are widened for the highest latitude in the catalog,
+        # where a degree of longitude is shortest
+        reach = math.degrees(max_hours * ROAD_SPEED_KMH / ROAD_FACTOR / EARTH_RADIUS_KM)
+        lat_cell = max(reach, 1e-6)
+        lon_cell = lat_cell / max(math.cos(math.radians(np.abs(lat[known]).max())), 0.01)
+        cells = {}
+        for idx, key in zip(known.tolist(), zip(np.floor(lat[known] / lat_cell).astype(np.int64).tolist(),
+                                                np.floor(lon[known] / lon_cell).astype(np.int64).tolist())):
+            cells.setdefault(key, []).append(idx)
+        cells = {key: np.array(members, dtype=np.int64) for key, members in cells.items()}
+
+        for (row, col), members in cells.items():
+            around = np.concatenate([cells[key] for key in ((row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1))
+                                     if key in cells])
+            k = min(neighbours, len(around))
+            for start in range(0, len(members), block):
+                rows = members[start:start + block]
+                hours = travel_hours(self.lat[rows, None], self.lon[rows, None],
+                                     self.lat[None, around], self.lon[None, around])
+                hours[(hours > max_hours) | (rows[:, None] == around[None, :])] = np.inf
+                nearest = np.argpartition(hours, k - 1, axis=1)[:, :k]
+                nearest_hours = np.take_along_axis(hours, nearest, axis=1)
+                order = np.argsort(nearest_hours, axis=1, kind="stable")
+                nearest_hours = np.take_along_axis(nearest_hours, order, axis=1)
+                ids = around[np.take_along_axis(nearest, order, axis=1)]
+                ids[np.isinf(nearest_hours)] = -1
+                self.neighbours[rows, :k] = ids
+                self.hours[rows, :k] = nearest_hours
+
+    def __len__(self):
+        return len(self.lat)
+
+    def nearby(self, idx, max_hours=None):
+        """(id, hours) of the precomputed neighbours within `max_hours` of `idx`
+        (at most the reach the table was built for)."""
+        within = self.hours[idx] <= (self.max_hours if max_hours is None else max_hours)
+        return [(int(j), float(h)) for j, h in zip(self.neighbours[idx][within], self.hours[idx][within])]
+
+    def matrix(self, ids):
+        """Dense travel-time matrix between the destinations `ids`."""
+        ids = np.asarray(ids)
+        return travel_hours(self.lat[ids, None], self.lon[ids, None], self.lat[None, ids], self.lon[None, ids])
+
+
+def nearest_neighbour_order(matrix):
+    """Open path from stop 0 that always moves to the closest unvisited stop."""
+    order = [0]
+    remaining = set(range(1, len(matrix)))
+    while remaining:
+        closest = min(remaining, key=lambda j: (matrix[order[-1], j], j))
+        order.append(closest)
+        remaining.remove(closest)
+    return order
+
+
+def two_opt(matrix, order):
+    """Improve an open path (first stop fixed) by reversing segments until no
+    reversal shortens it."""
+    order = list(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(order) - 1):
+            for j in range(i + 1, len(order)):
+                before, first, last = order[i - 1], order[i], order[j]
+                after = order[j + 1] if j + 1 < len(order) else None
+                delta = matrix[before, last] - matrix[before, first]
+                if after is not None:
+                    delta += matrix[first, after] - matrix[last, after]
+                if delta < -1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+    return order
+
+
+def split_days(days, weights):
+    """Split `days` across stops in proportion to `weights`, at least one each."""
+    total = sum(weights)
+    shares = [days * weight / total for weight in weights]
+    split = [max(1, int(share)) for share in shares]
+    while sum(split) < days:
+        split[max(range(len(split)), key=lambda i: shares[i] - split[i])] += 1
+    while sum(split) > days:
+        split[max((i for i in range(len(split)) if split[i] > 1), key=lambda i: split[i] - shares[i])] -= 1
+    return split
+
+
+def plan_route(catalog, preferences, start):
+    """Order the stops of a multi-destination trip and split its days.
+
+    Trips shorter than MIN_CIRCUIT_DAYS stay at `start` and get None. Longer
+    trips add the best-matching destinations within MAX_LEG_HOURS of `start`
+    (one stop per DAYS_PER_STOP days, at most MAX_STOPS), order them with
+    nearest neighbour followed by 2-opt, and split the days left after long
+    drives by each stop's ideal duration. Returns a list of
+    {"name", "country", "days": [first, last], "travel_hours"} in visiting
+    order, or None when nothing suitable is within reach.
+    """
+    duration = preferences.get("duration", 7)
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration < MIN_CIRCUIT_DAYS:
+        return None
+    duration = int(duration)
+    start_id = catalog.name_index.get(start)
+    if start_id is None:
+        return None
+
+    # Candidates come from the precomputed neighbours only, so this does
+    # not grow with the catalog beyond one vectorized scoring pass
+    scores = catalog.scorer.score(preferences)
+    candidates = [(j, hours) for j, hours in catalog.travel_times.nearby(start_id) if scores[j] > 0]
+    candidates.sort(key=lambda item: (-scores[item[0]], item[1]))
+    stops = min(MAX_STOPS, duration // DAYS_PER_STOP)
+    chosen = [start_id] + [j for j, _ in candidates[:stops - 1]]
+    if len(chosen) < 2:
+        return None
+
+    matrix = catalog.travel_times.matrix(chosen)
+    order = two_opt(matrix, nearest_neighbour_order(matrix))
+    legs = [0.0] + [float(matrix[a, b]) for a, b in zip(order, order[1:])]
+    travel_days = sum(1 for hours in legs if hours > TRAVEL_DAY_HOURS)
+
+    records = [catalog.destinations[chosen[i]] for i in order]
+    weights = [sum(record.get("ideal_duration") or [DAYS_PER_STOP, DAYS_PER_STOP]) / 2 for record in records]
+    split = split_days(duration - travel_days, weights)
+
+    route, day = [], 1
+    for record, hours, days in zip(records, legs, split):
+        if hours > TRAVEL_DAY_HOURS:
+            day += 1
+        route.append({
+            "name": record["name"],
+            "country": record.get("country", ""),
+            "days": [day, day + days - 1],
+            "travel_hours": math.ceil(hours * 2) / 2,
+        })
+        day += days
+    return route
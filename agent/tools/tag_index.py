@@ -0,0 +1,159 @@
+import json
+import os
+import zlib
+
+import numpy as np
+
+# Words travellers use for each catalog tag. Only entries for tags the
+# catalog actually has are indexed.
+SYNONYMS = {
+    "adventure": ["adrenaline", "rafting", "paragliding", "bungee", "thrill", "extreme sports", "hiking", "trekking",
+                  "camping"],
+    "architecture": ["buildings", "monuments", "palaces", "forts"],
+    "art": ["galleries", "museums", "crafts", "painting"],
+    "backpacking": ["hostels", "budget travel", "backpacker"],
+    "beaches": ["beach", "sea", "seaside", "coast", "ocean", "sand", "surfing"],
+    "coffee": ["plantations", "estates", "cafes", "tea"],
+    "colonial": ["british era", "churches", "old town"],
+    "culture": ["cultural", "traditions", "festivals", "local life", "dance", "music"],
+    "food": ["cuisine", "street food", "restaurants", "foodie", "eating", "dining", "culinary"],
+    "heritage": ["historic sites", "unesco", "ancient", "old city"],
+    "history": ["historical", "ruins", "forts", "museums", "monuments", "ancient"],
+    "mountains": ["hills", "hill station", "himalayas", "snow", "peaks", "alpine"],
+    "nature": ["outdoors", "greenery", "forests", "waterfalls", "lakes", "countryside", "hills", "mountains"],
+    "nightlife": ["party", "parties", "clubs", "bars", "pubs", "clubbing"],
+    "relaxation": ["relax", "rest", "calm", "peaceful", "quiet", "unwind", "spa", "chill"],
+    "resorts": ["luxury", "all inclusive", "pool"],
+    "romantic": ["honeymoon", "couple", "anniversary", "romance"],
+    "scenic": ["views", "viewpoints", "landscapes", "sunsets", "photography"],
+    "scuba": ["diving", "snorkelling", "snorkeling", "underwater", "coral"],
+    "shopping": ["markets", "bazaars", "malls", "souvenirs"],
+    "spiritual": ["yoga", "meditation", "pilgrimage", "religious", "ashrams", "temples", "spirituality"],
+    "technology": ["tech", "startups", "science"],
+    "temples": ["temple", "shrines", "pilgrimage", "religious"],
+    "trekking": ["hiking", "hike", "trek", "trails", "walking", "climbing"],
+    "urban": ["city", "cities", "metropolitan", "skyscrapers"],
+    "wildlife": ["animals", "safari", "birds", "birdwatching", "tigers", "national park", "zoo"],
+}
+
+DIMENSIONS = 256
+# Cosine similarity below which an interest doesn't count towards a tag
+MIN_SIMILARITY = 0.5
+# Tags one unrecognised interest can count towards
+MAX_TAGS_PER_INTEREST = 2
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+INDEX_PATH = os.path.join(_DATA_DIR, "tag_index.npy")
+TERMS_PATH = os.path.join(_DATA_DIR, "tag_index.json")
+
+
+def normalize(term):
+    return " ".join(str(term).lower().split())
+
+
+def embed(terms):
+    """Hashed character-trigram vectors, L2-normalized, one row per term.
+
+    Each word is padded with "#" so prefixes and suffixes count, which makes
+    word forms ("beach", "beaches") and typos land close together without a
+    model or network call.
+    """
+    vectors = np.zeros((len(terms), DIMENSIONS), dtype=np.float32)
+    for row, term in enumerate(terms):
+        for word in normalize(term).split():
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                vectors[row, zlib.crc32(padded[i:i + 3].encode("utf-8")) % DIMENSIONS] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def index_terms(tags):
+    """(term, tag) pairs indexed for a tag vocabulary: each tag and its synonyms."""
+    tags = sorted({normalize(tag) for tag in tags})
+    terms = [(tag, tag) for tag in tags]
+    terms += [(normalize(word), tag) for tag in tags for word in SYNONYMS.get(tag, [])]
+    return terms
+
+
+def build_index(tags, index_path=INDEX_PATH, terms_path=TERMS_PATH):
+    """Embed the terms for `tags` and save them for `load_matcher` to memory-map."""
+    terms = index_terms(tags)
+    np.save(index_path, embed([term for term, _ in terms]))
+    with open(terms_path, "w") as f:
+        f.write("[\n" + ",\n".join(json.dumps(list(pair)) for pair in terms) + "\n]\n")
+
+
+class TagMatcher:
+    """Maps free-form interests to catalog tags with similarity weights.
+
+    An interest that is a tag or one of its synonyms counts for that tag
+    with weight 1, exactly as a tag match always has. Other interests are
+    embedded together and matched against every indexed term in one matrix
+    product; the closest tags at or above MIN_SIMILARITY count with their
+    similarity, rounded to hundredths.
+    """
+
+    def __init__(self, tags, vectors=None):
+        terms = index_terms(tags)
+        self.terms = [term for term, _ in terms]
+        self.term_tags = [tag for _, tag in terms]
+        # A tag's own name only means that tag; a synonym listed under several
+        # tags ("forts") counts for each of them
+        tags = set(self.term_tags)
+        self.exact = {}
+        for term, tag in terms:
+            if term == tag or term not in tags:
+                self.exact.setdefault(term, {})[tag] = 1.0
+        self.vectors = embed(self.terms) if vectors is None else vectors
+
+    def match(self, interests):
+        """{tag: weight} for each interest, in order."""
+        keys = [normalize(interest) for interest in interests]
+        matches = [dict(self.exact[key]) if key in self.exact else None for key in keys]
+        unknown = [i for i, match in enumerate(matches) if match is None]
+        if unknown and len(self.terms):
+            similarity = embed([keys[i] for i in unknown]) @ np.asarray(self.vectors).T
+            for row, i in enumerate(unknown):
+                weights = {}
+                for column in np.argsort(-similarity[row], kind="stable"):
+                    score = float(similarity[row, column])
+                    if score < MIN_SIMILARITY or len(weights) == MAX_TAGS_PER_INTEREST:
+                        break
+                    weights.setdefault(self.term_tags[column], round(score, 2))
+                matches[i] = weights
+        return [match or {} for match in matches]
+
+    def weights(self, interests):
+        """Summed tag weights for a list of interests (repeats count again)."""
+        total = {}
+        for match in self.match([interest for interest in interests if isinstance(interest, str)]):
+            for tag, weight in match.items():
+                total[tag] = total.get(tag, 0) + weight
+        return total
+
+
+def load_matcher(tags, index_path=INDEX_PATH, terms_path=TERMS_PATH):
+    """Matcher over `tags`, memory-mapping the prebuilt index when it was built
+    for exactly these terms (otherwise the terms are embedded in memory)."""
+    try:
+        with open(terms_path) as f:
+            stored = [tuple(pair) for pair in json.load(f)]
+        if stored == index_terms(tags):
+            return TagMatcher(tags, np.load(index_path, mmap_mode="r"))
+    except (OSError, ValueError):
+        pass
+    return TagMatcher(tags)
+
+
+def main():
+    """Rebuild data/tag_index.* for the destination database."""
+    from agent.tools.destination_db import get_destinations
+
+    tags = {tag.lower() for destination in get_destinations() for tag in destination.get("tags", [])}
+    build_index(tags)
+    print(f"Indexed {len(index_terms(tags))} terms for {len(tags)} tags -> {INDEX_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,103 +1,399 @@
-def get_weather_forecast(destination):
-    """Mock weather API to get forecast for a destination."""
-    # In a real application, this would call an actual weather API
-    # For this demo, return mock data
-    
-    weather_data = {
-        "Paris": {
-            "forecast": [
-                {"day": 1, "condition": "Partly Cloudy", "temp_high": 22, "temp_low": 15},
-                {"day": 2, "condition": "Sunny", "temp_high": 24, "temp_low": 16},
-                {"day": 3, "condition": "Sunny", "temp_high": 23, "temp_low": 15},
-                {"day": 4, "condition": "Light Rain", "temp_high": 20, "temp_low": 14},
-                {"day": 5, "condition": "Partly Cloudy", "temp_high": 21, "temp_low": 14},
-                {"day": 6, "condition": "Sunny", "temp_high": 23, "temp_low": 15},
-                {"day": 7, "condition": "Sunny", "temp_high": 24, "temp_low": 16}
-            ]
-        },
-        "Bali": {
-            "forecast": [
-                {"day": 1, "condition": "Sunny", "temp_high": 31, "temp_low": 24},
-                {"day": 2, "condition": "Sunny", "temp_high": 32, "temp_low": 25},
-                {"day": 3, "condition": "Partly Cloudy", "temp_high": 30, "temp_low": 24},
-                {"day": 4, "condition": "Light Rain", "temp_high": 29, "temp_low": 24},
-                {"day": 5, "condition": "Thunderstorm", "temp_high": 28, "temp_low": 23},
-                {"day": 6, "condition": "Partly Cloudy", "temp_high": 30, "temp_low": 24},
-                {"day": 7, "condition": "Sunny", "temp_high": 31, "temp_low": 25}
-            ]
-        },
-        "Tokyo": {
-            "forecast": [
-                {"day": 1, "condition": "Sunny", "temp_high": 28, "temp_low": 20},
-                {"day": 2, "condition": "Sunny", "temp_high": 29, "temp_low": 21},
-                {"day": 3, "condition": "Partly Cloudy", "temp_high": 27, "temp_low": 20},
-                {"day": 4, "condition": "Light Rain", "temp_high": 25, "temp_low": 19},
-                {"day": 5, "condition": "Rain", "temp_high": 24, "temp_low": 19},
-                {"day": 6, "condition": "Partly Cloudy", "temp_high": 26, "temp_low": 20},
-                {"day": 7, "condition": "Sunny", "temp_high": 28, "temp_low": 21}
-            ]
-        },
-        "Manali": {
-            "forecast": [
-                {"day": 1, "condition": "Partly Cloudy", "temp_high": 22, "temp_low": 10},
-                {"day": 2, "condition": "Sunny", "temp_high": 24, "temp_low": 11},
-                {"day": 3, "condition": "Sunny", "temp_high": 23, "temp_low": 12},
-                {"day": 4, "condition": "Light Rain", "temp_high": 20, "temp_low": 9},
-                {"day": 5, "condition": "Partly Cloudy", "temp_high": 21, "temp_low": 10},
-                {"day": 6, "condition": "Sunny", "temp_high": 23, "temp_low": 11},
-                {"day": 7, "condition": "Sunny", "temp_high": 24, "temp_low": 12}
-            ]
-        },
-        "Shimla": {
-            "forecast": [
-                {"day": 1, "condition": "Sunny", "temp_high": 24, "temp_low": 14},
-                {"day": 2, "condition": "Sunny", "temp_high": 25, "temp_low": 15},
-                {"day": 3, "condition": "Partly Cloudy", "temp_high": 23, "temp_low": 13},
-                {"day": 4, "condition": "Light Rain", "temp_high": 21, "temp_low": 12},
-                {"day": 5, "condition": "Partly Cloudy", "temp_high": 22, "temp_low": 13},
-                {"day": 6, "condition": "Sunny", "temp_high": 24, "temp_low": 14},
-                {"day": 7, "condition": "Sunny", "temp_high": 25, "temp_low": 15}
-            ]
-        },
-        "Dharamshala": {
-            "forecast": [
-                {"day": 1, "condition": "Partly Cloudy", "temp_high": 23, "temp_low": 13},
-                {"day": 2, "condition": "Sunny", "temp_high": 25, "temp_low": 14},
-                {"day": 3, "condition": "Sunny", "temp_high": 24, "temp_low": 14},
-                {"day": 4, "condition": "Light Rain", "temp_high": 22, "temp_low": 12},
-                {"day": 5, "condition": "Partly Cloudy", "temp_high": 23, "temp_low": 13},
-                {"day": 6, "condition": "Sunny", "temp_high": 24, "temp_low": 14},
-                {"day": 7, "condition": "Sunny", "temp_high": 25, "temp_low": 15}
-            ]
-        },
-        "Dalhousie": {
-            "forecast": [
-                {"day": 1, "condition": "Sunny", "temp_high": 22, "temp_low": 12},
-                {"day": 2, "condition": "Sunny", "temp_high": 23, "temp_low": 13},
-                {"day": 3, "condition": "Partly Cloudy", "temp_high": 21, "temp_low": 11},
-                {"day": 4, "condition": "Light Rain", "temp_high": 19, "temp_low": 10},
-                {"day": 5, "condition": "Partly Cloudy", "temp_high": 20, "temp_low": 11},
-                {"day": 6, "condition": "Sunny", "temp_high": 22, "temp_low": 12},
-                {"day": 7, "condition": "Sunny", "temp_high": 23, "temp_low": 13}
-            ]
-        },
-        "Kasol": {
-            "forecast": [
-                {"day": 1, "condition": "Partly Cloudy", "temp_high": 25, "temp_low": 15},
-                {"day": 2, "condition": "Sunny", "temp_high": 27, "temp_low": 16},
-                {"day": 3, "condition": "Sunny", "temp_high": 26, "temp_low": 16},
-                {"day": 4, "condition": "Light Rain", "temp_high": 24, "temp_low": 14},
-                {"day": 5, "condition": "Partly Cloudy", "temp_high": 25, "temp_low": 15},
-                {"day": 6, "condition": "Sunny", "temp_high": 26, "temp_low": 16},
-                {"day": 7, "condition": "Sunny", "temp_high": 27, "temp_low": 17}
-            ]
-        }
-    }
-    
-    # Return weather for the destination, or a generic forecast if not found
-    return weather_data.get(destination, {
+"""Weather forecasts for itinerary prompts.
+
+`WeatherService` wraps a provider with a per-destination TTL cache and
+coalesces concurrent lookups, so each city has at most one request in
+flight. Providers:
+
+- `StubWeatherProvider`: the bundled mock forecasts (default, no network).
+- `OpenMeteoProvider`: live 7-day forecasts from open-meteo.com over HTTP
+  (requires `httpx`); all missing cities are fetched in one request.
+
+Set `WEATHER_PROVIDER=open-meteo` to use the live provider by default.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+from agent import tracing
+
+MOCK_FORECASTS = {
+    "Paris": {
+        "forecast": [
+            {"day": 1, "condition": "Partly Cloudy", "temp_high": 22, "temp_low": 15},
+            {"day": 2, "condition": "Sunny", "temp_high": 24, "temp_low": 16},
+            {"day": 3, "condition": "Sunny", "temp_high": 23, "temp_low": 15},
+            {"day": 4, "condition": "Light Rain", "temp_high": 20, "temp_low": 14},
+            {"day": 5, "condition": "Partly Cloudy", "temp_high": 21, "temp_low": 14},
+            {"day": 6, "condition": "Sunny", "temp_high": 23, "temp_low": 15},
+            {"day": 7, "condition": "Sunny", "temp_high": 24, "temp_low": 16}
+        ]
+    },
+    "Bali": {
+        "forecast": [
+            {"day": 1, "condition": "Sunny", "temp_high": 31, "temp_low": 24},
+            {"day": 2, "condition": "Sunny", "temp_high": 32, "temp_low": 25},
+            {"day": 3, "condition": "Partly Cloudy", "temp_high": 30, "temp_low": 24},
+            {"day": 4, "condition": "Light Rain", "temp_high": 29, "temp_low": 24},
+            {"day": 5, "condition": "Thunderstorm", "temp_high": 28, "temp_low": 23},
+            {"day": 6, "condition": "Partly Cloudy", "temp_high": 30, "temp_low": 24},
+            {"day": 7, "condition": "Sunny", "temp_high": 31, "temp_low": 25}
+        ]
+    },
+    "Tokyo": {
+        "forecast": [
+            {"day": 1, "condition": "Sunny", "temp_high": 28, "temp_low": 20},
+            {"day": 2, "condition": "Sunny", "temp_high": 29, "temp_low": 21},
+            {"day": 3, "condition": "Partly Cloudy", "temp_high": 27, "temp_low": 20},
+            {"day": 4, "condition": "Light Rain", "temp_high": 25, "temp_low": 19},
+            {"day": 5, "condition": "Rain", "temp_high": 24, "temp_low": 19},
+            {"day": 6, "condition": "Partly Cloudy", "temp_high": 26, "temp_low": 20},
+            {"day": 7, "condition": "Sunny", "temp_high": 28, "temp_low": 21}
+        ]
+    },
+    "Manali": {
+        "forecast": [
+            {"day": 1, "condition": "Partly Cloudy", "temp_high": 22, "temp_low": 10},
+            {"day": 2, "condition": "Sunny", "temp_high": 24, "temp_low": 11},
+            {"day": 3, "condition": "Sunny", "temp_high": 23, "temp_low": 12},
+            {"day": 4, "condition": "Light Rain", "temp_high": 20, "temp_low": 9},
+            {"day": 5, "condition": "Partly Cloudy", "temp_high": 21, "temp_low": 10},
+            {"day": 6, "condition": "Sunny", "temp_high": 23, "temp_low": 11},
+            {"day": 7, "condition": "Sunny", "temp_high": 24, "temp_low": 12}
+        ]
+    },
+    "Shimla": {
+        "forecast": [
+            {"day": 1, "condition": "Sunny", "temp_high": 24, "temp_low": 14},
+            {"day": 2, "condition": "Sunny", "temp_high": 25, "temp_low": 15},
+            {"day": 3, "condition": "Partly Cloudy", "temp_high": 23, "temp_low": 13},
+            {"day": 4, "condition": "Light Rain", "temp_high": 21, "temp_low": 12},
+            {"day": 5, "condition": "Partly Cloudy", "temp_high": 22, "temp_low": 13},
+            {"day": 6, "condition": "Sunny", "temp_high": 24, "temp_low": 14},
+            {"day": 7, "condition": "Sunny", "temp_high": 25, "temp_low": 15}
+        ]
+    },
+    "Dharamshala": {
+        "forecast": [
+            {"day": 1, "condition": "Partly Cloudy", "temp_high": 23, "temp_low": 13},
+            {"day": 2, "condition": "Sunny", "temp_high": 25, "temp_low": 14},
+            {"day": 3, "condition": "Sunny", "temp_high": 24, "temp_low": 14},
+            {"day": 4, "condition": "Light Rain", "temp_high": 22, "temp_low": 12},
+            {"day": 5, "condition": "Partly Cloudy", "temp_high": 23, "temp_low": 13},
+            {"day": 6, "condition": "Sunny", "temp_high": 24, "temp_low": 14},
+            {"day": 7, "condition": "Sunny", "temp_high": 25, "temp_low": 15}
+        ]
+    },
+    "Dalhousie": {
         "forecast": [
-            {"day": i, "condition": "Sunny", "temp_high": 25, "temp_low": 15} 
-            for i in range(1, 8)
+            {"day": 1, "condition": "Sunny", "temp_high": 22, "temp_low": 12},
+            {"day": 2, "condition": "Sunny", "temp_high": 23, "temp_low": 13},
+            {"day": 3, "condition": "Partly Cloudy", "temp_high": 21, "temp_low": 11},
+            {"day": 4, "condition": "Light Rain", "temp_high": 19, "temp_low": 10},
+            {"day": 5, "condition": "Partly Cloudy", "temp_high": 20, "temp_low": 11},
+            {"day": 6, "condition": "Sunny", "temp_high": 22, "temp_low": 12},
+            {"day": 7, "condition": "Sunny", "temp_high": 23, "temp_low": 13}
         ]
-    })
\ No newline at end of file
+    },
+    "Kasol": {
+        "forecast": [
+            {"day": 1, "condition": "Partly Cloudy", "temp_high": 25, "temp_low": 15},
+            {"day": 2, "condition": "Sunny", "temp_high": 27, "temp_low": 16},
+            {"day": 3, "condition": "Sunny", "temp_high": 26, "temp_low": 16},
+            {"day": 4, "condition": "Light Rain", "temp_high": 24, "temp_low": 14},
+            {"day": 5, "condition": "Partly Cloudy", "temp_high": 25, "temp_low": 15},
+            {"day": 6, "condition": "Sunny", "temp_high": 26, "temp_low": 16},
+            {"day": 7, "condition": "Sunny", "temp_high": 27, "temp_low": 17}
+        ]
+    }
+}
+
+# Forecast used for destinations the mock data doesn't cover
+DEFAULT_FORECAST = {
+    "forecast": [
+        {"day": i, "condition": "Sunny", "temp_high": 25, "temp_low": 15}
+        for i in range(1, 8)
+    ]
+}
+
+# WMO weather interpretation codes -> the condition names used above
+WMO_CONDITIONS = [
+    ((0,), "Sunny"),
+    ((1, 2), "Partly Cloudy"),
+    ((3,), "Cloudy"),
+    ((45, 48), "Fog"),
+    ((51, 53, 55, 56, 57, 61, 80), "Light Rain"),
+    ((63, 65, 66, 67, 81, 82), "Rain"),
+    ((71, 73, 75, 77, 85, 86), "Snow"),
+    ((95, 96, 99), "Thunderstorm"),
+]
+
+
+def wmo_condition(code):
+    for codes, condition in WMO_CONDITIONS:
+        if code in codes:
+            return condition
+    return "Unknown"
+
+
+class StubWeatherProvider:
+    """Serves the bundled mock forecasts."""
+
+    def __init__(self, forecasts=None, default=DEFAULT_FORECAST):
+        self.forecasts = MOCK_FORECASTS if forecasts is None else forecasts
+        self.default = default
+
+    def fetch_sync(self, destinations):
+        return {name: self.forecasts.get(name, self.default) for name in destinations}
+
+    async def fetch(self, destinations):
+        return self.fetch_sync(destinations)
+
+
+class OpenMeteoProvider:
+    """Live forecasts from the Open-Meteo API (no API key needed).
+
+    Coordinates come from the destination record ("latitude"/"longitude")
+    when present, otherwise from Open-Meteo's geocoding API (cached). HTTP
+    clients are created on first use and keep their connections open.
+    """
+
+    FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+    GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+
+    def __init__(self, days=7, timeout=10.0, coordinates=None):
+        self.days = days
+        self.timeout = timeout
+        self._coordinates = dict(coordinates or {})
+        self._client = None
+        self._async_client = None
+
+    def _known_coordinates(self, name):
+        if name not in self._coordinates:
+            from agent.tools.destination_db import get_catalog
+
+            for record in get_catalog().destinations:
+                if record["name"] == name and "latitude" in record and "longitude" in record:
+                    self._coordinates[name] = (record["latitude"], record["longitude"])
+                    break
+        return self._coordinates.get(name)
+
+    def _remember_geocode(self, name, payload):
+        results = payload.get("results") or []
+        self._coordinates[name] = (results[0]["latitude"], results[0]["longitude"]) if results else None
+
+    def _forecast_params(self, located):
+        return {
+            "latitude": ",".join(str(lat) for lat, _ in located.values()),
+            "longitude": ",".join(str(lon) for _, lon in located.values()),
+            "daily": "weather_code,temperature_2m_max,temperature_2m_min",
+            "forecast_days": self.days,
+            "timezone": "auto",
+        }
+
+    def _parse(self, destinations, located, payload):
+        # A single location returns an object, several return a list
+        payloads = payload if isinstance(payload, list) else [payload]
+        forecasts = {name: {"forecast": []} for name in destinations}
+        for name, entry in zip(located, payloads):
+            daily = entry["daily"]
+            forecasts[name] = {
+                "forecast": [
+                    {"day": i + 1, "condition": wmo_condition(code), "temp_high": round(high), "temp_low": round(low)}
+                    for i, (code, high, low) in enumerate(zip(
+                        daily["weather_code"], daily["temperature_2m_max"], daily["temperature_2m_min"]))
+                ]
+            }
+        return forecasts
+
+    def fetch_sync(self, destinations):
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout)
+        for name in destinations:
+            if self._known_coordinates(name) is None and name not in self._coordinates:
+                response = self._client.get(self.GEOCODING_URL, params={"name": name, "count": 1})
+                response.raise_for_status()
+                self._remember_geocode(name, response.json())
+        located = {name: self._coordinates[name] for name in destinations if self._coordinates.get(name)}
+        if not located:
+            return self._parse(destinations, {}, [])
+        response = self._client.get(self.FORECAST_URL, params=self._forecast_params(located))
+        response.raise_for_status()
+        return self._parse(destinations, located, response.json())
+
+    async def fetch(self, destinations):
+        import httpx
+
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(timeout=self.timeout)
+        unknown = [n for n in destinations if self._known_coordinates(n) is None and n not in self._coordinates]
+
+        async def geocode(name):
+            response = await self._async_client.get(self.GEOCODING_URL, params={"name": name, "count": 1})
+            response.raise_for_status()
+            self._remember_geocode(name, response.json())
+
+        await asyncio.gather(*(geocode(name) for name in unknown))
+        located = {name: self._coordinates[name] for name in destinations if self._coordinates.get(name)}
+        if not located:
+            return self._parse(destinations, {}, [])
+        response = await self._async_client.get(self.FORECAST_URL, params=self._forecast_params(located))
+        response.raise_for_status()
+        return self._parse(destinations, located, response.json())
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class WeatherService:
+    """Per-destination TTL cache with request coalescing in front of a provider.
+
+    `get`/`get_many` are the non-blocking paths: cities that are already
+    being fetched wait on the in-flight request, and all other missing cities
+    are fetched in one provider call. `get_sync` serves the sync graph.
+    Listeners registered with `on_change` are called with the destination
+    name when a refreshed forecast differs from the cached one.
+    """
+
+    def __init__(self, provider, ttl=1800):
+        self.provider = provider
+        self.ttl = ttl
+        self._cache = {}        # destination -> (expires_at, forecast)
+        self._inflight = {}     # destination -> Future
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def cached(self, destination):
+        """The cached forecast if it hasn't expired, else None."""
+        entry = self._cache.get(destination)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _store(self, destination, forecast):
+        with self._lock:
+            previous = self._cache.get(destination)
+            self._cache[destination] = (time.monotonic() + self.ttl, forecast)
+        if previous is not None and previous[1] != forecast:
+            self._notify(destination)
+
+    def on_change(self, callback):
+        """Call `callback(destination)` when a destination's forecast changes."""
+        if hasattr(callback, "__self__"):
+            # Don't keep bound methods' owners (e.g. an ItineraryStore) alive
+            self._listeners.append(weakref.WeakMethod(callback))
+        else:
+            self._listeners.append(lambda: callback)
+
+    def _notify(self, destination):
+        for ref in list(self._listeners):
+            callback = ref()
+            if callback is None:
+                self._listeners.remove(ref)
+            else:
+                callback(destination)
+
+    def invalidate(self, destination=None):
+        """Forget cached forecasts (all, or one destination's)."""
+        with self._lock:
+            if destination is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(destination, None)
+
+    def get_sync(self, destination):
+        """Blocking lookup for the sync graph (a cache hit doesn't touch the provider)."""
+        forecast = self.cached(destination)
+        if forecast is None:
+            with tracing.span("weather.fetch", destinations=1):
+                forecast = self.provider.fetch_sync([destination])[destination]
+            self._store(destination, forecast)
+        return forecast
+
+    async def get(self, destination):
+        return (await self.get_many([destination]))[destination]
+
+    async def get_many(self, destinations):
+        """Forecasts for several destinations with at most one request per city."""
+        results, waiting, missing = {}, {}, []
+        for name in dict.fromkeys(destinations):
+            forecast = self.cached(name)
+            if forecast is not None:
+                results[name] = forecast
+            elif name in self._inflight:
+                waiting[name] = self._inflight[name]
+            else:
+                missing.append(name)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {name: loop.create_future() for name in missing}
+            self._inflight.update(futures)
+            try:
+                with tracing.span("weather.fetch", destinations=len(missing)):
+                    fetched = await self.provider.fetch(missing)
+            except BaseException as exc:
+                for future in futures.values():
+                    if isinstance(exc, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(exc)
+                        future.exception()  # mark retrieved; waiters still see it
+                raise
+            finally:
+                for name in missing:
+                    self._inflight.pop(name, None)
+            for name in missing:
+                self._store(name, fetched[name])
+                futures[name].set_result(fetched[name])
+                results[name] = fetched[name]
+
+        for name, future in waiting.items():
+            results[name] = await future
+        return results
+
+    def prefetch(self, destinations):
+        """Start fetching in the background; returns the task.
+
+        Later `get` calls for the same cities join the in-flight request.
+        """
+        task = asyncio.ensure_future(self.get_many(destinations))
+        # Failures surface in whichever `get` joins the request
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def aclose(self):
+        """Close the provider's HTTP connections, if it has any."""
+        if hasattr(self.provider, "aclose"):
+            await self.provider.aclose()
+
+
+_service = None
+
+
+def configure_weather(provider=None, ttl=1800):
+    """Replace the process-wide weather service. Returns the new service."""
+    global _service
+    _service = WeatherService(provider or StubWeatherProvider(), ttl=ttl)
+    return _service
+
+
+def get_weather_service():
+    """The process-wide weather service (created from WEATHER_PROVIDER on first use)."""
+    if _service is None:
+        provider = OpenMeteoProvider() if os.getenv("WEATHER_PROVIDER") == "open-meteo" else StubWeatherProvider()
+        configure_weather(provider)
+    return _service
+
+
+def get_weather_forecast(destination):
+    """Forecast for a destination from the process-wide service (sync)."""
+    return get_weather_service().get_sync(destination)
@@ -0,0 +1,207 @@
+"""Lightweight span tracing for graph nodes and their hot paths.
+
+Tracing is off by default. While off, `span()` returns a shared no-op object
+and wrapped nodes call straight through after a single flag check.
+
+Usage:
+    from agent import tracing
+    tracing.enable(tracing.JsonLinesSink("traces.jsonl"))
+    ...
+    tracing.disable()
+
+or set TRAVEL_AGENT_TRACE=traces.jsonl (or "otel") for main.py and server.py.
+
+Spans are exported as OTLP-shaped dicts (traceId, spanId, parentSpanId, name,
+startTimeUnixNano, endTimeUnixNano, attributes), one JSON object per line, or
+forwarded to the OpenTelemetry SDK with `OpenTelemetrySink` when installed.
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_enabled = False
+_sinks = []
+_current_span = ContextVar("current_span", default=None)
+
+
+def enable(*sinks):
+    """Turn tracing on and send finished spans to `sinks`."""
+    global _enabled
+    _sinks[:] = sinks
+    _enabled = True
+
+
+def disable():
+    """Turn tracing off. Sinks are flushed and closed."""
+    global _enabled
+    _enabled = False
+    for sink in _sinks:
+        if hasattr(sink, "close"):
+            sink.close()
+    _sinks.clear()
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable_from_env(variable="TRAVEL_AGENT_TRACE"):
+    """Enable tracing if `variable` is set: a JSON-lines path, or "otel"."""
+    target = os.getenv(variable)
+    if not target:
+        return False
+    enable(OpenTelemetrySink() if target == "otel" else JsonLinesSink(target))
+    return True
+
+
+class Span:
+    """One timed operation with attributes."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None
+
+    def as_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Shared stand-in returned by `span()` while tracing is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def _live_span(name, attributes):
+    span = Span(name, _current_span.get(), attributes)
+    for sink in _sinks:
+        if hasattr(sink, "on_start"):
+            sink.on_start(span)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.set(error=type(exc).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end_ns = time.time_ns()
+        for sink in _sinks:
+            sink.on_end(span)
+
+
+def span(name, **attributes):
+    """Context manager timing a block as a child of the current span."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _live_span(name, attributes)
+
+
+def traced_node(name, node):
+    """Wrap a graph node (sync or async) so each call is recorded as a span."""
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def _traced_async(state):
+            if not _enabled:
+                return await node(state)
+            with _live_span(f"node.{name}", {"node": name, "history_len": len(state.history)}):
+                return await node(state)
+        return _traced_async
+
+    @functools.wraps(node)
+    def _traced(state):
+        if not _enabled:
+            return node(state)
+        with _live_span(f"node.{name}", {"node": name, "history_len": len(state.history)}):
+            return node(state)
+    return _traced
+
+
+class JsonLinesSink:
+    """Append finished spans to a local file, one JSON object per line."""
+
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def on_end(self, span):
+        line = json.dumps(span.as_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class MemorySink:
+    """Keep finished spans in a list (useful in tests and benchmarks)."""
+
+    def __init__(self):
+        self.spans = []
+
+    def on_end(self, span):
+        self.spans.append(span)
+
+
+class OpenTelemetrySink:
+    """Forward spans to the OpenTelemetry SDK (requires `opentelemetry-api`)."""
+
+    def __init__(self, tracer_name="travel_planner"):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(tracer_name)
+        self._open = {}
+
+    def on_start(self, span):
+        parent = self._open.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        self._open[span.span_id] = self._tracer.start_span(span.name, context=context, start_time=span.start_ns)
+
+    def on_end(self, span):
+        otel_span = self._open.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+        otel_span.end(end_time=span.end_ns)
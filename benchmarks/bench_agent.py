@@ -0,0 +1,223 @@
+"""End-to-end benchmark suite for the travel agent graph with a fake LLM.
+
+Reports per-node timings, full-turn latency, tracing overhead, prose vs.
+structured output size, memory per session and throughput under concurrency. Model latency is injected by FakeLLM, so graph
+overhead (everything except the model) is reported separately. Run from the
+project root:
+
+    python -m benchmarks.bench_agent [--latency 0.2] [--json results.json]
+"""
+import argparse
+import asyncio
+import copy
+import json
+import statistics
+import time
+import tracemalloc
+
+from agent import tracing
+from agent.fake_llm import FakeLLM
+from agent.graph import build_async_travel_agent, build_travel_agent
+from agent.nodes.destination_finder import find_destinations
+from agent.nodes.followup_handler import handle_followup
+from agent.nodes.itinerary_creator import create_itinerary
+from agent.nodes.preference_extractor import extract_preferences
+from agent.sessions import run_turn
+from agent.state import AgentState
+
+FIRST_MESSAGE = "I want a 5-day budget trip with nature and food in spring"
+LLM_MESSAGE = "Somewhere calm with good views, my parents are coming along"
+FOLLOWUPS = ["what should I pack?", "make it 3 days", "is it good for families?"]
+
+
+def _user_state(message, base=None):
+    state = copy.deepcopy(base) if base is not None else AgentState()
+    state.is_followup = base is not None
+    state.history.append({"role": "user", "content": message})
+    return state
+
+
+def _median_ms(samples):
+    return statistics.median(samples) * 1000
+
+
+def bench_nodes(iterations):
+    """Time each node in isolation with a zero-latency model (pure overhead)."""
+    llm = FakeLLM()
+    planned = AgentState(**build_travel_agent(llm).invoke(_user_state(FIRST_MESSAGE)))
+
+    cases = {
+        "extract_preferences (rules)": (extract_preferences(llm), lambda: _user_state(FIRST_MESSAGE)),
+        "extract_preferences (llm)": (extract_preferences(llm), lambda: _user_state(LLM_MESSAGE)),
+        "find_destinations": (find_destinations(llm), lambda: copy.deepcopy(planned)),
+        "create_itinerary": (create_itinerary(llm), lambda: copy.deepcopy(planned)),
+        "handle_followup": (handle_followup(llm), lambda: _user_state(FOLLOWUPS[0], planned)),
+    }
+
+    results = {}
+    for name, (node, make_state) in cases.items():
+        states = [make_state() for _ in range(iterations)]
+        samples = []
+        for state in states:
+            start = time.perf_counter()
+            node(state)
+            samples.append(time.perf_counter() - start)
+        results[name] = _median_ms(samples)
+    return results
+
+
+def _turn_times(build, is_async, messages, latency, iterations):
+    """Median time of the last turn in `messages`."""
+    samples = []
+    for _ in range(iterations):
+        agent = build(FakeLLM(latency=latency))
+        state = None
+        for message in messages:
+            state = _user_state(message, state)
+            start = time.perf_counter()
+            result = asyncio.run(agent.ainvoke(state)) if is_async else agent.invoke(state)
+            elapsed = time.perf_counter() - start
+            state = AgentState(**result)
+        samples.append(elapsed)
+    return _median_ms(samples)
+
+
+def bench_turns(latency, iterations):
+    """Full-turn latency for the sync and async graphs.
+
+    Overhead is the same turn measured with a zero-latency model, i.e. the
+    time spent outside the model.
+    """
+    results = {}
+    for label, build, is_async in [("sync", build_travel_agent, False), ("async", build_async_travel_agent, True)]:
+        for name, messages in [("first turn", [FIRST_MESSAGE]), ("follow-up", [FIRST_MESSAGE, FOLLOWUPS[0]])]:
+            results[f"{label} {name}"] = {
+                "latency_ms": _turn_times(build, is_async, messages, latency, iterations),
+                "overhead_ms": _turn_times(build, is_async, messages, 0.0, iterations),
+            }
+    return results
+
+
+def bench_tracing(iterations):
+    """Zero-latency first-turn time with tracing off vs. on (in-memory sink)."""
+    results = {"off_ms": _turn_times(build_travel_agent, False, [FIRST_MESSAGE], 0.0, iterations)}
+    tracing.enable(tracing.MemorySink())
+    try:
+        results["on_ms"] = _turn_times(build_travel_agent, False, [FIRST_MESSAGE], 0.0, iterations)
+    finally:
+        tracing.disable()
+    return results
+
+
+def bench_structured():
+    """Model output tokens per node and follow-up prompt tokens, prose vs. structured.
+
+    Prose replies are sized like real Gemini output (~350 words of
+    recommendations, ~180 words per itinerary day); structured replies fill
+    every schema field to its limit, so they are an upper bound.
+    """
+    results = {}
+    for mode in ("prose", "structured"):
+        llm = FakeLLM(response_words={"recommendations": 350, "itinerary": 900, "followup": 150})
+        sink = tracing.MemorySink()
+        tracing.enable(sink)
+        try:
+            agent = build_travel_agent(llm, structured=mode == "structured")
+            state = _run_turn(agent, AgentState(), LLM_MESSAGE)
+            for message in (FOLLOWUPS[0], FOLLOWUPS[2]):     # questions, no replanning
+                state = _run_turn(agent, state, message)
+        finally:
+            tracing.disable()
+        nodes = {span.span_id: span.name for span in sink.spans if span.name.startswith("node.")}
+        tokens = {}
+        for span in sink.spans:
+            if span.name == "llm.generate":
+                node = nodes[span.parent_id].removeprefix("node.")
+                tokens.setdefault(node, span.attributes["response_tokens"])
+        tokens["followup prompt"] = statistics.mean(state.prompt_tokens)
+        results[mode] = tokens
+    return results
+
+
+def _run_turn(agent, state, message):
+    return AgentState(**agent.invoke(_user_state(message, state if state.history else None)))
+
+
+async def _run_sessions(agent, sessions):
+    states = [AgentState() for _ in range(sessions)]
+
+    async def converse(index):
+        for message in [FIRST_MESSAGE] + FOLLOWUPS:
+            states[index] = await run_turn(agent, states[index], message)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(converse(i) for i in range(sessions)))
+    return states, time.perf_counter() - start
+
+
+def bench_memory(sessions):
+    """Bytes of live state per session after a four-turn conversation."""
+    # Build (and warm up) the graph first so only per-session state is counted
+    agent = build_async_travel_agent(FakeLLM())
+    asyncio.run(_run_sessions(agent, 1))
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    states, _ = asyncio.run(_run_sessions(agent, sessions))
+    current = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in current.compare_to(baseline, "filename"))
+    del states
+    return grown / sessions
+
+
+def bench_throughput(latency, concurrency_levels):
+    """Turns per second with N concurrent sessions."""
+    results = {}
+    for sessions in concurrency_levels:
+        agent = build_async_travel_agent(FakeLLM(latency=latency))
+        _, elapsed = asyncio.run(_run_sessions(agent, sessions))
+        turns = sessions * (1 + len(FOLLOWUPS))
+        results[sessions] = turns / elapsed
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency per call (s)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=200, help="sessions for the memory benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "nodes_ms": bench_nodes(args.iterations),
+        "turns": bench_turns(args.latency, max(1, args.iterations // 4)),
+        "tracing": bench_tracing(args.iterations),
+        "output_tokens": bench_structured(),
+        "bytes_per_session": bench_memory(args.sessions),
+        "turns_per_second": bench_throughput(args.latency, args.concurrency),
+    }
+
+    print("Per-node time, zero-latency model (ms):")
+    for name, value in results["nodes_ms"].items():
+        print(f"  {name:<30} {value:8.3f}")
+    print(f"Full turn, {args.latency}s per model call (ms):")
+    for name, value in results["turns"].items():
+        print(f"  {name:<30} latency {value['latency_ms']:8.1f}   overhead {value['overhead_ms']:6.1f}")
+    print(f"Tracing: off {results['tracing']['off_ms']:.3f} ms, on {results['tracing']['on_ms']:.3f} ms per turn")
+    print("Tokens per call, prose vs. structured output:")
+    for name, value in results["output_tokens"]["prose"].items():
+        print(f"  {name:<30} {value:8.0f} {results['output_tokens']['structured'].get(name, 0):8.0f}")
+    print(f"Memory per session: {results['bytes_per_session'] / 1024:.1f} KiB")
+    print("Throughput:")
+    for sessions, value in results["turns_per_second"].items():
+        print(f"  {sessions:>5} concurrent sessions  {value:8.1f} turns/s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
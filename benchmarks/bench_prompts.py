@@ -0,0 +1,251 @@
+"""Prompt size per node before and after prompt compaction, on a fixed corpus.
+
+Formats every node's prompt for a fixed set of messages and preference
+profiles with the current builders and with the previous ones (indented
+JSON of whole records, instructions around the data; kept below for
+comparison), and reports mean input tokens per node plus how much of each
+prompt is a prefix shared by every prompt of that node (what provider-side
+prompt caching can reuse). Run from the project root:
+
+    python -m benchmarks.bench_prompts
+"""
+import copy
+import json
+import os
+import statistics
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from agent.context import ConversationContext, estimate_tokens
+from agent.fake_llm import FakeLLM, prompt_kind
+from agent.graph import build_travel_agent
+from agent.nodes.destination_finder import build_recommendation_prompt
+from agent.nodes.followup_handler import build_followup_prompt
+from agent.nodes.itinerary_creator import build_itinerary_prompt, top_destination
+from agent.nodes.preference_extractor import build_preferences_prompt
+from agent.state import AgentState
+from agent.tools.weather_api import get_weather_forecast
+
+MESSAGES = [
+    "Somewhere calm, but not too far away",
+    "A romantic getaway with good food, nothing too pricey",
+    "My parents want temples and history, maybe a week",
+    "Beaches and nightlife with friends in December",
+    "I need a quiet place in the mountains to work remotely for a bit",
+    "Family trip with two kids who love animals",
+    "Adventure sports and trekking, we are on a tight budget",
+    "Luxury spa holiday for our anniversary",
+]
+PROFILES = [
+    {"budget": budget, "duration": duration, "interests": interests, "season": season}
+    for budget, duration, season in [("low", 3, "winter"), ("medium", 5, "spring"), ("high", 7, "summer")]
+    for interests in (["nature"], ["culture", "food"], ["beaches", "relaxation", "nightlife"], ["adventure"])
+]
+FOLLOWUP = "what should I pack?"
+# One day of a typical markdown itinerary reply (newlines, quotes and ₹
+# cost more as escaped JSON than as plain text)
+SAMPLE_DAY = """**Day {day}: Exploring the "Old Town"**
+
+* **Morning (8:00 AM):** Breakfast at a local café (₹300-500 per person), then a guided walk.
+* **Afternoon (1:00 PM):** Lunch near the market (₹400-600), visit the museum (entry ₹200).
+* **Evening (6:00 PM):** Sunset viewpoint, dinner at a rooftop restaurant (₹800-1,200).
+* **Accommodation:** Heritage guesthouse (₹2,500 per night).
+* **Transportation:** Auto-rickshaw between sights (₹150-300)."""
+
+# The templates compaction replaced (kept for comparison)
+LEGACY_RECOMMENDATION = ChatPromptTemplate.from_template(
+    """You are a travel agent assistant. Based on the user preferences and available destinations,
+    recommend the top 3 most suitable destinations.
+
+    User preferences:
+    {user_preferences}
+
+    Available destinations:
+    {available_destinations}
+
+    For each recommended destination, provide:
+    1. Name and country
+    2. Why it's a good match for the preferences
+    3. Best time to visit
+    4. Estimated budget requirements in Indian Rupees (₹)
+
+    IMPORTANT: Always display all costs in Indian Rupees (₹) and use the budget_inr field from the destination data.
+    For example: "Budget: ₹15,000-40,000 for a 5-day trip"
+
+    Return your recommendations in a well-formatted response that's ready to show to the user.
+    """
+)
+LEGACY_ITINERARY = ChatPromptTemplate.from_template(
+    """You are a travel agent assistant. Create a detailed day-by-day itinerary for the user based on
+    their preferences and the recommended destinations.
+
+    User preferences:
+    {user_preferences}
+
+    Selected destinations:
+    {selected_destinations}
+
+    Weather forecast for the destination(s):
+    {weather_forecast}
+
+    Create a detailed itinerary with:
+    1. Day-by-day breakdown
+    2. Morning, afternoon, and evening activities
+    3. Suggested accommodations
+    4. Transportation recommendations
+    5. Estimated costs for activities in Indian Rupees (₹)
+
+    IMPORTANT: Always display all costs in Indian Rupees (₹) and use the budget_inr field from the destination data.
+    For example: "Hotel: ₹2,500 per night", "Meal: ₹300-500 per person", "Activity: ₹1,200 per person"
+
+    The trip should last for {trip_duration} days based on the user's preferences.
+    Format the itinerary in a clear, readable manner.
+    """
+)
+LEGACY_PREFERENCES = ChatPromptTemplate.from_template(
+    """You are a travel agent assistant. Extract travel preferences from the user's message.
+    Consider the following:
+    - Budget (low, medium, high)
+    - Trip duration (days)
+    - Interests (e.g. beaches, food, culture)
+    - Season
+    - Party (solo, couple, family, group)
+    - Any constraints
+
+    User message: {user_input}
+
+    Return only a JSON object like:
+    ```json
+    {{
+        "budget": "medium",
+        "duration": 7,
+        "interests": ["beaches", "food"],
+        "season": "summer",
+        "party": "couple",
+        "constraints": "no long flights"
+    }}
+    ```
+    Only include fields you are confident about.
+    """
+)
+LEGACY_FOLLOWUP = ChatPromptTemplate.from_template(
+    """You are a travel agent assistant. The user has a follow-up question or request about their travel plan.
+
+    User preferences:
+    {user_preferences}
+
+    Current itinerary:
+    {current_itinerary}
+
+    Conversation history:
+    {conversation_history}
+
+    Follow-up question/request:
+    {user_question}
+
+    Please respond to the follow-up in a helpful way. If they want to modify the itinerary, suggest specific changes.
+    If they have questions, provide detailed answers based on the existing plan.
+    """
+)
+
+
+def legacy_recommendation_prompt(state):
+    return LEGACY_RECOMMENDATION.format(
+        user_preferences=json.dumps(state.preferences, indent=2),
+        available_destinations=json.dumps(state.destinations, indent=2),
+    )
+
+
+def legacy_itinerary_prompt(state):
+    destination = top_destination(state)
+    return LEGACY_ITINERARY.format(
+        user_preferences=json.dumps(state.preferences, indent=2),
+        selected_destinations=json.dumps([destination], indent=2),
+        weather_forecast=json.dumps(get_weather_forecast(destination["name"]), indent=2),
+        trip_duration=state.preferences.get("duration", 7),
+    )
+
+
+def legacy_preferences_prompt(state):
+    return LEGACY_PREFERENCES.format(user_input=state.history[-1]["content"])
+
+
+def legacy_followup_prompt(state, context):
+    question_index = max(i for i, msg in enumerate(state.history) if msg["role"] == "user")
+    return LEGACY_FOLLOWUP.format(
+        user_preferences=json.dumps(state.preferences, indent=2),
+        current_itinerary=json.dumps(state.itinerary, indent=2),
+        conversation_history=context.build(state, question_index),
+        user_question=state.history[question_index]["content"],
+    )
+
+
+class SampleLLM(FakeLLM):
+    """FakeLLM whose itineraries look like real markdown replies."""
+
+    def _reply(self, prompt_string):
+        text, latency = super()._reply(prompt_string)
+        if prompt_kind(prompt_string) == "itinerary":
+            days = int(prompt_string.split("should last for ", 1)[1].split(" ", 1)[0])
+            text = "\n\n".join(SAMPLE_DAY.format(day=day) for day in range(1, days + 1))
+        return text, latency
+
+
+def corpus():
+    """States for each node's prompt: {node: [state, ...]}."""
+    llm = SampleLLM(response_words={"recommendations": 350})
+    travel_agent = build_travel_agent(llm)
+    planned = []
+    for profile in PROFILES:
+        state = AgentState(preferences=dict(profile), history=[{"role": "user", "content": "plan my trip"}])
+        state = AgentState(**travel_agent.invoke(state))
+        state.is_followup = True
+        state.history.append({"role": "user", "content": FOLLOWUP})
+        planned.append(state)
+    return {
+        "extract_preferences": [AgentState(history=[{"role": "user", "content": m}]) for m in MESSAGES],
+        "find_destinations": planned,
+        "create_itinerary": planned,
+        "handle_followup": planned,
+    }
+
+
+BUILDERS = {
+    "extract_preferences": (legacy_preferences_prompt, build_preferences_prompt),
+    "find_destinations": (legacy_recommendation_prompt, build_recommendation_prompt),
+    "create_itinerary": (legacy_itinerary_prompt, build_itinerary_prompt),
+    "handle_followup": (
+        lambda state: legacy_followup_prompt(state, ConversationContext()),
+        lambda state: build_followup_prompt(state, ConversationContext()),
+    ),
+}
+
+
+def bench_prompt_tokens():
+    """Mean input tokens per node (legacy vs. compact) and shared-prefix tokens."""
+    results = {}
+    for node, states in corpus().items():
+        legacy, compact = BUILDERS[node]
+        before = [legacy(copy.deepcopy(state)) for state in states]
+        after = [compact(copy.deepcopy(state)) for state in states]
+        results[node] = {
+            "legacy": statistics.mean(estimate_tokens(p) for p in before),
+            "compact": statistics.mean(estimate_tokens(p) for p in after),
+            "legacy_prefix": estimate_tokens(os.path.commonprefix(before)),
+            "compact_prefix": estimate_tokens(os.path.commonprefix(after)),
+        }
+    return results
+
+
+def main():
+    results = bench_prompt_tokens()
+    print(f"Mean input tokens per prompt ({len(MESSAGES)} messages, {len(PROFILES)} profiles):")
+    print(f"  {'node':<22} {'legacy':>8} {'compact':>8} {'saved':>7}   shared prefix (legacy -> compact)")
+    for node, value in results.items():
+        saved = 1 - value["compact"] / value["legacy"]
+        print(f"  {node:<22} {value['legacy']:8.0f} {value['compact']:8.0f} {saved:7.0%}"
+              f"   {value['legacy_prefix']:5d} -> {value['compact_prefix']:d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark for the multi-destination route planner.
+
+Builds the nearest-neighbour travel-time table for synthetic catalogs of
+growing size, compares it with a dense pairwise matrix (skipped when that
+would not fit in memory), and times `plan_route` for long trips starting at
+random destinations. Run from the project root:
+
+    python -m benchmarks.bench_routes [--sizes 1000 5000 20000]
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from agent.tools.destination_db import DestinationCatalog
+from agent.tools.route_planner import plan_route, travel_hours
+from benchmarks.synthetic import SAMPLE_PREFERENCES, make_destinations
+
+# Largest catalog the dense baseline is built for (float32, ~100 MB)
+DENSE_LIMIT = 5_000
+
+
+def dense_matrix(table):
+    """Full (n, n) float32 travel-time matrix, the approach the table replaces."""
+    return travel_hours(table.lat[:, None], table.lon[:, None], table.lat[None, :], table.lon[None, :]).astype(np.float32)
+
+
+def run(sizes, trips):
+    print(f"{'size':>8} {'table ms':>9} {'table MB':>9} {'dense ms':>9} {'dense MB':>9} {'plan ms':>8} {'stops':>6}")
+    for size in sizes:
+        catalog = DestinationCatalog(make_destinations(size))
+        catalog.scorer
+
+        start = time.perf_counter()
+        table = catalog.travel_times
+        table_ms = (time.perf_counter() - start) * 1000
+        table_mb = (table.neighbours.nbytes + table.hours.nbytes) / 1e6
+
+        dense_ms = dense_mb = float("nan")
+        if size <= DENSE_LIMIT:
+            start = time.perf_counter()
+            dense = dense_matrix(table)
+            dense_ms = (time.perf_counter() - start) * 1000
+            dense_mb = dense.nbytes / 1e6
+            del dense
+
+        rng = random.Random(0)
+        timings, stops = [], []
+        for _ in range(trips):
+            preferences = dict(rng.choice(SAMPLE_PREFERENCES), duration=rng.randint(7, 14))
+            name = catalog.destinations[rng.randrange(size)]["name"]
+            start = time.perf_counter()
+            route = plan_route(catalog, preferences, name)
+            timings.append(time.perf_counter() - start)
+            stops.append(len(route) if route else 1)
+
+        print(f"{size:>8} {table_ms:>9.1f} {table_mb:>9.2f} {dense_ms:>9.1f} {dense_mb:>9.1f}"
+              f" {statistics.mean(timings) * 1000:>8.3f} {statistics.mean(stops):>6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 5_000, 20_000])
+    parser.add_argument("--trips", type=int, default=200)
+    args = parser.parse_args()
+    run(args.sizes, args.trips)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Follow-up latency during a bulk burst, with and without the LLM scheduler.
+
+A fake provider serves at most `--capacity` calls at a time (first come,
+first served), like a rate-limited API. One heavy session starts a batch of
+itinerary prompts while `--sessions` interactive users plan a trip and ask
+follow-up questions. Without the scheduler every follow-up queues behind the
+whole batch; with it follow-ups go first and sessions are served in turn.
+Run from the project root:
+
+    python -m benchmarks.bench_scheduler --batch 300 --sessions 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from agent.batch import BatchRunner
+from agent.fake_llm import FakeLLM
+from agent.graph import build_async_travel_agent
+from agent.scheduler import LLMScheduler
+from agent.sessions import run_turn
+from agent.state import AgentState
+from agent.tools.destination_db import get_destinations
+
+MESSAGES = [
+    "I want a 5-day budget trip with nature and food in spring",
+    "what should I pack?",
+    "is it good for families?",
+    "what about the food there?",
+]
+
+
+class ProviderLLM(FakeLLM):
+    """FakeLLM that serves at most `capacity` async calls at once."""
+
+    def __init__(self, capacity, **kwargs):
+        super().__init__(**kwargs)
+        self.slots = asyncio.Semaphore(capacity)
+
+    async def generate_content_async(self, prompt_string, stream=False, **kwargs):
+        async with self.slots:
+            response = await super().generate_content_async(prompt_string, **kwargs)
+        # Streams are delivered in one piece once the call has finished
+        return _once(response) if stream else response
+
+
+async def _once(response):
+    yield response
+
+
+def batch_profiles(count):
+    names = [destination["name"] for destination in get_destinations()]
+    return [{"destination": names[i % len(names)], "duration": 2 + i // len(names)} for i in range(count)]
+
+
+async def interactive_session(travel_agent, session_id, followups):
+    state = AgentState(session_id=session_id)
+    state = await run_turn(travel_agent, state, MESSAGES[0])
+    for message in MESSAGES[1:]:
+        start = time.perf_counter()
+        state = await run_turn(travel_agent, state, message)
+        followups.append(time.perf_counter() - start)
+
+
+async def run_scenario(scheduled, args):
+    provider = ProviderLLM(args.capacity, latency=args.latency)
+    scheduler = LLMScheduler(max_in_flight=args.capacity) if scheduled else None
+    llm = scheduler.wrap(provider) if scheduled else provider
+    travel_agent = build_async_travel_agent(llm)
+    followups = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runner = BatchRunner(llm, max_concurrency=args.batch)
+        batch = asyncio.create_task(runner.run(batch_profiles(args.batch), os.path.join(tmp, "results.jsonl"),
+                                               kinds=("itinerary",)))
+        await asyncio.sleep(0.01)  # the burst is queued before anyone chats
+        start = time.perf_counter()
+        await asyncio.gather(*(interactive_session(travel_agent, f"user-{i}", followups)
+                               for i in range(args.sessions)))
+        interactive = time.perf_counter() - start
+        stats = await batch
+
+    ordered = sorted(followups)
+    return {
+        "p50": statistics.median(ordered),
+        "p99": ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))],
+        "interactive": interactive,
+        "batch": stats.elapsed,
+        "metrics": scheduler.metrics() if scheduled else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=300, help="itinerary prompts in the bulk burst")
+    parser.add_argument("--sessions", type=int, default=20, help="interactive sessions")
+    parser.add_argument("--capacity", type=int, default=8, help="calls the provider serves at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per model call")
+    args = parser.parse_args()
+
+    print(f"{args.batch} bulk prompts + {args.sessions} sessions x {len(MESSAGES) - 1} follow-ups, "
+          f"provider capacity {args.capacity}, {args.latency * 1000:.0f} ms per call")
+    for scheduled in (False, True):
+        result = asyncio.run(run_scenario(scheduled, args))
+        label = "scheduler" if scheduled else "direct"
+        print(f"  {label:<10} follow-up p50 {result['p50'] * 1000:7.0f} ms  p99 {result['p99'] * 1000:7.0f} ms"
+              f"  | sessions done {result['interactive']:5.2f} s  batch done {result['batch']:5.2f} s")
+        if result["metrics"]:
+            waits = result["metrics"]["wait_ms"]
+            print("             queue wait p99: " + ", ".join(f"{name} {value['p99']:.0f} ms"
+                                                          for name, value in waits.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Micro-benchmark for destination ranking.
+
+Compares the original pure-Python scoring loop with the indexed catalog and the
+columnar NumPy engine, times ranking under a numeric budget ceiling against
+filtering the parsed price bands in a loop, and times interest-to-tag
+matching for tag, synonym and fuzzy interests. Run from the project root:
+
+    python -m benchmarks.bench_scoring [--sizes 1000 100000 1000000]
+"""
+import argparse
+import time
+
+from agent.tools.destination_db import DestinationCatalog, get_catalog
+from agent.tools.price_index import parse_band, typical_days
+from benchmarks.synthetic import SAMPLE_PREFERENCES, make_destinations
+
+
+def loop_rank(all_destinations, preferences, k=5):
+    """The scoring loop find_destinations used before the catalog existed."""
+    filtered_destinations = []
+    for dest in all_destinations:
+        score = 0
+        if "budget" in preferences:
+            if preferences["budget"] == dest["budget_level"]:
+                score += 2
+            elif (preferences["budget"] == "high" and dest["budget_level"] in ["medium", "low"]) or \
+                 (preferences["budget"] == "medium" and dest["budget_level"] == "low"):
+                score += 1
+        if "duration" in preferences:
+            if dest["ideal_duration"][0] <= preferences["duration"] <= dest["ideal_duration"][1]:
+                score += 2
+        if "interests" in preferences:
+            for interest in preferences["interests"]:
+                if interest.lower() in [tag.lower() for tag in dest["tags"]]:
+                    score += 1
+        if "season" in preferences:
+            if preferences["season"].lower() in [s.lower() for s in dest["best_seasons"]]:
+                score += 2
+        filtered_destinations.append(dict(dest, match_score=score))
+    filtered_destinations.sort(key=lambda x: x["match_score"], reverse=True)
+    return filtered_destinations[:k]
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes, repeat):
+    print(f"{'size':>10} {'engine':>10} {'build ms':>10} {'rank ms':>10} {'speedup':>8}")
+    for size in sizes:
+        destinations = make_destinations(size)
+
+        start = time.perf_counter()
+        catalog = DestinationCatalog(destinations)
+        index_build = time.perf_counter() - start
+        start = time.perf_counter()
+        catalog.scorer
+        columnar_build = time.perf_counter() - start
+
+        # Results must be identical before timings mean anything
+        for preferences in SAMPLE_PREFERENCES:
+            expected = loop_rank(destinations, preferences)
+            assert catalog.rank(preferences) == expected
+            assert catalog.rank_indexed(preferences) == expected
+
+        def per_query(rank):
+            return lambda: [rank(p) for p in SAMPLE_PREFERENCES]
+
+        loop_time = _time(per_query(lambda p: loop_rank(destinations, p)), repeat) / len(SAMPLE_PREFERENCES)
+        indexed_time = _time(per_query(catalog.rank_indexed), repeat) / len(SAMPLE_PREFERENCES)
+        columnar_time = _time(per_query(catalog.rank), repeat) / len(SAMPLE_PREFERENCES)
+
+        rows = [
+            ("loop", 0.0, loop_time),
+            ("indexed", index_build, indexed_time),
+            ("columnar", columnar_build, columnar_time),
+        ]
+        for engine, build, elapsed in rows:
+            print(f"{size:>10} {engine:>10} {build * 1000:>10.1f} {elapsed * 1000:>10.3f} {loop_time / elapsed:>7.1f}x")
+
+
+# "Under ₹20,000 for 5 days" and friends
+PRICED_PREFERENCES = [dict(preferences, budget_max_inr=ceiling, duration=preferences.get("duration", 5))
+                      for preferences, ceiling in zip(SAMPLE_PREFERENCES, (20_000, 45_000, 30_000, 60_000))]
+
+
+def loop_affordable(destinations, preferences):
+    """Ids whose cheapest trip fits the ceiling, parsing every band per query."""
+    per_day = preferences["budget_max_inr"] / preferences["duration"]
+    ids = []
+    for idx, dest in enumerate(destinations):
+        lows = [band[0] for band in map(parse_band, dest.get("budget_inr", {}).values()) if band]
+        if not lows or min(lows) / typical_days(dest) <= per_day:
+            ids.append(idx)
+    return ids
+
+
+def run_priced(sizes, repeat):
+    print(f"\n{'size':>10} {'build ms':>10} {'loop ms':>10} {'index ms':>10} {'rank ms':>10}")
+    for size in sizes:
+        destinations = make_destinations(size)
+        catalog = DestinationCatalog(destinations)
+        catalog.scorer
+        start = time.perf_counter()
+        index = catalog.price_index
+        build = time.perf_counter() - start
+
+        for preferences in PRICED_PREFERENCES:
+            mask = index.eligible(preferences)
+            assert sorted(mask.nonzero()[0].tolist()) == loop_affordable(destinations, preferences)
+            assert catalog.rank(preferences) == catalog.rank_indexed(preferences)
+
+        def per_query(fn):
+            return _time(lambda: [fn(p) for p in PRICED_PREFERENCES], repeat) / len(PRICED_PREFERENCES)
+
+        loop_time = per_query(lambda p: loop_affordable(destinations, p))
+        index_time = per_query(index.eligible)
+        rank_time = per_query(catalog.rank)
+        print(f"{size:>10} {build * 1000:>10.1f} {loop_time * 1000:>10.3f} {index_time * 1000:>10.3f} {rank_time * 1000:>10.3f}")
+
+
+# Interests as travellers phrase them: a tag, a synonym, and misspelt or
+# multi-word phrases that need the vector lookup
+INTEREST_BATCHES = {
+    "tag": ["beaches", "food", "culture"],
+    "synonym": ["hiking", "temples", "street food"],
+    "fuzzy": ["beachs", "temple visits", "night life"],
+}
+
+
+def run_tag_matching(repeat):
+    matcher = get_catalog().tag_matcher
+    print(f"\n{'interests':>10} {'match us':>10}   tags")
+    for kind, interests in INTEREST_BATCHES.items():
+        elapsed = _time(lambda: [matcher.match(interests) for _ in range(100)], repeat) / 100
+        print(f"{kind:>10} {elapsed * 1e6:>10.1f}   {matcher.match(interests)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+    run_priced(args.sizes, args.repeat)
+    run_tag_matching(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
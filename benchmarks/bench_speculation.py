@@ -0,0 +1,99 @@
+"""Speculative itinerary pre-generation: hit rate, latency and extra spend.
+
+Each session plans a trip, then after a pause to read it sends one scripted
+follow-up from a mix of runner-up switches, duration changes and plain
+questions. Reports, per `max_per_session` setting, how often the next
+itinerary came from speculation, the latency of turns that needed a new
+itinerary, and how many itinerary calls were made in total. Run from the
+project root:
+
+    python -m benchmarks.bench_speculation --sessions 40 --think 2.0
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from agent.fake_llm import FakeLLM
+from agent.graph import build_async_travel_agent
+from agent.scheduler import LLMScheduler
+from agent.sessions import run_turn
+from agent.speculation import Speculator
+from agent.state import AgentState
+
+FIRST_MESSAGES = [
+    "I want a 5-day budget trip with beaches and food in winter",
+    "A 4-day trip to the mountains with trekking in summer",
+    "6 days of culture and history on a medium budget in spring",
+    "A relaxing 5-day trip with nature and wildlife in winter",
+]
+
+
+def followup(state, rng):
+    """A next message: switch to a runner-up, change the duration, or ask."""
+    duration = state.preferences.get("duration", 5)
+    choice = rng.random()
+    if choice < 0.3 and len(state.destinations) > 1:
+        return f"what about {rng.choice(state.destinations[1:3])['name']} instead?", True
+    if choice < 0.5:
+        return f"make it {duration - 1} days", True
+    if choice < 0.6:
+        return f"make it {duration + 1} days", True
+    if choice < 0.7:
+        return f"make it {max(1, duration - 2)} days", True
+    return "what should I pack?", False
+
+
+async def conversation(travel_agent, speculator, session_id, rng, think, latencies):
+    state = await run_turn(travel_agent, AgentState(session_id=session_id), rng.choice(FIRST_MESSAGES))
+    if speculator is not None:
+        speculator.start(state)
+    await asyncio.sleep(think * rng.uniform(0.5, 1.5))  # reading the itinerary
+    message, changes_itinerary = followup(state, rng)
+    start = time.perf_counter()
+    await run_turn(travel_agent, state, message)
+    if changes_itinerary:
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_setting(max_per_session, args):
+    llm = FakeLLM(latency={"itinerary": args.latency, "recommendations": args.latency / 2, "followup": 0.1})
+    scheduled = LLMScheduler(max_in_flight=args.capacity).wrap(llm)
+    speculator = Speculator(scheduled, max_per_session=max_per_session) if max_per_session else None
+    travel_agent = build_async_travel_agent(scheduled, speculator)
+    rng = random.Random(args.seed)
+    latencies = []
+    await asyncio.gather(*(conversation(travel_agent, speculator, f"user-{i}", random.Random(rng.random()),
+                                        args.think, latencies) for i in range(args.sessions)))
+    if speculator is not None:
+        await speculator.aclose()
+    return {
+        "p50": statistics.median(latencies),
+        "p99": sorted(latencies)[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+        "itinerary_calls": llm.calls_by_kind.get("itinerary", 0),
+        "stats": speculator.stats.as_dict() if speculator is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--think", type=float, default=2.0, help="mean seconds spent reading an itinerary")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per itinerary call")
+    parser.add_argument("--capacity", type=int, default=64, help="model calls in flight at once")
+    parser.add_argument("--settings", type=int, nargs="+", default=[0, 2, 4], help="max_per_session values")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions, {args.think:.1f} s reading, {args.latency * 1000:.0f} ms per itinerary call")
+    print(f"  {'per session':>11} {'hit rate':>9} {'used':>6} {'p50 ms':>8} {'p99 ms':>8} {'itinerary calls':>16}")
+    for setting in args.settings:
+        result = asyncio.run(run_setting(setting, args))
+        stats = result["stats"] or {"hit_rate": 0.0, "used_rate": 0.0}
+        print(f"  {setting:>11} {stats['hit_rate']:9.0%} {stats['used_rate']:6.0%} {result['p50'] * 1000:8.0f}"
+              f" {result['p99'] * 1000:8.0f} {result['itinerary_calls']:16d}")
+
+
+if __name__ == "__main__":
+    main()
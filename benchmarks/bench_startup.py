@@ -0,0 +1,85 @@
+"""CLI startup benchmark: import time and time to the first prompt.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and
+reports the total and the slowest modules by cumulative import time, then
+launches `main.py` with the fake provider and times how long it takes for
+"You:" to appear. Run from the project root:
+
+    python -m benchmarks.bench_startup [--runs 5] [--top 10] [--budget-ms 300]
+
+With `--budget-ms`, exits non-zero when the median import time of `main`
+exceeds the budget, so it can guard against eager imports creeping back in.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = b"You:"
+
+
+def import_times(module="main"):
+    """Return {module: cumulative microseconds} from one `-X importtime` run."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def time_to_prompt(env=None):
+    """Seconds from launching `main.py` until it prints the first prompt."""
+    env = dict(os.environ, LLM_PROVIDER="fake", PYTHONUNBUFFERED="1", **(env or {}))
+    env.pop("CHECKPOINT_PATH", None)
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=ROOT, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    output = b""
+    try:
+        while PROMPT not in output:
+            chunk = process.stdout.read1(1024)
+            if not chunk:
+                raise RuntimeError("main.py exited before showing a prompt")
+            output += chunk
+        return time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    total_ms = statistics.median(run["main"] for run in runs) / 1000
+    print(f"import main: {total_ms:.1f} ms (median of {args.runs})")
+    print("Slowest imports (cumulative ms, last run):")
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)
+    for name, micros in slowest[1:args.top + 1]:
+        print(f"  {name:<40} {micros / 1000:8.1f}")
+
+    prompt_ms = statistics.median(time_to_prompt() for _ in range(args.runs)) * 1000
+    print(f"Time to first prompt: {prompt_ms:.1f} ms (median of {args.runs})")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"import main exceeds the {args.budget_ms:.0f} ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Compare the slotted `AgentState` dataclass with the previous pydantic model.
+
+Reports live bytes per session, checkpoint size (JSON vs. msgpack, full vs.
+history delta), the cost of building a state from graph channel values (what
+LangGraph does before every node), full-turn graph overhead with a
+zero-latency model, and the cost of durable checkpointing (per turn, and to
+resume sessions of growing length). Run from the project root:
+
+    python -m benchmarks.bench_state [--sessions 500] [--iterations 200]
+"""
+import argparse
+import asyncio
+import dataclasses
+import os
+import tempfile
+import statistics
+import time
+import tracemalloc
+from unittest import mock
+
+from pydantic import Field, create_model
+
+import agent.graph
+from agent.checkpoints import SQLiteCheckpointer
+from agent.fake_llm import FakeLLM
+from agent.graph import build_async_travel_agent, build_travel_agent
+from agent.records import pack_state, unpack_state
+from agent.sessions import run_turn
+from agent.state import AgentState
+
+MESSAGES = [
+    "I want a 5-day budget trip with nature and food in spring",
+    "what should I pack?",
+    "make it 3 days",
+    "is it good for families?",
+]
+
+
+def _pydantic_field(field):
+    if field.default_factory is not dataclasses.MISSING:
+        return field.type, Field(default_factory=field.default_factory)
+    return field.type, field.default
+
+
+# The pydantic state model `AgentState` replaced (kept for comparison), built
+# from the dataclass's fields so the two always hold the same data
+PydanticAgentState = create_model(
+    "PydanticAgentState", **{field.name: _pydantic_field(field) for field in dataclasses.fields(AgentState)})
+
+
+async def _conversation(travel_agent):
+    """Run MESSAGES and return the state after each turn."""
+    state, states = AgentState(), []
+    for message in MESSAGES:
+        state = await run_turn(travel_agent, state, message)
+        states.append(state)
+    return states
+
+
+def _live_bytes(make, count):
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    kept = [make() for _ in range(count)]
+    current = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in current.compare_to(baseline, "filename"))
+    del kept
+    return grown / count
+
+
+def bench_memory(final, sessions):
+    """Bytes held per session by a finished conversation's state."""
+    values = dataclasses.asdict(final)
+    return {
+        "pydantic": _live_bytes(lambda: PydanticAgentState(**_copy(values)), sessions),
+        "dataclass": _live_bytes(lambda: AgentState(**_copy(values)), sessions),
+    }
+
+
+def _copy(values):
+    # Fresh containers and strings, as a real session would hold its own
+    return dataclasses.asdict(unpack_state(pack_state(AgentState(**values))))
+
+
+def bench_checkpoints(states):
+    """Checkpoint bytes per conversation: JSON snapshots vs. msgpack."""
+    final = states[-1]
+    deltas, previous = [], 0
+    for state in states:
+        deltas.append(len(pack_state(state, history_start=previous)))
+        previous = len(state.history)
+    return {
+        "json (pydantic)": len(PydanticAgentState(**dataclasses.asdict(final)).model_dump_json()),
+        "msgpack full": len(pack_state(final)),
+        "msgpack delta per turn": statistics.mean(deltas[1:]),
+    }
+
+
+def _median_us(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def bench_steps(final, iterations):
+    """Per-step costs in microseconds."""
+    values = dataclasses.asdict(final)
+    packed = pack_state(final)
+    return {
+        "build pydantic state": _median_us(lambda: PydanticAgentState(**values), iterations),
+        "build dataclass state": _median_us(lambda: AgentState(**values), iterations),
+        "pack_state": _median_us(lambda: pack_state(final), iterations),
+        "unpack_state": _median_us(lambda: unpack_state(packed), iterations),
+    }
+
+
+def bench_turns(iterations):
+    """Median zero-latency turn time (ms) with each state schema."""
+
+    def turn_ms(schema):
+        with mock.patch.object(agent.graph, "AgentState", schema):
+            travel_agent = build_travel_agent(FakeLLM())
+        samples = []
+        for _ in range(iterations):
+            state = schema(history=[{"role": "user", "content": MESSAGES[0]}])
+            start = time.perf_counter()
+            travel_agent.invoke(state)
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples) * 1000
+
+    return {"pydantic": turn_ms(PydanticAgentState), "dataclass": turn_ms(AgentState)}
+
+
+def bench_durable(turns_per_session=(10, 100, 400)):
+    """Turn time with and without SQLiteCheckpointer, and resume time by length."""
+    followups = MESSAGES[1:]
+
+    async def converse(travel_agent, session_id, turns):
+        state = AgentState(session_id=session_id)
+        start = time.perf_counter()
+        for index in range(turns):
+            message = MESSAGES[0] if index == 0 else followups[index % len(followups)]
+            state = await run_turn(travel_agent, state, message)
+        return (time.perf_counter() - start) / turns * 1000
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpointer = SQLiteCheckpointer(os.path.join(tmp, "sessions.db"))
+        plain = build_async_travel_agent(FakeLLM())
+        durable = build_async_travel_agent(FakeLLM(), checkpointer=checkpointer)
+        asyncio.run(converse(plain, "warmup", 5))
+        longest = max(turns_per_session)
+        results["turn ms (no checkpoints)"] = asyncio.run(converse(plain, "plain", longest))
+        results["turn ms (checkpointed)"] = asyncio.run(converse(durable, "durable", longest))
+        for turns in turns_per_session:
+            asyncio.run(converse(durable, f"resume-{turns}", turns))
+            checkpointer.flush()
+            results[f"resume ms ({turns} turns)"] = _median_us(
+                lambda: checkpointer.load(f"resume-{turns}"), 20) / 1000
+        checkpointer.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    states = asyncio.run(_conversation(build_async_travel_agent(FakeLLM())))
+    final = states[-1]
+
+    print(f"Bytes per session after {len(MESSAGES)} turns:")
+    for name, value in bench_memory(final, args.sessions).items():
+        print(f"  {name:<28} {value:10.0f}")
+    print("Checkpoint bytes per session:")
+    for name, value in bench_checkpoints(states).items():
+        print(f"  {name:<28} {value:10.0f}")
+    print("Per-step cost (us):")
+    for name, value in bench_steps(final, args.iterations).items():
+        print(f"  {name:<28} {value:10.1f}")
+    print("Full turn, zero-latency model (ms):")
+    for name, value in bench_turns(max(1, args.iterations // 10)).items():
+        print(f"  {name:<28} {value:10.2f}")
+    print("Durable checkpoints (SQLite, zero-latency model):")
+    for name, value in bench_durable().items():
+        print(f"  {name:<28} {value:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Local load test for the ASGI server using a fake LLM.
+
+Drives the app in-process (no sockets) with many concurrent sessions and
+reports throughput and latency percentiles. Run from the project root:
+
+    python -m benchmarks.load_test --sessions 200 --turns 3 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from agent.fake_llm import FakeLLM
+from server import TravelAgentApp
+
+MESSAGES = [
+    "I want a 5-day budget trip with nature and food in spring",
+    "what should I pack?",
+    "make it 3 days",
+    "is it good for families?",
+]
+
+
+async def post_message(app, session_id, message):
+    """Send one POST /sessions/{id}/messages request through the ASGI app."""
+    body = json.dumps({"message": message}).encode("utf-8")
+    scope = {"type": "http", "method": "POST", "path": f"/sessions/{session_id}/messages", "headers": []}
+    received = False
+    response = {}
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(event):
+        if event["type"] == "http.response.start":
+            response["status"] = event["status"]
+        elif event["type"] == "http.response.body":
+            response["body"] = event["body"]
+
+    await app(scope, receive, send)
+    return response
+
+
+async def run_session(app, session_id, turns, latencies):
+    for turn in range(turns):
+        start = time.perf_counter()
+        response = await post_message(app, session_id, MESSAGES[turn % len(MESSAGES)])
+        latencies.append(time.perf_counter() - start)
+        assert response["status"] == 200, response
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(sessions, turns, latency, max_concurrent_turns):
+    app = TravelAgentApp(FakeLLM(latency=latency), max_concurrent_turns=max_concurrent_turns)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(app, f"user-{i}", turns, latencies) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    print(f"sessions={sessions} turns/session={turns} fake latency={latency}s concurrency={max_concurrent_turns}")
+    print(f"turns: {len(latencies)} in {elapsed:.2f}s -> {len(latencies) / elapsed:.1f} turns/s")
+    print(f"latency ms: p50={statistics.median(latencies) * 1000:.1f} "
+          f"p90={percentile(latencies, 0.9) * 1000:.1f} p99={percentile(latencies, 0.99) * 1000:.1f} "
+          f"max={max(latencies) * 1000:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency per call (s)")
+    parser.add_argument("--max-concurrent-turns", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.turns, args.latency, args.max_concurrent_turns))
+
+
+if __name__ == "__main__":
+    main()
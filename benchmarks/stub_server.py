@@ -0,0 +1,144 @@
+"""Local OpenAI-compatible chat completions server backed by `FakeLLM`.
+
+Stands in for a real endpoint when testing the `openai` provider, connection
+reuse and hedged requests, with no network access or API key:
+
+    python -m benchmarks.stub_server --port 8001 --latency 0.5 --model-latency fast=0.05
+    LLM_PROVIDER=openai OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python main.py
+
+Serves `POST /v1/chat/completions` (plain JSON, or server-sent events with
+`"stream": true`) over HTTP/1.1 keep-alive. Latency can be set per model
+name, and `connections` / `requests` count what the server has seen.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agent.fake_llm import FakeLLM, prompt_kind
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        model = body.get("model", "stub")
+        prompt_string = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        with self.server.lock:
+            self.server.requests += 1
+        text, _ = self.server.llm._reply(prompt_string)
+        latency = self.server.model_latency.get(model, self.server.latency)
+
+        if not body.get("stream"):
+            time.sleep(latency)
+            self._send_json(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunks = self.server.llm._chunks(text) if prompt_kind(prompt_string) != "preferences" else [text]
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            self._send_event({
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+            })
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, payload):
+        self._send_chunk(f"data: {json.dumps(payload)}\n\n".encode())
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded stub server; use as a context manager to run it in the background."""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, model_latency=None, llm=None):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.model_latency = dict(model_latency or {})
+        self.llm = llm or FakeLLM()
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-reply when a hedged request loses the race
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="latency for one model name (repeatable)")
+    args = parser.parse_args()
+
+    model_latency = {}
+    for item in args.model_latency:
+        name, _, seconds = item.partition("=")
+        model_latency[name] = float(seconds)
+    server = StubServer(args.host, args.port, args.latency, model_latency)
+    print(f"Serving OpenAI-compatible completions on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import random
+
+TAGS = [
+    "mountains", "nature", "trekking", "adventure", "colonial", "scenic", "spiritual",
+    "culture", "backpacking", "beaches", "relaxation", "food", "shopping", "urban",
+    "history", "art", "heritage", "romantic", "architecture", "nightlife", "temples",
+    "wildlife", "coffee", "scuba", "resorts", "technology", "budget",
+]
+SEASONS = ["winter", "spring", "summer", "fall"]
+BUDGETS = ["low", "medium", "high"]
+
+
+def make_destinations(n, seed=0):
+    """Generate `n` destination records shaped like data/destinations.json."""
+    rng = random.Random(seed)
+    destinations = []
+    for i in range(n):
+        low = rng.randint(1, 6)
+        destinations.append({
+            "name": f"Destination {i}",
+            "country": "India",
+            "tags": rng.sample(TAGS, rng.randint(2, 5)),
+            "budget_level": rng.choice(BUDGETS),
+            "ideal_duration": [low, low + rng.randint(0, 5)],
+            "best_seasons": rng.sample(SEASONS, rng.randint(1, 3)),
+        })
+    # Coordinates come from their own generator so the other fields stay the
+    # same as before they were added; spread over India's bounding box
+    coordinates = random.Random(seed)
+    for destination in destinations:
+        destination["latitude"] = round(coordinates.uniform(8.0, 34.0), 4)
+        destination["longitude"] = round(coordinates.uniform(69.0, 89.0), 4)
+    # Price bands the same way, formatted like data/destinations.json
+    prices = random.Random(seed + 1)
+    for destination in destinations:
+        base = prices.randint(6, 40) * 1000
+        destination["budget_inr"] = {
+            "low": f"₹{base:,}-{base * 2:,}",
+            "medium": f"₹{base * 2:,}-{base * 7 // 2:,}",
+            "high": f"₹{base * 7 // 2:,}+",
+        }
+    return destinations
+
+
+SAMPLE_PREFERENCES = [
+    {"budget": "low", "duration": 5, "interests": ["nature", "trekking"], "season": "summer"},
+    {"budget": "high", "duration": 3, "interests": ["food", "culture", "nightlife"]},
+    {"budget": "medium", "interests": ["beaches"], "season": "winter"},
+    {"duration": 7},
+]
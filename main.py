@@ -1,40 +1,80 @@
+import asyncio
 import os
+from agent import tracing
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from google.generativeai import GenerativeModel 
-from agent.graph import build_travel_agent
 from agent.state import AgentState
+from agent.streaming import TurnStream
 
 # Load environment variables
 load_dotenv()
 
-import google.generativeai as genai
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
+def setup():
+    """Create the model and compile the graph.
+
+    The SDKs and LangGraph take a couple of seconds to import, so this runs
+    on a worker thread while the user types their first message.
+    """
+    from agent.cache import CachedLLM, SQLiteCacheStore
+    from agent.checkpoints import SQLiteCheckpointer
+    from agent.graph import build_async_travel_agent
+    from agent.itinerary_store import load_store_from_env
+    from agent.models import ModelRouter
+    from agent.providers import create_llm
+
+    # Initialize the model (LLM_PROVIDER=gemini|openai|fake, LLM_MODEL=...,
+    # LLM_MODEL_<ROLE> per node and LLM_HEDGE_MODEL, see agent/providers.py)
+    llm = create_llm()
+
+    # Optionally cache model responses on disk across runs (per model when routed)
+    if os.getenv("LLM_CACHE_PATH"):
+        cache_store = SQLiteCacheStore(os.getenv("LLM_CACHE_PATH"))
+        llm = llm.map(lambda model: CachedLLM(model, cache_store)) if isinstance(llm, ModelRouter) else CachedLLM(llm, cache_store)
+
+    # Build the travel agent (async graph: recommendations and itinerary run concurrently)
+    # ITINERARY_STORE=itineraries.jsonl serves precomputed itineraries from `python -m agent.batch`
+    # CHECKPOINT_PATH=sessions.db keeps the conversation across restarts (per SESSION_ID)
+    # STRUCTURED_OUTPUT=1 asks for bounded JSON plans that are rendered locally
+    checkpointer = SQLiteCheckpointer(os.getenv("CHECKPOINT_PATH")) if os.getenv("CHECKPOINT_PATH") else None
+    structured = os.getenv("STRUCTURED_OUTPUT") == "1"
+    travel_agent = build_async_travel_agent(llm, load_store_from_env(), checkpointer, structured)
+    return llm, checkpointer, travel_agent
+
+
+async def main():
+    # Optionally record per-node spans (TRAVEL_AGENT_TRACE=traces.jsonl or "otel")
+    tracing.enable_from_env()
+
+    # Compile the graph in the background; the prompt is shown right away
+    ready = asyncio.create_task(asyncio.to_thread(setup))
 
-def main():
-    # Initialize the model
-    # llm = ChatOpenAI(temperature=0.7)
-    llm =  GenerativeModel('gemini-1.5-pro')
-    
-    # Build the travel agent
-    travel_agent = build_travel_agent(llm)
-    
     print("Welcome to the Travel Planner AI Agent!")
     print("Tell me about your travel preferences (budget, duration, interests, etc.)")
     
-    # Initialize state
-    state = AgentState(
-        preferences={},
-        destinations=[],
-        itinerary={},
-        history=[],
-        is_followup=False
-    )
+    # Initialize state, resuming the saved conversation if there is one
+    # (only a resumable session has to wait for setup before the first prompt)
+    session_id = os.getenv("SESSION_ID", "cli")
+    state = None
+    if os.getenv("CHECKPOINT_PATH"):
+        llm, checkpointer, travel_agent = await ready
+        state = checkpointer.load(session_id)
+    if state is not None:
+        print(f"Resuming your previous conversation ({len(state.history)} messages).")
+        state.is_followup = True
+    else:
+        state = AgentState(
+            preferences={},
+            destinations=[],
+            itinerary={},
+            history=[],
+            is_followup=False,
+            session_id=session_id
+        )
     
     # Start conversation
-    user_input = input("You: ")
+    user_input = await asyncio.to_thread(input, "You: ")
     # user_input = "I want a 5-day budget trip to Himachal Pradesh focused on nature and trekking."
+    llm, checkpointer, travel_agent = await ready
     
     while True:
         # Add user message to history
@@ -48,8 +88,14 @@ def main():
                 # Initialize history if it doesn't exist
                 state['history'] = [{"role": "user", "content": user_input}]
         
-        # Process through the graph
-        result = travel_agent.invoke(state)
+        # Process through the graph, printing the reply as it streams in
+        print("Travel Agent: ", end="", flush=True)
+        turn = TurnStream(travel_agent, state)
+        streamed = False
+        async for chunk in turn:
+            print(chunk, end="", flush=True)
+            streamed = True
+        result = turn.result
                 
         # Extract the latest assistant message from the updated state
         assistant_message = "I'm processing your request..."
@@ -62,12 +108,20 @@ def main():
 
 
 
-        print(f"Travel Agent: {assistant_message}")
+        # Nodes that don't stream (e.g. no new itinerary) are printed in one go
+        print("" if streamed else assistant_message)
         
         # Check if user wants to exit
-        user_input = input("You (type 'exit' to quit): ")
+        user_input = await asyncio.to_thread(input, "You (type 'exit' to quit): ")
         if user_input.lower() == 'exit':
+            from agent.cache import cache_stats
+            stats = cache_stats(llm)
+            if stats is not None:
+                print(f"LLM cache: {stats.as_dict()}")
             print("Thank you for using the Travel Planner AI Agent. Goodbye!")
+            tracing.disable()
+            if checkpointer:
+                checkpointer.close()
             break
         
         # Update state for next iteration
@@ -80,4 +134,4 @@ def main():
             state['is_followup'] = True
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""ASGI service for the Travel Planner AI Agent.
+
+Serves many users from one process: the graph is compiled once and each
+session keeps its own `AgentState`. Run with:
+
+    uvicorn server:create_app --factory
+
+Endpoints:
+    POST /sessions/{id}/messages   {"message": "..."} -> {"session_id", "reply"}
+    WS   /sessions/{id}/ws         send text, receive {"type": "chunk"|"done"|"error", ...}
+    GET  /health
+"""
+import asyncio
+import json
+import logging
+import os
+
+from agent import tracing
+from agent.checkpoints import SQLiteCheckpointer
+from agent.graph import build_async_travel_agent
+from agent.itinerary_store import load_store_from_env
+from agent.scheduler import load_scheduler_from_env
+from agent.sessions import SessionStore, latest_reply, run_turn
+from agent.speculation import Speculator
+from agent.tools.weather_api import get_weather_service
+
+logger = logging.getLogger(__name__)
+
+TURN_FAILED = "Sorry, something went wrong while planning. Please try again."
+
+
+class TravelAgentApp:
+    """Raw ASGI application sharing one compiled graph across sessions."""
+
+    def __init__(self, llm, max_concurrent_turns=64, idle_timeout=1800, max_sessions=None, itinerary_store=None,
+                 checkpointer=None, structured=False, scheduler=None, speculate=0):
+        if scheduler is not None:
+            # Every session's model calls share the scheduler's quotas and queue
+            llm = scheduler.wrap(llm)
+        self.scheduler = scheduler
+        # Pre-generates up to `speculate` likely next itineraries per session
+        # while the user reads; the itinerary node checks them before the store
+        self.speculator = None
+        self.itinerary_store = itinerary_store
+        if speculate:
+            itinerary_store = self.speculator = Speculator(llm, itinerary_store, speculate, structured=structured)
+        self.travel_agent = build_async_travel_agent(llm, itinerary_store, checkpointer, structured)
+        self.sessions = SessionStore(idle_timeout=idle_timeout, max_sessions=max_sessions, checkpointer=checkpointer)
+        self.checkpointer = checkpointer
+        # Bounds how many turns run at once across all sessions
+        self.turn_slots = asyncio.Semaphore(max_concurrent_turns)
+        self._eviction_task = None
+        self._refresh_task = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+
+    async def handle_message(self, session_id, message, on_chunk=None):
+        """Run one turn for a session and return the assistant's reply."""
+        session = await self.sessions.aget(session_id)
+        # Turns for the same session run one at a time, in arrival order
+        async with session.lock:
+            async with self.turn_slots:
+                session.state = await run_turn(self.travel_agent, session.state, message, on_chunk,
+                                                self.checkpointer)
+            if self.speculator is not None:
+                self.speculator.start(session.state)
+        return latest_reply(session.state)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            event = await receive()
+            if event["type"] == "lifespan.startup":
+                self._eviction_task = asyncio.create_task(self.sessions.run_eviction())
+                if self.itinerary_store is not None:
+                    self._refresh_task = asyncio.create_task(self.itinerary_store.run_refresh())
+                await send({"type": "lifespan.startup.complete"})
+            elif event["type"] == "lifespan.shutdown":
+                if self._eviction_task:
+                    self._eviction_task.cancel()
+                if self._refresh_task:
+                    self._refresh_task.cancel()
+                if self.speculator is not None:
+                    await self.speculator.aclose()
+                await get_weather_service().aclose()
+                if self.checkpointer is not None:
+                    await asyncio.to_thread(self.checkpointer.close)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        parts = scope["path"].strip("/").split("/")
+
+        if scope["method"] == "GET" and parts == ["health"]:
+            health = {"status": "ok", "sessions": len(self.sessions)}
+            if self.scheduler is not None:
+                health["llm"] = self.scheduler.metrics()
+            if self.speculator is not None:
+                health["speculation"] = self.speculator.stats.as_dict()
+            await _send_json(send, 200, health)
+            return
+
+        if scope["method"] != "POST" or len(parts) != 3 or parts[0] != "sessions" or parts[2] != "messages":
+            await _send_json(send, 404, {"error": "Not found"})
+            return
+
+        body = b""
+        while True:
+            event = await receive()
+            body += event.get("body", b"")
+            if not event.get("more_body"):
+                break
+        try:
+            message = json.loads(body)["message"]
+        except (ValueError, KeyError, TypeError):
+            await _send_json(send, 400, {"error": "Expected a JSON body with a 'message' field"})
+            return
+
+        try:
+            reply = await self.handle_message(parts[1], message)
+        except RuntimeError as exc:
+            # Overloaded: too many sessions or a full model queue
+            await _send_json(send, 503, {"error": str(exc)})
+            return
+        except Exception:
+            logger.exception("Turn failed for session %s", parts[1])
+            await _send_json(send, 500, {"error": TURN_FAILED})
+            return
+        await _send_json(send, 200, {"session_id": parts[1], "reply": reply})
+
+    async def _websocket(self, scope, receive, send):
+        parts = scope["path"].strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "sessions" or parts[2] != "ws":
+            await send({"type": "websocket.close", "code": 4404})
+            return
+
+        event = await receive()
+        if event["type"] != "websocket.connect":
+            return
+        await send({"type": "websocket.accept"})
+
+        async def send_chunk(chunk):
+            await send({"type": "websocket.send", "text": json.dumps({"type": "chunk", "text": chunk})})
+
+        while True:
+            event = await receive()
+            if event["type"] == "websocket.disconnect":
+                return
+            message = event.get("text") or (event.get("bytes") or b"").decode("utf-8")
+            try:
+                reply = await self.handle_message(parts[1], message, on_chunk=send_chunk)
+            except RuntimeError as exc:
+                await send({"type": "websocket.send", "text": json.dumps({"type": "error", "error": str(exc)})})
+                continue
+            except Exception:
+                logger.exception("Turn failed for session %s", parts[1])
+                await send({"type": "websocket.send", "text": json.dumps({"type": "error", "error": TURN_FAILED})})
+                continue
+            await send({"type": "websocket.send", "text": json.dumps({"type": "done", "reply": reply})})
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def create_app(llm=None):
+    """ASGI app factory; the model comes from LLM_PROVIDER like main.py."""
+    if llm is None:
+        from dotenv import load_dotenv
+        from agent.providers import create_llm
+
+        load_dotenv()
+        llm = create_llm()
+    tracing.enable_from_env()
+    return TravelAgentApp(
+        llm,
+        max_concurrent_turns=int(os.getenv("MAX_CONCURRENT_TURNS", "64")),
+        itinerary_store=load_store_from_env(),
+        checkpointer=SQLiteCheckpointer(os.getenv("CHECKPOINT_PATH")) if os.getenv("CHECKPOINT_PATH") else None,
+        structured=os.getenv("STRUCTURED_OUTPUT") == "1",
+        scheduler=load_scheduler_from_env(),
+        speculate=int(os.getenv("SPECULATE_ITINERARIES", "0")),
+    )
@@ -0,0 +1,806 @@
+import asyncio
+import copy
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from agent import tracing
+from agent.batch import BatchRunner, plan_jobs
+from agent.cache import CachedLLM, MemoryCacheStore, SQLiteCacheStore, SemanticIndex, cache_stats, find_caches
+from agent.checkpoints import SQLiteCheckpointer
+from agent.compaction import project_destination
+from agent.context import ConversationContext, estimate_tokens, summarize_message
+from agent.fake_llm import FakeLLM
+from agent.itinerary_store import ItineraryStore
+from agent.nodes.destination_finder import build_recommendation_prompt
+from agent.nodes.preference_extractor import destination_switch
+from agent.models import HedgedModel, ModelRouter
+from agent.providers import OpenAIChatModel, create_llm
+from agent.records import pack_state, unpack_state
+from agent.scheduler import BULK, FOLLOWUP, GENERATION, LLMScheduler, SchedulerOverloaded, session_context
+from agent.sessions import SessionStore, run_turn as arun_turn
+from agent.speculation import Speculator
+from agent.graph import build_async_travel_agent, build_travel_agent
+from agent.state import AgentState
+from agent.streaming import TurnStream, stream_to
+from agent.structured import FIELD_LIMITS, MAX_DAYS, RECOMMENDATIONS_SCHEMA, conform
+from agent.tools.destination_db import DestinationCatalog, get_catalog, get_destinations
+from agent.tools.preference_parser import get_preference_parser
+from agent.tools.route_planner import TravelTimes, plan_route
+from agent.tools.tag_index import TagMatcher
+from agent.tools.weather_api import StubWeatherProvider, WeatherService, get_weather_service
+from benchmarks.load_test import post_message
+from benchmarks.stub_server import StubServer
+from benchmarks.synthetic import make_destinations
+from server import TravelAgentApp
+
+FIRST_MESSAGE = "I want a 5-day budget trip with beaches and food in winter"
+LLM_MESSAGE = "Somewhere calm, but not too far away"
+
+
+def run_turn(agent, state, message):
+    state.is_followup = bool(state.history)
+    state.history.append({"role": "user", "content": message})
+    return AgentState(**agent.invoke(state))
+
+
+class TestPreferenceExtraction(unittest.TestCase):
+    def test_simple_message_skips_llm(self):
+        llm = FakeLLM()
+        state = run_turn(build_travel_agent(llm), AgentState(), FIRST_MESSAGE)
+        self.assertEqual(state.preferences["duration"], 5)
+        self.assertEqual(state.preferences["budget"], "low")
+        self.assertEqual(state.preferences["interests"], ["beaches", "food"])
+        self.assertEqual(state.preferences["season"], "winter")
+        self.assertNotIn("preferences", llm.calls_by_kind)
+
+    def test_ambiguous_message_uses_llm(self):
+        llm = FakeLLM(preferences={"budget": "high", "duration": 4})
+        state = run_turn(build_travel_agent(llm), AgentState(), "Somewhere calm, but not too far away")
+        self.assertEqual(llm.calls_by_kind["preferences"], 1)
+        self.assertEqual(state.preferences, {"budget": "high", "duration": 4})
+
+    def test_parser_confidence(self):
+        parser = get_preference_parser()
+        _, confident = parser.parse(FIRST_MESSAGE)
+        _, negated = parser.parse("a beach trip but not in summer")
+        self.assertGreaterEqual(confident, 0.5)
+        self.assertEqual(negated, 0.0)
+
+    def test_budget_ceiling_needs_a_money_amount(self):
+        parser = get_preference_parser()
+        for message in ("I want a beach trip under 5 days in winter", "a relaxing trip for up to 10 days",
+                        "beach holiday within 4 days", "a trip for under 6 people", "under 20000 of anything"):
+            preferences, _ = parser.parse(message)
+            self.assertNotIn("budget_max_inr", preferences, message)
+        self.assertEqual(parser.parse("I want a beach trip under 5 days in winter")[0]["duration"], 5)
+        for message, ceiling in (("beach trip under ₹20,000", 20000), ("up to rs 1.5 lakh", 150000),
+                                 ("max 30000 inr", 30000), ("below 25k for a week", 25000),
+                                 ("under 15000 rupees", 15000)):
+            self.assertEqual(parser.parse(message)[0]["budget_max_inr"], ceiling, message)
+        preferences, _ = parser.parse("a beach trip within a budget of 20000")
+        self.assertEqual(preferences["budget_max_inr"], 20000)
+        self.assertNotIn("budget", preferences)
+        self.assertEqual(parser.parse("a budget trip to the beach")[0]["budget"], "low")
+
+
+class TestDestinationFinding(unittest.TestCase):
+    def test_ranking_prefers_matching_destinations(self):
+        top = get_catalog().rank({"budget": "low", "interests": ["temples", "food"], "season": "winter"})
+        self.assertEqual(top[0]["name"], "Varanasi")
+        self.assertEqual(len(top), 5)
+        scores = [d["match_score"] for d in top]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_null_preferences_are_ignored(self):
+        top = get_catalog().rank({"budget": "low", "interests": None, "season": None})
+        self.assertEqual(len(top), 5)
+
+    def test_indexed_and_columnar_ranking_agree(self):
+        catalog = get_catalog()
+        preferences = {"budget": "medium", "duration": 4, "interests": ["nature"], "season": "spring"}
+        self.assertEqual(catalog.rank(preferences), catalog.rank_indexed(preferences))
+
+    def test_budget_ceiling_filters_by_price(self):
+        preferences = {"interests": ["beaches", "scuba"], "duration": 5}
+        self.assertEqual(get_catalog().rank(preferences)[0]["name"], "Andaman Islands")
+        # ₹15,000 for 5 days is ₹3,000 a day; the Andamans start at about ₹4,200
+        preferences["budget_max_inr"] = 15000
+        top = get_catalog().rank(preferences)
+        self.assertNotIn("Andaman Islands", [d["name"] for d in top])
+        self.assertEqual(top, get_catalog().rank_indexed(preferences))
+
+        parsed, _ = get_preference_parser().parse("beach trip below 20k for a week")
+        self.assertEqual(parsed["budget_max_inr"], 20000)
+
+    def test_unaffordable_ceiling_is_not_claimed(self):
+        preferences = {"interests": ["beaches"], "duration": 5, "budget_max_inr": 500}
+        self.assertFalse(get_catalog().price_index.fits(preferences))
+        self.assertTrue(get_catalog().price_index.fits({"duration": 5}))
+        state = run_turn(build_travel_agent(FakeLLM()), AgentState(), "a 5-day beach trip under ₹500 in winter")
+        acknowledgment = state.history[2]["content"]
+        self.assertTrue(acknowledgment.startswith("I understand you're looking for a 5 day trip focused on beaches."))
+        self.assertIn("Nothing I know of fits under ₹500", acknowledgment)
+        self.assertEqual(len(state.destinations), 5)
+
+    def test_interests_match_tags_by_synonym_and_similarity(self):
+        matcher = TagMatcher(["trekking", "mountains", "beaches"])
+        hiking, hills, typo, unknown = matcher.match(["Hiking", "hills", "beachs", "zzz"])
+        self.assertEqual((hiking, hills, unknown), ({"trekking": 1.0}, {"mountains": 1.0}, {}))
+        self.assertEqual(list(typo), ["beaches"])
+        self.assertTrue(0.5 <= typo["beaches"] < 1)
+
+        catalog = get_catalog()
+        # The prebuilt index in data/ matches the catalog and is memory-mapped
+        self.assertEqual(type(catalog.tag_matcher.vectors).__name__, "memmap")
+        preferences = {"interests": ["temple visits", "street food"]}
+        self.assertEqual(catalog.rank(preferences)[0]["name"], "Varanasi")
+        self.assertEqual(catalog.rank(preferences), catalog.rank_indexed(preferences))
+
+
+class TestFollowups(unittest.TestCase):
+    def setUp(self):
+        self.llm = FakeLLM()
+        self.agent = build_travel_agent(self.llm)
+        self.state = run_turn(self.agent, AgentState(), FIRST_MESSAGE)
+        self.llm.calls_by_kind.clear()
+
+    def test_question_goes_straight_to_followup(self):
+        state = run_turn(self.agent, self.state, "what should I pack?")
+        self.assertEqual(self.llm.calls_by_kind, {"followup": 1})
+        self.assertEqual(state.history[-1]["role"], "assistant")
+
+    def test_duration_change_only_regenerates_itinerary(self):
+        state = run_turn(self.agent, self.state, "make it 3 days")
+        self.assertEqual(self.llm.calls_by_kind, {"itinerary": 1})
+        self.assertEqual(state.itinerary["duration"], 3)
+
+    def test_question_matching_preference_words_is_answered(self):
+        state = run_turn(self.agent, self.state, "Is it cold there in winter?")
+        self.assertEqual(self.llm.calls_by_kind, {"followup": 1})
+        self.assertEqual(state.preferences, self.state.preferences)
+
+    def test_added_interest_keeps_existing_ones(self):
+        state = run_turn(self.agent, self.state, "also add some nightlife")
+        self.assertEqual(state.preferences["interests"], ["beaches", "food", "nightlife"])
+
+    def test_naming_a_runner_up_switches_unless_negated(self):
+        runner_up = self.state.destinations[1]["name"]
+        self.state.is_followup = True
+        self.state.history.append({"role": "user", "content": f"I don't want {runner_up}"})
+        self.assertIsNone(destination_switch(self.state))
+        self.state.history.pop()
+        state = run_turn(self.agent, self.state, f"what about {runner_up} instead?")
+        self.assertEqual(state.itinerary["destination"], runner_up)
+        self.assertEqual(self.llm.calls_by_kind, {"itinerary": 1})
+
+    def test_budget_change_reranks(self):
+        run_turn(self.agent, self.state, "actually make it a luxury trip")
+        self.assertEqual(self.llm.calls_by_kind.get("recommendations"), 1)
+
+
+class TestStreaming(unittest.TestCase):
+    def test_streamed_chunks_match_history(self):
+        chunks = []
+        state = AgentState(history=[{"role": "user", "content": FIRST_MESSAGE}])
+        with stream_to(chunks.append):
+            result = build_travel_agent(FakeLLM()).invoke(state)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), result["history"][-1]["content"])
+
+    def test_async_graph_matches_sync_graph(self):
+        def fresh():
+            return AgentState(history=[{"role": "user", "content": FIRST_MESSAGE}])
+
+        expected = build_travel_agent(FakeLLM()).invoke(fresh())
+
+        async def stream():
+            turn = TurnStream(build_async_travel_agent(FakeLLM()), fresh())
+            chunks = [chunk async for chunk in turn]
+            return chunks, turn.result
+
+        chunks, result = asyncio.run(stream())
+        self.assertEqual(result, expected)
+        self.assertEqual("".join(chunks), result["history"][-1]["content"])
+
+
+def letter_counts(text):
+    """Toy embedding for the semantic cache tier."""
+    return [text.count(letter) for letter in "abcdefghijklmnopqrstuvwxyz"]
+
+
+class TestCache(unittest.TestCase):
+    def test_hits_and_misses_are_counted(self):
+        llm = FakeLLM()
+        cached = CachedLLM(llm)
+        first = cached.generate_content("Plan a trip").text
+        # Canonicalization folds case and whitespace into the same key
+        self.assertEqual(cached.generate_content("  plan   a TRIP ").text, first)
+        cached.generate_content("Plan another trip")
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual(cached.stats.as_dict(), {"hits": 1, "semantic_hits": 0, "misses": 2, "hit_rate": 0.3333})
+
+    def test_entries_expire_after_ttl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for store in (MemoryCacheStore(ttl=10), SQLiteCacheStore(os.path.join(tmp, "cache.db"), ttl=10)):
+                with mock.patch("agent.cache.time.time", return_value=1000.0):
+                    store.set("key", "value")
+                with mock.patch("agent.cache.time.time", return_value=1005.0):
+                    self.assertEqual(store.get("key"), "value")
+                with mock.patch("agent.cache.time.time", return_value=1011.0):
+                    self.assertIsNone(store.get("key"))
+                self.assertEqual(len(store), 0)
+                if isinstance(store, SQLiteCacheStore):
+                    store.close()
+
+    def test_least_recently_used_entries_are_evicted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            for store in (MemoryCacheStore(max_entries=2), SQLiteCacheStore(path, max_entries=2)):
+                clock = iter(range(1000, 1010))
+                with mock.patch("agent.cache.time.time", side_effect=lambda: float(next(clock))):
+                    store.set("a", "1")
+                    store.set("b", "2")
+                    self.assertEqual(store.get("a"), "1")   # "b" is now the least recently used
+                    store.set("c", "3")
+                    self.assertEqual((store.get("a"), store.get("b"), store.get("c")), ("1", None, "3"))
+                self.assertEqual(len(store), 2)
+                if isinstance(store, SQLiteCacheStore):
+                    store.close()
+
+    def test_semantic_tier_serves_near_duplicates(self):
+        llm = FakeLLM()
+        cached = CachedLLM(llm, semantic=SemanticIndex(letter_counts, threshold=0.95))
+        first = cached.generate_content("beach trip to goa in winter").text
+        self.assertEqual(cached.generate_content("beach trips to goa in winter").text, first)
+        cached.generate_content("mountain trek in summer")
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual((cached.stats.hits, cached.stats.semantic_hits, cached.stats.misses), (0, 1, 2))
+
+    def test_streams_are_stored_and_replayed(self):
+        llm = FakeLLM(response_words=50, chunk_words=10)
+        cached = CachedLLM(llm)
+        chunks = [chunk.text for chunk in cached.generate_content("Plan a trip", stream=True)]
+        self.assertEqual(len(chunks), 5)
+        replayed = [chunk.text for chunk in cached.generate_content("Plan a trip", stream=True)]
+        self.assertEqual(replayed, ["".join(chunks)])
+
+        async def astream(prompt):
+            return [chunk.text async for chunk in await cached.generate_content_async(prompt, stream=True)]
+
+        self.assertEqual(asyncio.run(astream("Plan a trip")), replayed)
+        self.assertEqual(len(asyncio.run(astream("Plan a new trip"))), 5)
+        self.assertEqual(asyncio.run(astream("Plan a new trip")), ["".join(chunks)])
+        self.assertEqual(llm.calls, 2)
+
+    def test_stats_are_found_through_wrappers(self):
+        store = MemoryCacheStore()
+        router = ModelRouter(FakeLLM(), {"itinerary": FakeLLM()}).map(lambda model: CachedLLM(model, store))
+        hedged = ModelRouter(router.default, {"itinerary": HedgedModel(router.for_role("itinerary"), router.default)})
+        llm = LLMScheduler().wrap(hedged)
+        self.assertEqual(len(find_caches(llm)), 2)
+        run_turn(build_travel_agent(router), AgentState(), FIRST_MESSAGE)
+        stats = cache_stats(llm)
+        self.assertEqual((stats.hits, stats.misses), (0, 2))
+        self.assertIsNone(cache_stats(FakeLLM()))
+
+
+class TestBatch(unittest.TestCase):
+    def test_duplicates_are_generated_once_and_runs_resume(self):
+        profiles = [
+            {"budget": "low", "duration": 3, "interests": ["food"]},
+            {"budget": "low", "duration": 3, "interests": ["food"]},
+            {"destination": "Goa", "duration": 4, "season": "winter"},
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "results.jsonl")
+            llm = FakeLLM()
+            stats = asyncio.run(BatchRunner(llm).run(profiles, output))
+            self.assertEqual((stats.prompts, stats.completed), (4, 4))
+            self.assertEqual(llm.calls, 4)
+
+            again = asyncio.run(BatchRunner(llm).run(profiles, output))
+            self.assertEqual((again.skipped, again.completed), (4, 0))
+            self.assertEqual(llm.calls, 4)
+
+
+    def test_job_keys_do_not_depend_on_the_live_forecast(self):
+        profiles = [{"destination": "Goa", "duration": 4, "season": "winter"}]
+        keys = [job.key for job in plan_jobs(profiles, kinds=("itinerary",))]
+        forecast = {"destination": "Goa", "forecast": [{"day": 1, "condition": "Storm"}]}
+        jobs = plan_jobs(profiles, kinds=("itinerary",), forecasts={"Goa": forecast})
+        self.assertEqual([job.key for job in jobs], keys)
+        self.assertIn("Storm", jobs[0].prompt)
+
+    def test_forecasts_are_fetched_without_blocking(self):
+        profiles = [{"destination": "Goa", "duration": 4}, {"destination": "Varanasi", "duration": 10}]
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "results.jsonl")
+            with mock.patch.object(get_weather_service(), "get_sync", side_effect=AssertionError("blocking fetch")):
+                stats = asyncio.run(BatchRunner(FakeLLM()).run(profiles, output, kinds=("itinerary",)))
+            self.assertEqual((stats.completed, stats.failed), (2, 0))
+            store = ItineraryStore()
+            self.assertEqual(store.load_batch_results(output), 2)
+            self.assertEqual(len(store), 2)
+
+
+class TestItineraryStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ItineraryStore()
+        planned = run_turn(build_travel_agent(FakeLLM(), self.store), AgentState(), FIRST_MESSAGE)
+        self.plan = planned.itinerary["plan"]
+
+    def test_matching_profile_skips_generation(self):
+        llm = FakeLLM()
+        message = "I want a 5-day budget trip with beaches in winter"
+        state = run_turn(build_travel_agent(llm, self.store), AgentState(), message)
+        self.assertEqual(state.itinerary["plan"], self.plan)
+        self.assertNotIn("itinerary", llm.calls_by_kind)
+        self.assertEqual(self.store.stats.near, 1)
+
+    def test_other_season_is_not_served(self):
+        stored = next(iter(next(iter(self.store._entries.values()))))
+        self.assertEqual(stored.season, "winter")
+        self.assertIsNone(self.store.nearest(stored._replace(season="summer")))
+        # A request without a season still matches, a little further away
+        self.assertEqual(self.store.nearest(stored._replace(season=None))[2], 0.5)
+
+    def test_edited_data_file_invalidates_in_the_background(self):
+        async def refresh():
+            task = asyncio.create_task(self.store.run_refresh(interval=0))
+            await asyncio.sleep(0.2)
+            task.cancel()
+
+        with mock.patch("agent.itinerary_store._data_file_mtime", side_effect=AssertionError) as mtime:
+            run_turn(build_travel_agent(FakeLLM(), self.store), AgentState(), FIRST_MESSAGE)
+            mtime.assert_not_called()
+        with mock.patch("agent.itinerary_store._data_file_mtime", return_value=-1.0), \
+                mock.patch.object(self.store, "invalidate") as invalidate:
+            asyncio.run(refresh())
+        invalidate.assert_called_once_with()
+
+    def test_changed_weather_invalidates_entries(self):
+        destination = next(iter(self.store._entries))
+        with mock.patch.object(get_weather_service(), "cached", return_value={"forecast": []}):
+            self.store.invalidate(destination)
+        self.assertEqual(len(self.store), 0)
+
+    def test_lookups_use_the_cached_forecast_only(self):
+        stored = next(iter(next(iter(self.store._entries.values()))))
+        self.store._fingerprints.clear()
+        with mock.patch.object(get_weather_service(), "cached", return_value=None), \
+                mock.patch.object(get_weather_service(), "get_sync", side_effect=AssertionError):
+            self.assertIsNone(self.store.nearest(stored))
+        self.assertIsNotNone(self.store.nearest(stored))
+
+    def test_circuit_trips_need_the_same_profile(self):
+        stored = next(iter(next(iter(self.store._entries.values()))))
+        circuit = stored._replace(duration=10)
+        self.store.add(circuit, "ten days")
+        self.assertEqual(self.store.nearest(circuit)[1], "ten days")
+        self.assertIsNone(self.store.nearest(circuit._replace(interests=circuit.interests | {"nightlife"})))
+        editing = ItineraryStore(editor=FakeLLM())
+        editing.add(circuit._replace(duration=9), "nine days")
+        self.assertIsNone(editing.nearest(circuit))
+
+
+class CountingWeatherProvider(StubWeatherProvider):
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def fetch(self, destinations):
+        self.requests.append(list(destinations))
+        await asyncio.sleep(0.01)
+        return self.fetch_sync(destinations)
+
+
+class TestWeather(unittest.TestCase):
+    def test_concurrent_lookups_share_one_request(self):
+        provider = CountingWeatherProvider()
+        weather = WeatherService(provider)
+
+        async def lookups():
+            weather.prefetch(["Goa", "Manali"])
+            return await asyncio.gather(*(weather.get(name) for name in ["Goa", "Manali", "Goa", "Kasol"]))
+
+        forecasts = asyncio.run(lookups())
+        self.assertEqual(provider.requests, [["Goa", "Manali"], ["Kasol"]])
+        self.assertEqual(forecasts[1], provider.forecasts["Manali"])
+
+    def test_expired_entries_are_refetched(self):
+        provider = CountingWeatherProvider()
+        weather = WeatherService(provider, ttl=0)
+        asyncio.run(weather.get("Goa"))
+        asyncio.run(weather.get("Goa"))
+        self.assertEqual(len(provider.requests), 2)
+
+
+class TestCheckpointEncoding(unittest.TestCase):
+    def test_full_and_delta_round_trip(self):
+        agent = build_travel_agent(FakeLLM(preferences={"budget": "high", "note": "quiet"}))
+        first = run_turn(agent, AgentState(), "Somewhere calm, but not too far away")
+        before = list(first.history)
+        second = run_turn(agent, first, "what should I pack?")
+
+        self.assertEqual(unpack_state(pack_state(second)), second)
+        delta = pack_state(second, history_start=len(before))
+        self.assertEqual(unpack_state(delta, before), second)
+        self.assertLess(len(delta), len(pack_state(second)))
+
+
+class TestDurableSessions(unittest.TestCase):
+    def test_session_resumes_after_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sessions.db")
+            checkpointer = SQLiteCheckpointer(path, snapshot_every=3)
+            agent = build_travel_agent(FakeLLM(), checkpointer=checkpointer)
+            state = AgentState(session_id="trip")
+            for message in [FIRST_MESSAGE, "what should I pack?", "make it 3 days", "is it safe?"]:
+                state = run_turn(agent, state, message)
+            checkpointer.close()
+
+            restarted = SQLiteCheckpointer(path, snapshot_every=3)
+            resumed = SessionStore(checkpointer=restarted).get("trip").state
+            self.assertEqual(resumed, state)
+            restarted.close()
+
+
+    def test_failed_write_restarts_from_a_full_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpointer = SQLiteCheckpointer(os.path.join(tmp, "sessions.db"), snapshot_every=100)
+            agent = build_travel_agent(FakeLLM(), checkpointer=checkpointer)
+            state = run_turn(agent, AgentState(session_id="trip"), FIRST_MESSAGE)
+            checkpointer.flush()
+            conn = checkpointer._read_conn
+            conn.execute("ALTER TABLE deltas RENAME TO deltas_offline")
+            with self.assertLogs("agent.checkpoints", "ERROR"):
+                state = run_turn(agent, state, "what should I pack?")
+                checkpointer.flush()
+            conn.execute("ALTER TABLE deltas_offline RENAME TO deltas")
+            state = run_turn(agent, state, "is it safe?")
+            self.assertEqual(checkpointer.load("trip"), state)
+            checkpointer.close()
+
+    def test_session_resumes_cleanly_after_a_failed_turn(self):
+        async def converse(checkpointer):
+            agent = build_async_travel_agent(FakeLLM(), checkpointer=checkpointer)
+            state = await arun_turn(agent, AgentState(session_id="trip"), FIRST_MESSAGE)
+            before = copy.deepcopy(state)
+            # Preferences are extracted and checkpointed, then the planning calls fail
+            with self.assertRaises(ConnectionError):
+                await arun_turn(build_async_travel_agent(FailingLLM(), checkpointer=checkpointer), state,
+                                "actually make it a luxury trip", checkpointer=checkpointer)
+            self.assertEqual(state, before)
+            for message in ["what should I pack?", "is it safe?", "make it 3 days"]:
+                state = await arun_turn(agent, state, message)
+            return state
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sessions.db")
+            checkpointer = SQLiteCheckpointer(path, snapshot_every=100)
+            state = asyncio.run(converse(checkpointer))
+            checkpointer.close()
+            restarted = SQLiteCheckpointer(path)
+            self.assertEqual(restarted.load("trip"), state)
+            self.assertEqual(state.preferences["budget"], "low")
+            restarted.close()
+
+
+class TestScheduler(unittest.TestCase):
+    def test_followups_first_then_sessions_in_turn(self):
+        async def run():
+            scheduler = LLMScheduler(max_in_flight=1)
+            order = []
+
+            async def call(session, priority, label):
+                with session_context(session):
+                    await scheduler.acquire(priority)
+                order.append(label)
+                scheduler.release()
+
+            await scheduler.acquire(GENERATION)  # holds the only slot
+            tasks = [asyncio.create_task(call(session, priority, label)) for session, priority, label in [
+                ("heavy", BULK, "bulk"), ("heavy", GENERATION, "heavy-1"), ("heavy", GENERATION, "heavy-2"),
+                ("light", GENERATION, "light"), ("light", FOLLOWUP, "followup"),
+            ]]
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.queue_depth()["generation"], 3)
+            scheduler.release()
+            await asyncio.gather(*tasks)
+            return order, scheduler.metrics()
+
+        order, metrics = asyncio.run(run())
+        self.assertEqual(order, ["followup", "heavy-1", "light", "heavy-2", "bulk"])
+        self.assertEqual((metrics["admitted"], metrics["in_flight"], metrics["queued"]), (6, 0, 0))
+        self.assertIn("p99", metrics["wait_ms"]["followup"])
+
+    def test_full_queue_rejects_and_turns_still_match(self):
+        async def run():
+            scheduler = LLMScheduler(max_in_flight=1, max_queue=1)
+            await scheduler.acquire(GENERATION)
+            waiting = asyncio.create_task(scheduler.acquire(GENERATION))
+            await asyncio.sleep(0)
+            with self.assertRaises(SchedulerOverloaded):
+                await scheduler.acquire(FOLLOWUP)
+            waiting.cancel()
+            scheduler.release()
+            self.assertEqual(scheduler.metrics()["queued"], 0)
+
+            scheduler = LLMScheduler(requests_per_minute=6000)
+            agent = build_async_travel_agent(scheduler.wrap(FakeLLM()))
+            state = AgentState(session_id="trip")
+            for message in [LLM_MESSAGE, "what should I pack?"]:
+                state = await arun_turn(agent, state, message)
+            return state, scheduler.metrics()
+
+        scheduled, metrics = asyncio.run(run())
+        self.assertEqual(metrics["rejected"], 0)
+        self.assertEqual(metrics["admitted"], metrics["completed"])
+        self.assertGreater(metrics["admitted"], 0)
+
+        async def unscheduled():
+            agent = build_async_travel_agent(FakeLLM())
+            state = AgentState(session_id="trip")
+            for message in [LLM_MESSAGE, "what should I pack?"]:
+                state = await arun_turn(agent, state, message)
+            return state
+
+        self.assertEqual(scheduled.history, asyncio.run(unscheduled()).history)
+
+
+class TestSpeculation(unittest.TestCase):
+    def test_next_turns_are_served_from_speculation(self):
+        async def converse(speculate):
+            llm = FakeLLM()
+            speculator = Speculator(llm, max_per_session=3)
+            agent = build_async_travel_agent(llm, speculator if speculate else None)
+            state = await arun_turn(agent, AgentState(session_id="trip"), FIRST_MESSAGE)
+            runner_up = state.destinations[1]["name"]
+            for message in ["make it 4 days", f"what about {runner_up} instead?"]:
+                if speculate:
+                    speculator.start(state)
+                    await speculator.drain("trip")
+                state = await arun_turn(agent, state, message)
+            return state, llm.calls_by_kind["itinerary"], speculator.stats
+
+        state, calls, stats = asyncio.run(converse(speculate=True))
+        expected, expected_calls, _ = asyncio.run(converse(speculate=False))
+        self.assertEqual(state.history, expected.history)
+        self.assertEqual(state.itinerary["destination"], expected.destinations[0]["name"])
+        # One itinerary for the first turn plus six speculated, none generated on demand
+        self.assertEqual((expected_calls, calls), (3, 7))
+        self.assertEqual((stats.hits, stats.misses, stats.started), (2, 0, 6))
+        self.assertEqual(stats.as_dict()["hit_rate"], 1.0)
+
+    def test_speculation_is_capped_and_cancellable(self):
+        async def run():
+            speculator = Speculator(FakeLLM(latency=1.0), max_per_session=2)
+            state = AgentState(session_id="trip", preferences={"duration": 5}, itinerary={"destination": "Goa"},
+                               destinations=get_catalog().rank({"interests": ["beaches"]}, k=5))
+            speculator.start(state)
+            self.assertEqual(len(speculator), 2)
+            await asyncio.sleep(0)
+            speculator.cancel("trip")
+            await asyncio.sleep(0)
+            return speculator
+
+        speculator = asyncio.run(run())
+        self.assertEqual(len(speculator), 0)
+        self.assertEqual((speculator.stats.started, speculator.stats.cancelled), (2, 2))
+
+
+class FailingLLM(FakeLLM):
+    async def generate_content_async(self, prompt_string, stream=False, **kwargs):
+        raise ConnectionError("provider unavailable")
+
+
+class TestServer(unittest.TestCase):
+    def test_failed_turn_returns_500_and_can_be_retried(self):
+        async def run():
+            app = TravelAgentApp(FailingLLM())
+            with self.assertLogs("server", "ERROR"):
+                failed = await post_message(app, "trip", FIRST_MESSAGE)
+            history = list(app.sessions.get("trip").state.history)
+            app.travel_agent = build_async_travel_agent(FakeLLM())
+            retried = await post_message(app, "trip", FIRST_MESSAGE)
+            return failed, history, retried, app.sessions.get("trip").state
+
+        failed, history, retried, state = asyncio.run(run())
+        self.assertEqual((failed["status"], history), (500, []))
+        self.assertEqual(retried["status"], 200)
+        self.assertEqual([m["content"] for m in state.history if m["role"] == "user"], [FIRST_MESSAGE])
+
+
+class TestTracing(unittest.TestCase):
+    def tearDown(self):
+        tracing.disable()
+
+    def test_nodes_and_model_calls_are_traced(self):
+        sink = tracing.MemorySink()
+        tracing.enable(sink)
+        run_turn(build_travel_agent(FakeLLM()), AgentState(), FIRST_MESSAGE)
+        names = [span.name for span in sink.spans]
+        for name in ["node.extract_preferences", "node.find_destinations", "node.create_itinerary"]:
+            self.assertIn(name, names)
+        generate = [span for span in sink.spans if span.name == "llm.generate"]
+        self.assertEqual(len(generate), 2)
+        self.assertGreater(generate[0].attributes["response_tokens"], 0)
+        nodes = {span.span_id for span in sink.spans if span.name.startswith("node.")}
+        self.assertTrue(all(span.parent_id in nodes for span in generate))
+
+    def test_disabled_tracing_records_nothing(self):
+        self.assertIs(tracing.span("anything"), tracing.span("other"))
+        self.assertFalse(tracing.is_enabled())
+
+
+class TestStructuredOutput(unittest.TestCase):
+    def test_structured_plan_is_rendered_and_reused_by_followups(self):
+        agent = build_travel_agent(FakeLLM(), structured=True)
+        state = run_turn(agent, AgentState(), LLM_MESSAGE)
+        self.assertEqual(len(state.recommendations), 3)
+        self.assertEqual(len(state.itinerary["days"]), 5)
+        self.assertIn("Day 5:", state.history[-1]["content"])
+        self.assertEqual(unpack_state(pack_state(state)), state)
+
+        llm = FakeLLM()
+        state = run_turn(build_travel_agent(llm, structured=True), state, "what should I pack?")
+        self.assertEqual(llm.calls_by_kind, {"followup": 1})
+        self.assertLess(state.prompt_tokens[-1], 2000)
+
+    def test_text_and_long_durations(self):
+        llm = FakeLLM(preferences={"duration": "6 days", "interests": ["beaches"]})
+        state = run_turn(build_travel_agent(llm, structured=True), AgentState(), LLM_MESSAGE)
+        self.assertEqual(len(state.itinerary["days"]), 6)
+
+        llm = FakeLLM(preferences={"duration": 20, "interests": ["beaches"]})
+        state = run_turn(build_travel_agent(llm, structured=True), AgentState(), LLM_MESSAGE)
+        self.assertEqual(len(state.itinerary["days"]), MAX_DAYS)
+        self.assertIn(f"first {MAX_DAYS} of your 20 days", state.history[-1]["content"])
+
+    def test_conform_enforces_field_limits(self):
+        reply = {"recommendations": [{"name": "x" * 100, "why": 42, "extra": "dropped"}] * 5}
+        recommendations = conform(reply, RECOMMENDATIONS_SCHEMA)["recommendations"]
+        self.assertEqual(len(recommendations), 3)
+        self.assertEqual(len(recommendations[0]["name"]), FIELD_LIMITS["name"])
+        self.assertEqual(recommendations[0]["why"], "42")
+        self.assertEqual(recommendations[0]["budget"], "")
+        self.assertNotIn("extra", recommendations[0])
+
+
+def chat(turns, words=60):
+    """Alternating user/assistant messages of about `words` words each."""
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}. " + "lorem " * words}
+            for i in range(turns)]
+
+
+class TestConversationContext(unittest.TestCase):
+    def test_history_stays_within_the_token_budget(self):
+        context = ConversationContext(token_budget=400, summary_budget=100)
+        state = AgentState(history=chat(40))
+        built = context.build(state, len(state.history))
+        summary, recent = built.split("\n\n", 1)
+        self.assertTrue(summary.startswith("Summary of earlier conversation:"))
+        self.assertLessEqual(sum(estimate_tokens(line) + 1 for line in state.context_summary.splitlines()), 100)
+        self.assertLessEqual(sum(estimate_tokens(line) + 1 for line in recent.splitlines()), 300)
+        # The newest messages are kept verbatim, oldest first
+        self.assertTrue(recent.splitlines()[-1].startswith("assistant: Message 39."))
+        self.assertEqual(state.summarized_until, 40 - len(recent.splitlines()))
+
+    def test_summary_is_extended_not_rebuilt(self):
+        context = ConversationContext(token_budget=400, summary_budget=200)
+        state = AgentState(history=chat(12))
+        context.build(state, len(state.history))
+        first_summary, summarized = state.context_summary, state.summarized_until
+        self.assertGreater(summarized, 0)
+
+        state.history.extend(chat(16)[12:])
+        with mock.patch("agent.context.summarize_message", wraps=summarize_message) as summarize:
+            built = context.build(state, len(state.history))
+        # Only the newly evicted messages are summarized
+        self.assertEqual(summarize.call_count, state.summarized_until - summarized)
+        self.assertTrue(state.context_summary.startswith(first_summary))
+        # Summarized messages never come back verbatim
+        self.assertNotIn(f"Message {summarized - 1}. lorem", built)
+
+        with mock.patch("agent.context.summarize_message") as summarize:
+            self.assertEqual(context.build(state, len(state.history)), built)
+        summarize.assert_not_called()
+
+    def test_itinerary_and_bookkeeping_are_not_repeated(self):
+        plan = "Day 1: beach. Day 2: fort."
+        state = AgentState(itinerary={"destination": "Goa", "duration": 2, "plan": plan}, history=[
+            {"role": "user", "content": "A 2-day beach trip"},
+            {"role": "system", "content": "Extracted preferences: {'duration': 2}"},
+            {"role": "assistant", "content": f"Here's your 2-day itinerary for Goa:\n\n{plan}\n\nAny questions?"},
+            {"role": "user", "content": "what should I pack?"},
+        ])
+        built = ConversationContext().build(state, len(state.history))
+        self.assertEqual(built, "user: A 2-day beach trip\nuser: what should I pack?")
+
+
+class TestPromptCompaction(unittest.TestCase):
+    def test_prompts_send_only_the_travellers_budget_tier(self):
+        destination = {"name": "Goa", "country": "India", "tags": ["beaches"], "match_score": 3,
+                       "budget_level": "medium", "budget_inr": {"low": "₹1", "medium": "₹2", "high": "₹3"}}
+        self.assertEqual(project_destination(destination, "high"),
+                         {"name": "Goa", "country": "India", "tags": ["beaches"], "budget_inr": "₹3"})
+        self.assertEqual(project_destination(destination)["budget_inr"], "₹2")
+
+        state = build_travel_agent(FakeLLM()).invoke(AgentState(history=[{"role": "user", "content": LLM_MESSAGE}]))
+        prompt = build_recommendation_prompt(AgentState(**state))
+        self.assertNotIn("match_score", prompt)
+        self.assertTrue(prompt.rstrip().endswith("]"))
+
+
+class TestRoutePlanning(unittest.TestCase):
+    def test_long_trips_get_an_ordered_circuit(self):
+        # The built-in sample catalog (Himachal Pradesh) is used when the data file is missing
+        with mock.patch("builtins.open", side_effect=FileNotFoundError):
+            catalog = DestinationCatalog(get_destinations())
+        preferences = {"duration": 10, "interests": ["mountains", "trekking"]}
+        route = plan_route(catalog, preferences, "Manali")
+        self.assertEqual([stop["name"] for stop in route], ["Manali", "Kasol", "Dharamshala"])
+        self.assertEqual(route[0]["days"][0], 1)
+        self.assertEqual(route[-1]["days"][1], 10)
+        for previous, stop in zip(route, route[1:]):
+            self.assertEqual(stop["days"][0], previous["days"][1] + 1)
+        self.assertIsNone(plan_route(catalog, dict(preferences, duration=5), "Manali"))
+
+    def test_route_is_planned_once_per_itinerary(self):
+        message = "A 10-day trip to the mountains with trekking in summer"
+        with mock.patch("agent.nodes.itinerary_creator.plan_route", wraps=plan_route) as planner:
+            state = run_turn(build_travel_agent(FakeLLM()), AgentState(), message)
+            self.assertEqual(planner.call_count, 1)
+            planner.reset_mock()
+            async_state = asyncio.run(arun_turn(build_async_travel_agent(FakeLLM()), AgentState(), message))
+            self.assertEqual(planner.call_count, 1)
+        self.assertEqual(async_state.itinerary.get("route"), state.itinerary.get("route"))
+
+    def test_travel_time_table_matches_brute_force(self):
+        destinations = make_destinations(2000)
+        table = TravelTimes(destinations, neighbours=8)
+        dense = table.matrix(range(len(destinations)))
+        for idx in range(0, len(destinations), 97):
+            row = dense[idx].copy()
+            row[idx] = float("inf")
+            expected = sorted(hours for hours in row if hours <= table.max_hours)[:8]
+            got = [hours for _, hours in table.nearby(idx)]
+            self.assertEqual(len(got), len(expected))
+            for a, b in zip(got, expected):
+                self.assertAlmostEqual(a, b, places=3)
+
+
+class TestProviders(unittest.TestCase):
+    def test_registry_creates_selected_provider(self):
+        with mock.patch.dict(os.environ, {"LLM_PROVIDER": "fake"}):
+            self.assertIsInstance(create_llm(), FakeLLM)
+        with self.assertRaises(ValueError):
+            create_llm("unknown")
+
+    def test_router_sends_each_node_to_its_model(self):
+        small, large = FakeLLM(), FakeLLM()
+        router = ModelRouter(large, {"preferences": small})
+        run_turn(build_travel_agent(router), AgentState(), LLM_MESSAGE)
+        self.assertEqual(small.calls_by_kind, {"preferences": 1})
+        self.assertEqual(large.calls_by_kind, {"recommendations": 1, "itinerary": 1})
+
+    def test_hedged_request_uses_faster_backup(self):
+        model = HedgedModel(FakeLLM(latency=5.0), FakeLLM(), hedge_after=0.01)
+        state = asyncio.run(asyncio.wait_for(
+            arun_turn(build_async_travel_agent(model), AgentState(), LLM_MESSAGE), timeout=2.0))
+        self.assertIn("word0", state.history[-1]["content"])
+        self.assertEqual(model.stats.as_dict(), {"requests": 3, "hedged": 3, "backup_wins": 3})
+
+    def test_openai_provider_reuses_connections(self):
+        with StubServer() as server:
+            llm = OpenAIChatModel("stub", base_url=server.base_url, api_key="stub")
+            state = run_turn(build_travel_agent(llm), AgentState(), LLM_MESSAGE)
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(server.connections, 1)
+        self.assertIn("word0", state.history[-1]["content"])
+
+
+if __name__ == "__main__":
+    unittest.main()